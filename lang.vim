@@ -10,7 +10,7 @@ syntax keyword langTodo contained TODO FIXME XXX
 syntax match langComment "//.*$" contains=langTodo
 
 " Keywords
-syntax keyword langKeyword fn do while if else return let include continue break stdout stdin stderr
+syntax keyword langKeyword fn do while for in if else return let include continue break stdout stdin stderr
 
 " String
 syntax match langSpecialCharacters "\\[abfnrtv\n"\\]"
@@ -26,7 +26,7 @@ syntax match langNumber "\<0x[0-9abcdefABCDEF]\+\>"
 syntax keyword langConstant nil false true
 
 " Functions
-syntax keyword langFunction write exit append pop length copy type set fopen fwrite fread fclose freadln
+syntax keyword langFunction write exit append pop length copy type set fopen fwrite fread fclose freadln clock flush freadn freadlines flines fnext range fill slice extend index_of sum sort reverse map get put has delete keys join builder bappend bfinish format iarray farray afill aadd asub amul adiv min max dot
 
 hi def link langKeyword Keyword
 hi def link langComment Comment
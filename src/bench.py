@@ -0,0 +1,194 @@
+# Lang Compiler
+# Author: Jonas
+
+# Benchmark runner. Each benchmark is a lang program, run many times in
+# this process, and timed from the start to the exit of the program.
+# The results can be saved as JSON, and compared with saved results to
+# find the benchmarks that became slower.
+
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# directory of the benchmarks of the repository
+BENCHMARKS_DIRECTORY = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)),
+	'..',
+	'benchmarks',
+)
+
+BENCHMARK_EXTENSION = '.lang'
+
+DEFAULT_REPEAT = 5
+
+# a benchmark is slower than the baseline if its median is this
+# percentage bigger
+DEFAULT_SLOWDOWN_THRESHOLD = 10
+
+RESULTS_VERSION = 1
+
+MILLISECONDS_PER_SECOND = 1000
+
+
+def find_benchmarks(paths):
+	"""Returns the benchmark files in paths, files or directories. The
+	default is the directory of the benchmarks."""
+
+	benchmarks = []
+
+	for path in paths or [BENCHMARKS_DIRECTORY]:
+		if os.path.isdir(path):
+			benchmarks += sorted(
+				os.path.join(path, name)
+				for name in os.listdir(path)
+				if name.endswith(BENCHMARK_EXTENSION)
+			)
+
+		else:
+			benchmarks.append(path)
+
+	return benchmarks
+
+
+def get_benchmark_name(file_name):
+	return os.path.basename(file_name)[:-len(BENCHMARK_EXTENSION)] \
+		if file_name.endswith(BENCHMARK_EXTENSION) \
+		else os.path.basename(file_name)
+
+
+def time_run(run):
+	"""Returns the time of run, a function that runs a program until it
+	exits, in milliseconds, or None if the program has failed. run is
+	called with the file of the output of the program, that is
+	discarded."""
+
+	gc.collect()
+
+	with open(os.devnull, 'w') as devnull:
+		start = time.perf_counter()
+
+		try:
+			run(devnull)
+			code = 0
+
+		except SystemExit as exit_:
+			code = exit_.code
+
+		elapsed = time.perf_counter() - start
+
+	if code not in (0, None):
+		return None
+
+	return elapsed * MILLISECONDS_PER_SECOND
+
+
+def measure(run, repeat=DEFAULT_REPEAT):
+	"""Returns the result of running run repeat times: the times, the
+	median, and the spread (the difference of the slowest and fastest
+	times, as a percentage of the median). Returns None if a run has
+	failed. The program runs in a temporary directory, removed with
+	the files that it has written."""
+
+	times = []
+	directory = os.getcwd()
+
+	with tempfile.TemporaryDirectory() as temporary_directory:
+		os.chdir(temporary_directory)
+
+		try:
+			for _ in range(repeat):
+				elapsed = time_run(run)
+
+				if elapsed is None:
+					return None
+
+				times.append(elapsed)
+
+		finally:
+			os.chdir(directory)
+
+	median = statistics.median(times)
+
+	return {
+		'times': times,
+		'median': median,
+		'min': min(times),
+		'max': max(times),
+		'spread': (max(times) - min(times)) / median * 100 if median else 0,
+	}
+
+
+def save_results(file_name, results, options):
+	"""Save the results (benchmark: result) in a JSON file."""
+
+	with open(file_name, 'w') as f:
+		json.dump(
+			{
+				'version': RESULTS_VERSION,
+				'options': options,
+				'benchmarks': results,
+			},
+			f,
+			indent='\t',
+		)
+
+		f.write('\n')
+
+
+def load_results(file_name):
+	"""Returns the results saved in a JSON file."""
+
+	with open(file_name, 'r') as f:
+		saved = json.load(f)
+
+	if saved.get('version') != RESULTS_VERSION:
+		print(f'invalid results file: {file_name}', file=sys.stderr)
+		exit(1)
+
+	return saved['benchmarks']
+
+
+def get_change(result, baseline):
+	"""Returns the change of the median of result from the baseline,
+	as a percentage."""
+
+	return (result['median'] - baseline['median']) / baseline['median'] * 100
+
+
+def report(results, baseline=None, threshold=DEFAULT_SLOWDOWN_THRESHOLD):
+	"""Returns the table of the results, compared with the baseline,
+	as a list of lines, and the names of the benchmarks that are
+	slower than the baseline."""
+
+	header = f'{"benchmark":<16} {"median ms":>10} {"min ms":>10}' \
+		+ f' {"max ms":>10} {"spread":>8}'
+
+	if baseline is not None:
+		header += f' {"baseline":>10} {"change":>8}'
+
+	lines = [header]
+	slower = []
+
+	for name, result in results.items():
+		if result is None:
+			lines.append(f'{name:<16} failed')
+			continue
+
+		line = f'{name:<16} {result["median"]:>10.2f} {result["min"]:>10.2f}' \
+			+ f' {result["max"]:>10.2f} {result["spread"]:>7.1f}%'
+
+		if baseline is not None and baseline.get(name):
+			change = get_change(result, baseline[name])
+			line += f' {baseline[name]["median"]:>10.2f} {change:>+7.1f}%'
+
+			if change > threshold:
+				line += '  slower'
+				slower.append(name)
+
+		lines.append(line)
+
+	return lines, slower
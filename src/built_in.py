@@ -24,6 +24,69 @@ built_in_functions = {
 	'fread':   built_in_function(1, OpCodes.FRD),  # (file)
 	'fclose':  built_in_function(1, OpCodes.FCL),  # (file)
 	'freadln': built_in_function(1, OpCodes.FRL),  # (file)
+	'clock':   built_in_function(0, OpCodes.CLK),  # ()
+	'flush':   built_in_function(1, OpCodes.FLS),  # (file)
+	'freadn':  built_in_function(2, OpCodes.FRN),  # (file, n)
+	'freadlines': built_in_function(2, OpCodes.FRS),  # (file, n)
+	'flines':  built_in_function(1, OpCodes.FIT),  # (file)
+	'fnext':   built_in_function(1, OpCodes.NXT),  # (lines)
+	'range':   built_in_function(1, OpCodes.RNG),  # (n)
+	'fill':    built_in_function(2, OpCodes.FIL),  # (n, value)
+	'slice':   built_in_function(3, OpCodes.SLC),  # (list, start, end)
+	'extend':  built_in_function(2, OpCodes.EXD),  # (list, other)
+	'index_of': built_in_function(2, OpCodes.IDX),  # (list, value)
+	'sum':     built_in_function(1, OpCodes.SUM),  # (list)
+	'sort':    built_in_function(1, OpCodes.SRT),  # (list)
+	'reverse': built_in_function(1, OpCodes.REV),  # (list)
+	'map':     built_in_function(0, OpCodes.MAP),  # ()
+	'get':     built_in_function(2, OpCodes.MGT),  # (map, key)
+	'put':     built_in_function(3, OpCodes.MPT),  # (map, key, value)
+	'has':     built_in_function(2, OpCodes.MHS),  # (map, key)
+	'delete':  built_in_function(2, OpCodes.MDL),  # (map, key)
+	'keys':    built_in_function(1, OpCodes.KYS),  # (map)
+	'join':    built_in_function(2, OpCodes.JON),  # (list, separator)
+	'builder': built_in_function(0, OpCodes.BLD),  # ()
+	'bappend': built_in_function(2, OpCodes.BAP),  # (builder, value)
+	'bfinish': built_in_function(1, OpCodes.BFN),  # (builder)
+	'format':  built_in_function(2, OpCodes.FMT),  # (template, list)
+	'iarray':  built_in_function(1, OpCodes.IAR),  # (size or list)
+	'farray':  built_in_function(1, OpCodes.FAR),  # (size or list)
+	'afill':   built_in_function(2, OpCodes.AFL),  # (array, value)
+	'aadd':    built_in_function(2, OpCodes.AAD),  # (array or number, array or number)
+	'asub':    built_in_function(2, OpCodes.ASB),  # (array or number, array or number)
+	'amul':    built_in_function(2, OpCodes.AML),  # (array or number, array or number)
+	'adiv':    built_in_function(2, OpCodes.ADV),  # (array or number, array or number)
+	'min':     built_in_function(1, OpCodes.MIN),  # (list)
+	'max':     built_in_function(1, OpCodes.MAX),  # (list)
+	'dot':     built_in_function(2, OpCodes.DOT),  # (list, list)
+}
+
+# functions with side effects, or that depend on more than their
+# arguments. a function that calls them is not pure
+impure_built_in_functions = {
+	'write',
+	'exit',
+	'append',
+	'pop',
+	'set',
+	'fopen',
+	'fwrite',
+	'fread',
+	'fclose',
+	'freadln',
+	'clock',
+	'flush',
+	'freadn',
+	'freadlines',
+	'flines',
+	'fnext',
+	'extend',
+	'sort',
+	'reverse',
+	'put',
+	'delete',
+	'bappend',
+	'afill',
 }
 
 
@@ -0,0 +1,96 @@
+# Lang Compiler
+# Author: Jonas
+
+# Cache of compiled code. The code of each source file is stored in
+# CACHE_DIRECTORY, in the same directory of the source, with the hashes
+# of the source and of the included files. The cached code is only
+# used if no one of these files has changed.
+
+import hashlib
+import json
+import os
+
+from code_generator import BYTECODE_VERSION
+
+CACHE_DIRECTORY = '__langcache__'
+
+
+def get_hash(source):
+	"""Returns the hash of a source."""
+
+	return hashlib.sha256(source.encode()).hexdigest()
+
+
+def get_cache_path(file_name):
+	"""Returns the path of the cached code of file_name."""
+
+	directory, base_name = os.path.split(os.path.abspath(file_name))
+
+	return os.path.join(directory, CACHE_DIRECTORY, base_name + '.vm')
+
+
+def load_code(file_name, source, options):
+	"""Returns the cached code of file_name compiled with options (a
+	dict), or None if there is no valid cached code."""
+
+	try:
+		with open(get_cache_path(file_name), 'rb') as f:
+			header, code = f.read().split(b'\n', 1)
+
+		header = json.loads(header)
+
+	except (OSError, ValueError):
+		return None
+
+	if header.get('version') != BYTECODE_VERSION \
+			or header.get('options') != options \
+			or header.get('source') != get_hash(source):
+
+		return None
+
+	# checks if the included files have changed
+	for included_file, included_file_hash in header['includes'].items():
+		try:
+			with open(included_file, 'r') as f:
+				if get_hash(f.read()) != included_file_hash:
+					return None
+
+		except OSError:
+			return None
+
+	return code
+
+
+def save_code(file_name, source, included_files, options, code):
+	"""Save the code of file_name, compiled with options, in cache.
+	Errors are ignored, the cache is only an optimization."""
+
+	try:
+		includes = {}
+
+		for included_file in included_files:
+			with open(included_file, 'r') as f:
+				includes[included_file] = get_hash(f.read())
+
+		header = {
+			'version': BYTECODE_VERSION,
+			'options': options,
+			'source': get_hash(source),
+			'includes': includes,
+		}
+
+		cache_path = get_cache_path(file_name)
+		os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+		# write in a temporary file and rename, so a concurrent run never
+		# reads an incomplete file
+		temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+
+		with open(temporary_path, 'wb') as f:
+			f.write(json.dumps(header).encode() + b'\n')
+			f.write(code)
+
+		os.replace(temporary_path, cache_path)
+
+	except OSError:
+		pass
@@ -7,21 +7,45 @@ from node import *
 from opcodes import OpCodes
 from token_ import TokenType
 
-VM_SIGNATURE = [ord(ch) for ch in '.lng\0']
+VM_SIGNATURE = b'.lng\0'
+
+# changes every time the format of the code changes
+BYTECODE_VERSION = 11
+
+
+def int32_to_bytes(int32):
+	"""Returns the bytes of an integer number (32 bits)."""
+
+	return list(int32.to_bytes(4, byteorder='big', signed=True))
 
 
 class CodeGenerator:
-	def __init__(self, ast):
+	def __init__(self, ast, tail_calls=True, memoized=()):
 		self.ast = ast
 
+		# if is True, a return of a call emits a tail call, that reuses
+		# the frame of the current function
+		self.tail_calls = tail_calls
+
+		# functions whose results are cached by the VM, they are called
+		# with a memoized call and return with a memoized return
+		self.memoized = set(memoized)
+
 		self.position = -1
 		self.current_node = None
 		self.update_current_node()
 
 		self.data_section = []
+
+		# string: index in data section
+		self.data_indexes = {}
 		self.code_section = []
 		self.current_address = 0
 
+		# list of (address, file name, line), the position of the
+		# instructions from address until the address of next entry
+		self.line_table = []
+
 		self.unary_instructions = {
 			TokenType.OPERATOR_MINUS: OpCodes.NEG,
 			TokenType.OPERATOR_NOT: OpCodes.NOT,
@@ -49,9 +73,34 @@ class CodeGenerator:
 		# function: address
 		self.functions_address = {}
 
+		# position of the entry point
+		self.main_position = None
+
+		# function: number of slots of its frame
+		self.functions_frame_size = {}
+
 		# address to link: function to link
 		self.address_to_link = {}
 
+		# variable: slot
+		self.globals = {}
+
+		# variable: slot, of the function being generated, or None in
+		# the top level
+		self.locals = None
+
+		# return instruction of the function being generated
+		self.return_instruction = OpCodes.RET
+
+		# each loop around the code being generated has the addresses
+		# of its continue jumps and of its break jumps, linked when the
+		# loop ends
+		self.loops = []
+
+		# number of for loops around the code being generated, each one
+		# keeps its iterator in a hidden variable
+		self.for_loops = 0
+
 	def update_current_node(self):
 		"""Update the current node."""
 
@@ -78,16 +127,12 @@ class CodeGenerator:
 		"""Returns the index of the parameter data_to_search in data
 		section."""
 
-		for position, data in enumerate(self.data_section):
-			if data == data_to_search:
-				return position
-
-		return -1
+		return self.data_indexes.get(data_to_search, -1)
 
 	def emit_int32(self, int32, custom_address=None):
 		"""Emit an integer number (32 bits)."""
 
-		for byte in int32.to_bytes(4, byteorder='big', signed=True):
+		for byte in int32_to_bytes(int32):
 			self.emit_instruction(byte, custom_address)
 
 			if custom_address is not None:
@@ -102,15 +147,103 @@ class CodeGenerator:
 			if custom_address is not None:
 				custom_address += 1
 
+	def add_data(self, string):
+		"""Returns the index of string in data section, adding it if
+		it is not there."""
+
+		if string in self.data_indexes:
+			return self.search_data(string)
+
+		self.data_indexes[string] = len(self.data_section)
+		self.data_section.append(string)
+		return len(self.data_section) - 1
+
 	def emit_string(self, string, custom_address=None):
 		"""Emit a string."""
 		
-		if string in self.data_section:
-			self.emit_int32(self.search_data(string), custom_address)
+		self.emit_int32(self.add_data(string), custom_address)
+
+	def mark_position(self, position):
+		"""Set the position of the instructions emitted from the
+		current address."""
+
+		entry = (self.current_address, position.file_name, position.line)
+
+		if self.line_table and self.line_table[-1][1:] == entry[1:]:
+			return
+
+		# the last position has no instructions
+		if self.line_table and self.line_table[-1][0] == entry[0]:
+			self.line_table.pop()
+
+		self.line_table.append(entry)
+
+	def declare_variable(self, name):
+		"""Returns the slot of a new variable, in the current function
+		frame or in globals."""
+
+		variables = self.globals if self.locals is None else self.locals
+
+		# variables of different blocks can not be visible at the same
+		# time, so they share the slot
+		if name not in variables:
+			variables[name] = len(variables)
+
+		return variables[name]
+
+	def emit_load_variable(self, name):
+		"""Emit the instruction that loads the variable name."""
+
+		if name in built_in_variables:
+			self.emit_instruction(OpCodes.LDB)
+			self.emit_string(name)
+
+		elif self.locals is not None and name in self.locals:
+			self.emit_instruction(OpCodes.LDV)
+			self.emit_int32(self.locals[name])
 
 		else:
-			self.data_section.append(string)
-			self.emit_int32(len(self.data_section) - 1, custom_address)
+			self.emit_instruction(OpCodes.LDG)
+			self.emit_int32(self.globals[name])
+
+	def emit_store_variable(self, name):
+		"""Emit the instruction that stores the top of stack in the
+		variable name."""
+
+		if self.locals is not None and name in self.locals:
+			self.emit_instruction(OpCodes.STO)
+			self.emit_int32(self.locals[name])
+
+		else:
+			self.emit_instruction(OpCodes.STG)
+			self.emit_int32(self.globals[name])
+
+	def emit_loop_jump(self, jumps):
+		"""Emit a jump of a break or a continue, linked when the loop
+		ends."""
+
+		self.emit_instruction(OpCodes.JMP)
+		jumps.append(self.current_address)
+		self.emit_int32(0)  # temporary address
+
+	def link_loop_jumps(self, jumps, address):
+		"""Link the jumps of a break or a continue to address."""
+
+		for jump_address in jumps:
+			self.emit_int32(address, jump_address)
+
+	def generate_loop_body(self, node):
+		"""Generate the body of a loop. Returns the addresses of its
+		continue jumps and of its break jumps."""
+
+		continue_jumps = []
+		break_jumps = []
+
+		self.loops.append((continue_jumps, break_jumps))
+		self.generate_node(node)
+		self.loops.pop()
+
+		return continue_jumps, break_jumps
 
 	def generate_node(self, node, preserve_function_return=True):
 		"""Generate the code of a node.
@@ -119,9 +252,7 @@ class CodeGenerator:
 		return, because is unecessary
 		"""
 
-		self.emit_instruction(OpCodes.POS)
-		self.emit_string(node.position.file_name)
-		self.emit_int32(node.position.line)
+		self.mark_position(node.position)
 
 		if isinstance(node, IntNode):
 			self.emit_instruction(OpCodes.LDI)
@@ -157,10 +288,6 @@ class CodeGenerator:
 				self.generate_node(statement, False)
 
 		elif isinstance(node, LetNode) or isinstance(node, AssignNode):
-			if isinstance(node, LetNode):
-				self.emit_instruction(OpCodes.LET)
-				self.emit_string(node.name)
-
 			if node.value is not None:
 				self.generate_node(node.value)
 			
@@ -168,30 +295,16 @@ class CodeGenerator:
 				# load nil
 				self.emit_instruction(OpCodes.LDN)
 
-			self.emit_instruction(OpCodes.STO)
-			self.emit_string(node.name)
-
-		elif isinstance(node, CallNode):
-			node.arguments.reverse()
-
-			for argument in node.arguments:
-				self.generate_node(argument)
-
-			if node.name in built_in_functions:
-				self.emit_instruction(built_in_functions[node.name][1])
-				return
-
-			self.emit_instruction(OpCodes.CAL)
-			self.emit_string(node.name)
+			if isinstance(node, LetNode):
+				self.declare_variable(node.name)
 
-			if node.name in self.functions_address:
-				self.emit_int32(self.functions_address[node.name])
+			self.emit_store_variable(node.name)
 
-			else:
-				self.address_to_link[self.current_address] = node.name
-				self.emit_int32(0)  # temporary address
+		elif isinstance(node, CallNode):
+			self.generate_call(node)
 
-			if not preserve_function_return:
+			if not preserve_function_return \
+					and node.name not in built_in_functions:
 				self.emit_instruction(OpCodes.POP)
 
 		elif isinstance(node, FnNode):
@@ -201,22 +314,34 @@ class CodeGenerator:
 
 			self.functions_address[node.name] = self.current_address
 
+			# the arguments are the first slots of the frame, and are
+			# stored by the call instruction
+			self.locals = {}
+
+			if node.name in self.memoized:
+				self.return_instruction = OpCodes.MRT
+
 			for argument in node.arguments:
-				self.emit_instruction(OpCodes.LET)
-				self.emit_string(argument.name)
-				self.emit_instruction(OpCodes.STO)
-				self.emit_string(argument.name)
+				self.declare_variable(argument.name)
 
 			self.generate_node(node.body)
 
-			if self.code_section[-1] != OpCodes.RET:
-				self.emit_instruction(OpCodes.RET)
+			# if the function no return, return nil
+			if not self.ends_with_return(node.body):
+				self.emit_instruction(OpCodes.LDN)
+				self.emit_instruction(self.return_instruction)
+
+			self.functions_frame_size[node.name] = len(self.locals)
+			self.locals = None
+			self.return_instruction = OpCodes.RET
+
+			if node.name == 'main':
+				self.main_position = node.position
 
 			self.emit_int32(self.current_address, jump_to_end_address)
 
 		elif isinstance(node, IdentifierNode):
-			self.emit_instruction(OpCodes.LDV)
-			self.emit_string(node.name)
+			self.emit_load_variable(node.name)
 
 		elif isinstance(node, WhileNode):
 			condition_address = self.current_address
@@ -226,11 +351,57 @@ class CodeGenerator:
 			jump_to_end_address = self.current_address
 			self.emit_int32(0)  # temporary address
 
-			self.generate_node(node.body)
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
 			self.emit_instruction(OpCodes.JMP)
 			self.emit_int32(condition_address)
 
 			self.emit_int32(self.current_address, jump_to_end_address)
+			self.link_loop_jumps(continue_jumps, condition_address)
+			self.link_loop_jumps(break_jumps, self.current_address)
+
+		elif isinstance(node, ForNode):
+			for value in node.values:
+				self.generate_node(value)
+
+			# the iterator is in a hidden variable, a name that is not
+			# an identifier. the for loops that are not nested share it
+			iterator = self.declare_variable(f'for {self.for_loops}')
+			variable = self.declare_variable(node.name)
+
+			self.mark_position(node.position)
+			self.emit_instruction(
+				OpCodes.ITR if len(node.values) == 1 else OpCodes.RGI
+			)
+			self.emit_int32(iterator)
+
+			# the for instruction is after the body, so each iteration
+			# is only one dispatch
+			self.emit_instruction(OpCodes.JMP)
+			jump_to_for_address = self.current_address
+			self.emit_int32(0)  # temporary address
+
+			body_address = self.current_address
+
+			self.for_loops += 1
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
+			self.for_loops -= 1
+
+			self.emit_int32(self.current_address, jump_to_for_address)
+			self.link_loop_jumps(continue_jumps, self.current_address)
+
+			self.mark_position(node.position)
+			self.emit_instruction(OpCodes.FOR)
+			self.emit_int32(iterator)
+			self.emit_int32(variable)
+			self.emit_int32(body_address)
+
+			self.link_loop_jumps(break_jumps, self.current_address)
+
+		elif isinstance(node, BreakNode):
+			self.emit_loop_jump(self.loops[-1][1])
+
+		elif isinstance(node, ContinueNode):
+			self.emit_loop_jump(self.loops[-1][0])
 
 		elif isinstance(node, IfNode):
 			self.generate_node(node.condition)
@@ -256,18 +427,33 @@ class CodeGenerator:
 				self.emit_int32(self.current_address, jump_false_address)
 
 		elif isinstance(node, ReturnNode):
+			# the result of a memoized function is cached when it
+			# returns, so it can not be replaced by a tail call, and a
+			# memoized function is not called by a tail call
+			if self.tail_calls \
+					and self.return_instruction == OpCodes.RET \
+					and isinstance(node.value, CallNode) \
+					and node.value.name not in built_in_functions \
+					and node.value.name not in self.memoized:
+				self.mark_position(node.value.position)
+				self.generate_call(node.value, OpCodes.TCL)
+				return
+
 			self.generate_node(node.value)
-			self.emit_instruction(OpCodes.RET)
+			self.emit_instruction(self.return_instruction)
 
 		elif isinstance(node, DoWhileNode):
 			body_address = self.current_address
-			self.generate_node(node.body)
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
 
+			self.link_loop_jumps(continue_jumps, self.current_address)
 			self.generate_node(node.condition)
 	
 			self.emit_instruction(OpCodes.JPT)
 			self.emit_int32(body_address)
 
+			self.link_loop_jumps(break_jumps, self.current_address)
+
 		elif isinstance(node, ListNode):
 			node.value.reverse()
 
@@ -286,26 +472,71 @@ class CodeGenerator:
 		else:
 			raise NotImplementedError(node)
 
+	def generate_call(self, node, instruction=OpCodes.CAL):
+		"""Generate the code of a call. Calls of functions that are not
+		built in use instruction, a call or a tail call."""
+
+		node.arguments.reverse()
+
+		for argument in node.arguments:
+			self.generate_node(argument)
+
+		if node.name in built_in_functions:
+			self.emit_instruction(built_in_functions[node.name][1])
+			return
+
+		if node.name in self.memoized:
+			instruction = OpCodes.MCL
+
+		self.emit_instruction(instruction)
+		self.emit_string(node.name)
+
+		# the frame size is known only after the function is
+		# generated, so the address and the frame size are linked
+		# in the end
+		self.address_to_link[self.current_address] = node.name
+		self.emit_int32(0)  # temporary address
+		self.emit_int32(0)  # temporary frame size
+		self.emit_int32(len(node.arguments))
+
+	def ends_with_return(self, node):
+		"""Returns if the last statement of node is a return."""
+
+		if isinstance(node, BlockNode):
+			return len(node.body) > 0 and self.ends_with_return(node.body[-1])
+
+		return isinstance(node, ReturnNode)
+
 	def link_addresses(self):
-		"""Link the addresses of functions."""
+		"""Link the addresses and frame sizes of functions."""
 
 		for address in self.address_to_link:
-			self.emit_int32(
-				self.functions_address[self.address_to_link[address]],
-				address,
-			)
+			function = self.address_to_link[address]
+
+			self.emit_int32(self.functions_address[function], address)
+			self.emit_int32(self.functions_frame_size[function], address + 4)
 
 	def generate(self):
 		"""Generate all code."""
 
+		# allocate the globals
+		self.emit_instruction(OpCodes.GBL)
+		number_of_globals_address = self.current_address
+		self.emit_int32(0)  # temporary number of globals
+
 		while self.current_node:
 			self.generate_node(self.current_node, False)
 			self.update_current_node()
 
-		# call the entry point
+		self.emit_int32(len(self.globals), number_of_globals_address)
+
+		# call the entry point, from the position of its declaration
+		self.mark_position(self.main_position)
 		self.emit_instruction(OpCodes.CAL)
 		self.emit_string('main')
 		self.emit_int32(self.functions_address['main'])
+		self.emit_int32(self.functions_frame_size['main'])
+		self.emit_int32(0)
 
 		# emit a halt instruction
 		self.emit_instruction(OpCodes.EXT)
@@ -313,17 +544,30 @@ class CodeGenerator:
 		# link all addresses
 		self.link_addresses()
 
-		# generate the bytes of data section
-		bytes_of_data_section = []
+		# generate the bytes of line table, before the data section
+		# because the file names are added in data section
+		bytes_of_line_table = int32_to_bytes(len(self.line_table))
 
-		for data in self.data_section:
-			for ch in data:
-				bytes_of_data_section.append(ord(ch))
-
-			bytes_of_data_section.append(0)
+		for address, file_name, line in self.line_table:
+			bytes_of_line_table += int32_to_bytes(address)
+			bytes_of_line_table += int32_to_bytes(self.add_data(file_name))
+			bytes_of_line_table += int32_to_bytes(line)
 
-		bytes_of_data_section.append(0)
+		# generate the bytes of data section: the number of strings,
+		# followed by the length and UTF-8 bytes of each string
+		bytes_of_data_section = int32_to_bytes(len(self.data_section))
 
-		# return all code
-		return VM_SIGNATURE + bytes_of_data_section + self.code_section
+		for data in self.data_section:
+			data = data.encode('utf-8')
+
+			bytes_of_data_section += int32_to_bytes(len(data))
+			bytes_of_data_section += data
+
+		# return all code, the version follows the signature
+		return VM_SIGNATURE + bytes(
+			int32_to_bytes(BYTECODE_VERSION)
+			+ bytes_of_data_section
+			+ bytes_of_line_table
+			+ self.code_section
+		)
 
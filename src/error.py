@@ -88,7 +88,20 @@ class UnreachableStatementError(Error):
 		super().__init__(position, ERROR, 'unreachable statement')
 
 
+class OutsideOfLoopError(Error):
+	def __init__(self, position, statement):
+		super().__init__(position, ERROR, f'{statement} outside of a loop')
+
+
 class FileNotFoundError_(Error):
 	def __init__(self, position, file_name):
 		super().__init__(position, ERROR, f'file not found: "{file_name}"')
 
+
+class NotPureWarning(Error):
+	def __init__(self, position, function):
+		super().__init__(
+			position,
+			WARNING,
+			f'function {function} is memoized, but it may not be pure',
+		)
@@ -3,33 +3,94 @@
 # Lang Compiler
 # Author: Jonas
 
-# TODO:
-# - Optimizer
-
+import json
+import mmap
 import sys
 
+import bench
+import cache
+from error import NotPureWarning, UndefinedError
 from lexer import Lexer
 from parser_ import Parser
 from semantic_analyzer import SemanticAnalyzer
+from optimizer import Optimizer
 from code_generator import CodeGenerator
-from vm import VM
+from peephole import Peephole
+from register_generator import RegisterGenerator
+from python_generator import PythonGenerator
+from vm import VM, DISPATCH_TABLE, DISPATCH_SWITCH, DEFAULT_MEMO_SIZE
+from register_vm import RegisterVM
+import python_runtime
+from tracer import Tracer, DEFAULT_TRACE_THRESHOLD
+from profiler import Profiler
+from sampler import Sampler, DEFAULT_SAMPLE_INTERVAL
+
+# backends
+BACKEND_STACK = 'stack'  # bytecode of a stack machine, run by VM
+BACKEND_REGISTER = 'reg'  # instructions of registers, run by RegisterVM
+BACKEND_PYTHON = 'py'  # Python source, run by python_runtime
 
 
-def read_file(file_name):
-	with open(file_name, 'r') as f:
-		source = f.read()
+def read_file(file_name, mode='r'):
+	try:
+		with open(file_name, mode) as f:
+			source = f.read()
+
+	except FileNotFoundError:
+		print(f'no such file {file_name}')
+		exit(1)
 	
 	return source
 
 
-def compile_from_file(file_name):
+def map_file(file_name):
+	"""Returns the bytes of file_name mapped in memory, so they are
+	not copied."""
+
 	try:
-		source = read_file(file_name)
+		with open(file_name, 'rb') as f:
+			return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
 	except FileNotFoundError:
 		print(f'no such file {file_name}')
 		exit(1)
 
+	# empty file
+	except ValueError:
+		return b''
+
+
+def get_memoized_functions(sa, memo):
+	"""Returns the functions to memoize. memo is None to memoize no
+	function, an empty list to memoize the pure functions, or the list
+	of the functions marked to memoize."""
+
+	if memo is None:
+		return set()
+
+	pure = sa.get_pure_functions()
+
+	# main is called only once
+	if not memo:
+		return pure - {'main'}
+
+	for name in memo:
+		if not sa.function_exists(name):
+			error = UndefinedError(None, name)
+			error.show_error_and_abort()
+
+		if name not in pure:
+			warning = NotPureWarning(sa.functions[name].position, name)
+			warning.show_error()
+
+	return set(memo) - {'main'}
+
+
+def analyze_source(file_name, source, optimize=True, report=False):
+	"""Returns the AST of source, its semantic analyzer, and the
+	files included by it. If optimize is True, the AST is optimized,
+	and if report is True, the report of the optimizer is shown."""
+
 	# lexer
 	lexer = Lexer(file_name, source)
 	tokens = lexer.lex()
@@ -42,53 +103,468 @@ def compile_from_file(file_name):
 	sa = SemanticAnalyzer(ast)
 	sa.analyze()
 
+	# optimizer
+	if optimize:
+		optimizer = Optimizer(ast)
+		ast = optimizer.optimize()
+
+		if report:
+			print('\n'.join(optimizer.report()), file=sys.stderr)
+
+	return ast, sa, parser.included_files
+
+
+def compile_source(file_name, source, optimize=True, report=False,
+		memo=None):
+	"""Returns the code of source, and the files included by it. If
+	report is True, the reports of the optimizations are shown. memo
+	is given to get_memoized_functions."""
+
+	ast, sa, included_files = analyze_source(
+		file_name,
+		source,
+		optimize,
+		report,
+	)
+
+	memoized = get_memoized_functions(sa, memo)
+
 	# code generator
-	cg = CodeGenerator(ast)
+	cg = CodeGenerator(ast, tail_calls=optimize, memoized=memoized)
 	code = cg.generate()
 
+	# peephole optimizer
+	if optimize:
+		peephole = Peephole(code)
+		code = peephole.optimize()
+
+		if report:
+			print('\n'.join(peephole.report()), file=sys.stderr)
+
+	return code, included_files
+
+
+def compile_from_file(file_name, optimize=True, report=False, memo=None,
+		use_cache=False):
+	"""Returns the code of file_name. If use_cache is True, the code
+	is loaded from cache when the source and the included files have
+	not changed, and saved in cache when compiled."""
+
+	source = read_file(file_name)
+	options = {'optimize': optimize, 'memo': memo}
+
+	if use_cache:
+		code = cache.load_code(file_name, source, options)
+
+		if code is not None:
+			return code
+
+	code, included_files = compile_source(
+		file_name,
+		source,
+		optimize,
+		report,
+		memo,
+	)
+
+	if use_cache:
+		cache.save_code(file_name, source, included_files, options, code)
+
 	return code
 
 
+def compile_to_registers(file_name, optimize=True, report=False):
+	"""Returns the instructions and the line table of file_name, in
+	the register backend."""
+
+	ast, _, _ = analyze_source(
+		file_name,
+		read_file(file_name),
+		optimize,
+		report,
+	)
+
+	rg = RegisterGenerator(ast)
+
+	return rg.generate()
+
+
+def compile_to_python(file_name, optimize=True, report=False):
+	"""Returns the Python source of file_name, and the (file name,
+	line) of each line of the source."""
+
+	ast, _, _ = analyze_source(
+		file_name,
+		read_file(file_name),
+		optimize,
+		report,
+	)
+
+	pg = PythonGenerator(ast)
+
+	return pg.generate()
+
+
+def make_run(file_name, flags, backend, dispatch, memo_size, jit_threshold):
+	"""Returns a function that runs file_name, compiled only once,
+	like the run option. The function is called with the file where
+	the text written to stdout goes."""
+
+	optimize = 'no-optimize' not in flags
+
+	if backend == BACKEND_PYTHON:
+		source, positions = compile_to_python(file_name, optimize)
+
+		return lambda stdout: python_runtime.run(source, positions, stdout=stdout)
+
+	elif backend == BACKEND_REGISTER:
+		instructions, line_table = compile_to_registers(file_name, optimize)
+
+		def run_registers(stdout):
+			vm = RegisterVM(instructions, line_table)
+			vm.redirect_stdout(stdout)
+			vm.protected_run()
+
+		return run_registers
+
+	code = compile_from_file(
+		file_name,
+		optimize,
+		memo=get_memo(flags),
+		use_cache=False,
+	)
+
+	def run(stdout):
+		vm = VM(code, dispatch, memo_size)
+		vm.redirect_stdout(stdout)
+
+		if 'jit' in flags:
+			Tracer(vm, jit_threshold)
+
+		vm.protected_run()
+
+	return run
+
+
+def run_benchmarks(paths, flags, backend, dispatch, memo_size,
+		jit_threshold):
+	"""Run the benchmarks in paths, show the results compared with
+	the baseline, and save them. Exits with 1 if a benchmark has failed
+	or is slower than the baseline."""
+
+	repeat = flags.get('repeat', str(bench.DEFAULT_REPEAT))
+
+	if not repeat.isdigit() or int(repeat) < 1:
+		print(f'invalid repeat: {repeat}')
+		usage()
+		exit(1)
+
+	threshold = flags.get('threshold', str(bench.DEFAULT_SLOWDOWN_THRESHOLD))
+
+	if not threshold.isdigit():
+		print(f'invalid threshold: {threshold}')
+		usage()
+		exit(1)
+
+	results = {}
+
+	for file_name in bench.find_benchmarks(paths):
+		run = make_run(file_name, flags, backend, dispatch, memo_size, jit_threshold)
+		results[bench.get_benchmark_name(file_name)] = bench.measure(run, int(repeat))
+
+	baseline = None
+
+	if flags.get('baseline'):
+		baseline = bench.load_results(flags['baseline'])
+
+	lines, slower = bench.report(results, baseline, int(threshold))
+	print('\n'.join(lines))
+
+	if flags.get('save'):
+		bench.save_results(flags['save'], results, {
+			'backend': backend,
+			'dispatch': dispatch,
+			'optimize': 'no-optimize' not in flags,
+			'memo': get_memo(flags),
+			'jit': 'jit' in flags,
+			'repeat': int(repeat),
+		})
+
+	if slower or None in results.values():
+		exit(1)
+
+
+def get_flags(arguments):
+	"""Separate the flags (--name=value) from the other arguments.
+	Returns the flags as a dict, and the other arguments."""
+
+	flags = {}
+	others = []
+
+	for argument in arguments:
+		if argument.startswith('--'):
+			name, _, value = argument[2:].partition('=')
+			flags[name] = value
+
+		else:
+			others.append(argument)
+
+	return flags, others
+
+
+def get_memo(flags):
+	"""Returns the memo option of the flags: None without --memo,
+	else the list of functions given to --memo."""
+
+	if 'memo' not in flags:
+		return None
+
+	return [name for name in flags['memo'].split(',') if name]
+
+
 def usage():
-	print(f'usage: {sys.argv[0]} <option> [file]')
+	print(f'usage: {sys.argv[0]} <option> [flags] [file]')
 	print('<option>')
 	print('  build <file>      compile <file>')
 	print('  asm   <file>      show assembly code of <file>')
+	print('  bench [files]     run the benchmarks in [files] (files or')
+	print('                    directories, default benchmarks/)')
+	print('  exec  <file.vm>   run <file.vm>, compiled by build')
 	print('  help              this message')
+	print('  profile <file>    run <file>, showing the time of each function')
+	print('                    and the count of each opcode')
 	print('  run   <file>      run <file>')
+	print('[flags]')
+	print('  --backend=<backend>  backend of run and asm: stack (default),')
+	print('                       reg (registers) or py (Python source),')
+	print('                       without memo')
+	print('  --dispatch=<engine>  dispatch engine of run and exec: table')
+	print('                       (default) or switch')
+	print('  --line-buffered      write the output of run and exec at the end')
+	print('                       of each line (default in a terminal)')
+	print('  --no-cache           run without the cache of compiled code')
+	print('  --no-optimize        compile without optimizations')
+	print('  --report             show what the optimizations have done')
+	print('  --memo[=<functions>] cache the results of the pure functions,')
+	print('                       or of the given functions (separated by')
+	print('                       commas)')
+	print('  --memo-size=<n>      results cached by each memoized function')
+	print(f'                       (default {DEFAULT_MEMO_SIZE})')
+	print('  --memo-stats         show the hits and misses of the memoized')
+	print('                       functions')
+	print('  --jit                compile the hot loops of run and exec to')
+	print('                       Python (stack backend, table dispatch)')
+	print('  --jit-threshold=<n>  iterations of a loop before it is compiled')
+	print(f'                       (default {DEFAULT_TRACE_THRESHOLD})')
+	print('  --jit-stats          show the loops compiled by --jit')
+	print('  --collapsed=<file>   file of the stacks of calls of profile,')
+	print('                       for flame graphs (default <file>.collapsed)')
+	print('  --sample[=<file>]    sample the stacks of calls of run and exec,')
+	print('                       written in <file> at exit, for flame graphs')
+	print('                       (default <file>.samples)')
+	print('  --sample-interval=<ms>  milliseconds between samples')
+	print(f'                       (default {DEFAULT_SAMPLE_INTERVAL})')
+	print('  --stats=<file.json>  save the counters of run and exec: opcodes,')
+	print('                       peak stack and call depths, slots, calls')
+	print('                       and files opened (stack backend)')
+	print('  --repeat=<n>         runs of each benchmark of bench')
+	print(f'                       (default {bench.DEFAULT_REPEAT})')
+	print('  --save=<file.json>   save the results of bench')
+	print('  --baseline=<file.json>  compare the results of bench with')
+	print('                       the results saved in <file.json>')
+	print('  --threshold=<n>      percentage of the baseline above which a')
+	print('                       benchmark is slower (default'
+		+ f' {bench.DEFAULT_SLOWDOWN_THRESHOLD})')
 
 
 def main():
-	if len(sys.argv) < 2:
+	flags, arguments = get_flags(sys.argv)
+
+	if len(arguments) < 2:
 		usage()
 		exit(1)
 
-	option = sys.argv[1]
+	option = arguments[1]
 
 	if option == 'build':
-		if len(sys.argv) < 3:
+		if len(arguments) < 3:
 			print('build need <file>')
 			usage()
 			exit(1)
 
-		file_name = sys.argv[2]
-		code = compile_from_file(file_name)
+		file_name = arguments[2]
+		code = compile_from_file(
+			file_name,
+			optimize='no-optimize' not in flags,
+			report='report' in flags,
+			memo=get_memo(flags),
+		)
 
 		with open(file_name + '.vm', 'wb') as f:
-			f.write(bytearray(code))
+			f.write(code)
 
-	elif option in ('run', 'asm'):
-		if len(sys.argv) < 3:
-			print('run need <file>')
+	elif option in ('run', 'asm', 'exec', 'profile', 'bench'):
+		if len(arguments) < 3 and option != 'bench':
+			print(f'{option} need <file>')
 			usage()
 			exit(1)
 
-		file_name = sys.argv[2]
-		code = compile_from_file(file_name)
-		vm = VM(code)
+		dispatch = flags.get('dispatch', DISPATCH_TABLE)
 
-		if option == 'run':
-			vm.protected_run()
+		if dispatch not in (DISPATCH_TABLE, DISPATCH_SWITCH):
+			print(f'unknown dispatch engine: {dispatch}')
+			usage()
+			exit(1)
+
+		memo_size = flags.get('memo-size', str(DEFAULT_MEMO_SIZE))
+
+		if not memo_size.isdigit():
+			print(f'invalid memo size: {memo_size}')
+			usage()
+			exit(1)
+
+		jit_threshold = flags.get('jit-threshold', str(DEFAULT_TRACE_THRESHOLD))
+
+		if not jit_threshold.isdigit() or int(jit_threshold) < 1:
+			print(f'invalid jit threshold: {jit_threshold}')
+			usage()
+			exit(1)
+
+		sample_interval = flags.get(
+			'sample-interval',
+			str(DEFAULT_SAMPLE_INTERVAL),
+		)
+
+		if not sample_interval.isdigit() or int(sample_interval) < 1:
+			print(f'invalid sample interval: {sample_interval}')
+			usage()
+			exit(1)
+
+		backend = flags.get('backend', BACKEND_STACK)
+
+		if backend not in (BACKEND_STACK, BACKEND_REGISTER, BACKEND_PYTHON) \
+				or backend != BACKEND_STACK and option in ('exec', 'profile'):
+			print(f'unknown backend of {option}: {backend}')
+			usage()
+			exit(1)
+
+		# the jit counts the loops in the handlers of the jumps
+		if 'jit' in flags \
+				and (backend != BACKEND_STACK or dispatch != DISPATCH_TABLE):
+			print('--jit needs the stack backend and the table dispatch')
+			usage()
+			exit(1)
+
+		if 'stats' in flags and (backend != BACKEND_STACK or not flags['stats']):
+			print('--stats needs a file and the stack backend')
+			usage()
+			exit(1)
+
+		# the samples are taken from the call stack of the VM
+		if 'sample' in flags and backend == BACKEND_PYTHON:
+			print('--sample needs the stack or reg backend')
+			usage()
+			exit(1)
+
+		if option == 'bench':
+			run_benchmarks(
+				arguments[2:],
+				flags,
+				backend,
+				dispatch,
+				int(memo_size),
+				int(jit_threshold),
+			)
+
+			return
+
+		file_name = arguments[2]
+
+		if backend == BACKEND_PYTHON:
+			source, positions = compile_to_python(
+				file_name,
+				optimize='no-optimize' not in flags,
+				report='report' in flags,
+			)
+
+			if option == 'asm':
+				print(source, end='')
+
+			else:
+				python_runtime.run(
+					source,
+					positions,
+					line_buffered=True if 'line-buffered' in flags else None,
+				)
+
+			return
+
+		if backend == BACKEND_REGISTER:
+			vm = RegisterVM(*compile_to_registers(
+				file_name,
+				optimize='no-optimize' not in flags,
+				report='report' in flags,
+			))
+
+		elif option == 'exec':
+			vm = VM(map_file(file_name), dispatch, int(memo_size))
+
+		else:
+			# the report is shown only when the code is compiled
+			code = compile_from_file(
+				file_name,
+				optimize='no-optimize' not in flags,
+				report='report' in flags,
+				memo=get_memo(flags),
+				use_cache=option in ('run', 'profile')
+					and 'no-cache' not in flags
+					and 'report' not in flags,
+			)
+
+			vm = VM(code, dispatch, int(memo_size))
+
+		if option in ('run', 'exec', 'profile'):
+			tracer = Tracer(vm, int(jit_threshold)) if 'jit' in flags else None
+			profiler = Profiler(vm) if option == 'profile' else None
+			sampler = None
+
+			if 'line-buffered' in flags:
+				vm.set_line_buffered()
+
+			if 'stats' in flags:
+				vm.enable_stats()
+
+			if 'sample' in flags:
+				sampler = Sampler(vm, int(sample_interval))
+				sampler.start()
+
+			try:
+				(profiler or vm).protected_run()
+
+			finally:
+				if vm.stats is not None:
+					with open(flags['stats'], 'w') as f:
+						json.dump(vm.stats.as_dict(), f, indent='\t')
+						f.write('\n')
+
+				if sampler is not None:
+					sampler.stop()
+					sampler.write(flags['sample'] or file_name + '.samples')
+
+				if 'memo-stats' in flags:
+					print('\n'.join(vm.memo_report()), file=sys.stderr)
+
+				if 'jit-stats' in flags and tracer is not None:
+					print('\n'.join(tracer.report()), file=sys.stderr)
+
+				if profiler is not None:
+					print('\n'.join(profiler.report()), file=sys.stderr)
+					collapsed = flags.get('collapsed') or file_name + '.collapsed'
+
+					with open(collapsed, 'w') as f:
+						f.write(''.join(
+							line + '\n' for line in profiler.collapsed_stacks()
+						))
 
 		elif option == 'asm':
 			vm.disassemble()
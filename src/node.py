@@ -121,6 +121,29 @@ class WhileNode(Node):
 		return f'(while {self.condition} {self.body})'
 
 
+class ForNode(Node):
+	def __init__(self, position, name, values, body):
+		super().__init__(position)
+		self.name = name
+
+		# [iterable] or [start, end]
+		self.values = values
+		self.body = body
+	
+	def __repr__(self):
+		return f'(for {self.name} {self.values} {self.body})'
+
+
+class BreakNode(Node):
+	def __repr__(self):
+		return '(break)'
+
+
+class ContinueNode(Node):
+	def __repr__(self):
+		return '(continue)'
+
+
 class CallNode(Node):
 	def __init__(self, position, name, arguments):
 		super().__init__(position)
@@ -1,17 +1,19 @@
 # Lang Compiler
 # Author: Jonas
 
+import struct
+
 class OpCodes:
 	HLT =  0  # halt
 	LDI =  1  # load int <value>
 	LDF =  2  # load float <value>
 	LDS =  3  # load string <value>
-	STO =  4  # store <name>
-	LDV =  5  # load variable
+	STO =  4  # store <slot>
+	LDV =  5  # load variable <slot>
 	JMP =  6  # jump <address>
 	JPT =  7  # jump true <address>
 	JPF =  8  # jump false <address>
-	CAL =  9  # call <address>
+	CAL =  9  # call <name> <address> <number of slots> <number of arguments>
 	RET = 10  # return
 	LDN = 11  # load nil
 	NOP = 12  # noop
@@ -33,7 +35,7 @@ class OpCodes:
 	DUP = 28  # duplicate
 	INC = 29  # increment
 	DEC = 30  # decrement
-	LET = 31  # let <name>
+	LDG = 31  # load global <slot>
 	BNT = 32  # bitwise not
 	SHL = 33  # shift left
 	SHR = 34  # shift right
@@ -55,5 +57,172 @@ class OpCodes:
 	FRD = 50  # file read
 	FCL = 51  # file close
 	FRL = 52  # read line
-	POS = 53  # position <file> <line> <column>
+	STG = 53  # store global <slot>
+	LDB = 54  # load built in variable <name>
+	GBL = 55  # globals <number of slots>
+
+	# superinstructions, emitted by the peephole optimizer
+	IVI = 56  # increment variable <slot> <int>
+	AVI = 57  # add variable and int <slot> <int>
+	CJF = 58  # compare and jump false <comparison opcode> <address>
+	LVV = 59  # load variables <slot> <slot>
+	LVI = 60  # load variable and int <slot> <int>
+
+	TCL = 61  # tail call <name> <address> <number of slots> <number of arguments>
+	MCL = 62  # memoized call <name> <address> <number of slots> <number of arguments>
+	MRT = 63  # memoized return
+
+	CLK = 64  # clock
+	FLS = 65  # flush
+	FRN = 66  # fread n
+	FRS = 67  # fread lines
+	FIT = 68  # file lines iterator
+	NXT = 69  # fnext
+
+	RNG = 70  # range
+	FIL = 71  # fill
+	SLC = 72  # slice
+	EXD = 73  # extend
+	IDX = 74  # index of
+	SUM = 75  # sum
+	SRT = 76  # sort
+	REV = 77  # reverse
+
+	ITR = 78  # iterator <slot>
+	RGI = 79  # range iterator <slot>
+	FOR = 80  # for <iterator slot> <variable slot> <address>
+
+	MAP = 81  # map
+	MGT = 82  # map get
+	MPT = 83  # map put
+	MHS = 84  # map has
+	MDL = 85  # map delete
+	KYS = 86  # keys
+
+	JON = 87  # join
+	BLD = 88  # builder
+	BAP = 89  # builder append
+	BFN = 90  # builder finish
+	FMT = 91  # format
+
+	# the numbers from 100 to 119 are of the register instructions
+	IAR = 120  # int array
+	FAR = 121  # float array
+	AFL = 122  # array fill
+	AAD = 123  # array add
+	ASB = 124  # array sub
+	AML = 125  # array mul
+	ADV = 126  # array div
+	MIN = 127  # min
+	MAX = 128  # max
+	DOT = 129  # dot product
+
+	# quickened instructions, never emitted in the code, so they are
+	# numbered apart. the VM rewrites an instruction into its quickened
+	# version when its operands are ints or floats, and back when the
+	# types change
+	ADI = 200  # add ints
+	SBI = 201  # sub ints
+	MLI = 202  # mul ints
+	DVI = 203  # div ints
+	EQI = 204  # equal ints
+	NEI = 205  # not equal ints
+	LTI = 206  # less than ints
+	LEI = 207  # less or equal than ints
+	GTI = 208  # greater than ints
+	GEI = 209  # greater or equal than ints
+	ADF = 210  # add floats
+	SBF = 211  # sub floats
+	MLF = 212  # mul floats
+	DVF = 213  # div floats
+	EQF = 214  # equal floats
+	NEF = 215  # not equal floats
+	LTF = 216  # less than floats
+	LEF = 217  # less or equal than floats
+	GTF = 218  # greater than floats
+	GEF = 219  # greater or equal than floats
+	CJI = 220  # compare ints and jump false <comparison opcode> <address>
+	CJD = 221  # compare floats and jump false <comparison opcode> <address>
+
+
+# instructions of the register backend. the operands are slots of the
+# frame of the current function, or of the globals. the binary and
+# unary operations have the numbers of the stack instructions, with
+# the operands <dst> <a> [<b>]
+class RegisterOpCodes:
+	MOV = 100  # move <dst> <src>
+	LDG = 101  # load global <dst> <global slot>
+	STG = 102  # store global <global slot> <src>
+	LDB = 103  # load built in variable <dst> <name>
+	JMP = 104  # jump <address>
+	JPT = 105  # jump true <src> <address>
+	JPF = 106  # jump false <src> <address>
+	CAL = 107  # call <dst> <name> <address> <frame template> <argument slots>
+	RET = 108  # return <src>
+	LST = 109  # list <dst> <slots>
+	BLT = 110  # built in function <stack instruction> <dst> <argument slots>
+	GBL = 111  # globals <number of slots> <frame template>
+	ITR = 112  # iterator <dst> <src>
+	RGI = 113  # range iterator <dst> <start> <end>
+	FOR = 114  # for <iterator slot> <variable slot> <address>
+
+
+class OperandTypes:
+	INT = 'int'          # int32
+	FLOAT = 'float'      # 64 bits float
+	STRING = 'string'    # int32, index in data section
+	ADDRESS = 'address'  # int32, address in code section
+
+
+# operands of each instruction, instructions that are not here have no
+# operands
+operands = {
+	OpCodes.LDI: (OperandTypes.INT,),
+	OpCodes.LDF: (OperandTypes.FLOAT,),
+	OpCodes.LDS: (OperandTypes.STRING,),
+	OpCodes.STO: (OperandTypes.INT,),
+	OpCodes.LDV: (OperandTypes.INT,),
+	OpCodes.JMP: (OperandTypes.ADDRESS,),
+	OpCodes.JPT: (OperandTypes.ADDRESS,),
+	OpCodes.JPF: (OperandTypes.ADDRESS,),
+	OpCodes.CAL: (
+		OperandTypes.STRING,
+		OperandTypes.ADDRESS,
+		OperandTypes.INT,
+		OperandTypes.INT,
+	),
+	OpCodes.LDG: (OperandTypes.INT,),
+	OpCodes.LDL: (OperandTypes.INT,),
+	OpCodes.STG: (OperandTypes.INT,),
+	OpCodes.LDB: (OperandTypes.STRING,),
+	OpCodes.GBL: (OperandTypes.INT,),
+	OpCodes.TCL: (
+		OperandTypes.STRING,
+		OperandTypes.ADDRESS,
+		OperandTypes.INT,
+		OperandTypes.INT,
+	),
+	OpCodes.MCL: (
+		OperandTypes.STRING,
+		OperandTypes.ADDRESS,
+		OperandTypes.INT,
+		OperandTypes.INT,
+	),
+	OpCodes.IVI: (OperandTypes.INT, OperandTypes.INT),
+	OpCodes.AVI: (OperandTypes.INT, OperandTypes.INT),
+	OpCodes.CJF: (OperandTypes.INT, OperandTypes.ADDRESS),
+	OpCodes.LVV: (OperandTypes.INT, OperandTypes.INT),
+	OpCodes.LVI: (OperandTypes.INT, OperandTypes.INT),
+	OpCodes.ITR: (OperandTypes.INT,),
+	OpCodes.RGI: (OperandTypes.INT,),
+	OpCodes.FOR: (OperandTypes.INT, OperandTypes.INT, OperandTypes.ADDRESS),
+}
 
+# opcode: struct of its operands (big endian)
+operands_structs = {
+	opcode: struct.Struct('!' + ''.join(
+		'd' if operand_type == OperandTypes.FLOAT else 'i'
+		for operand_type in operand_types
+	))
+	for opcode, operand_types in operands.items()
+}
@@ -0,0 +1,358 @@
+# Lang Compiler
+# Author: Jonas
+
+# AST optimizer. Folds constant expressions and removes the code that
+# is never executed, so the code generator emits less code.
+
+from node import *
+from token_ import TokenType
+
+INT32_MIN = -2 ** 31
+INT32_MAX = 2 ** 31 - 1
+
+# the biggest shift count folded, bigger shifts never fit in 32 bits
+MAX_SHIFT_COUNT = 32
+
+
+def format_position(position):
+	"""Returns the position as file:line, like the VM errors."""
+
+	return '%s:%.2d' %(position.file_name, position.line)
+
+
+class Optimizer:
+	def __init__(self, ast):
+		self.ast = ast
+
+		# the operations work as in the VM. the operations that are not
+		# generated by the code generator, or that do not result in a
+		# literal (like '!=' and '!', that result in a bool), are not
+		# folded
+		self.unary_operations = {
+			TokenType.OPERATOR_PLUS: lambda a: +a,
+			TokenType.OPERATOR_MINUS: lambda a: -a,
+			TokenType.OPERATOR_BTW_NOT: lambda a: ~a,
+		}
+
+		self.binary_operations = {
+			TokenType.OPERATOR_PLUS: lambda a, b: a + b,
+			TokenType.OPERATOR_MINUS: lambda a, b: a - b,
+			TokenType.OPERATOR_ASTERISK: lambda a, b: a * b,
+			TokenType.OPERATOR_SLASH: lambda a, b: a / b,
+			TokenType.OPERATOR_EQ: lambda a, b: int(a == b),
+			TokenType.OPERATOR_LT: lambda a, b: int(a < b),
+			TokenType.OPERATOR_LE: lambda a, b: int(a <= b),
+			TokenType.OPERATOR_GT: lambda a, b: int(a > b),
+			TokenType.OPERATOR_GE: lambda a, b: int(a >= b),
+			TokenType.OPERATOR_BTW_AND: lambda a, b: a & b,
+			TokenType.OPERATOR_BTW_OR: lambda a, b: a | b,
+			TokenType.OPERATOR_BTW_XOR: lambda a, b: a ^ b,
+			TokenType.OPERATOR_BTW_SHL: lambda a, b: a << b,
+			TokenType.OPERATOR_BTW_SHR: lambda a, b: a >> b,
+		}
+
+		self.literals = {
+			int: IntNode,
+			float: FloatNode,
+			str: StringNode,
+		}
+
+		self.expressions_folded = 0
+		self.statements_removed = 0
+
+		# list of (position, description) of each change
+		self.changes = []
+
+	def is_constant(self, node):
+		"""Returns if node is a literal that can be folded. The
+		operations with nil are errors, shown when the program runs."""
+
+		return type(node) in (IntNode, FloatNode, StringNode)
+
+	def is_constant_condition(self, node):
+		"""Returns if node is a condition known at compile time, a
+		literal."""
+
+		return type(node) in (IntNode, FloatNode, StringNode, NilNode)
+
+	def get_constant_value(self, node):
+		"""Returns the value of a literal, None for nil."""
+
+		return None if isinstance(node, NilNode) else node.value
+
+	def make_literal(self, position, value):
+		"""Returns the literal node of value, or None if value can not
+		be emitted as a literal."""
+
+		if type(value) not in self.literals:
+			return None
+
+		if type(value) == int and not INT32_MIN <= value <= INT32_MAX:
+			return None
+
+		return self.literals[type(value)](position, value)
+
+	def fold_unary_operation(self, node):
+		"""Returns the literal result of the unary operation node, or
+		None if it can not be folded."""
+
+		if node.operator not in self.unary_operations \
+				or not self.is_constant(node.left):
+			return None
+
+		try:
+			value = self.unary_operations[node.operator](node.left.value)
+
+		# the error is shown when the program runs
+		except TypeError:
+			return None
+
+		return self.make_literal(node.position, value)
+
+	def fold_binary_operation(self, node):
+		"""Returns the literal result of the binary operation node, or
+		None if it can not be folded."""
+
+		if node.operator not in self.binary_operations \
+				or not self.is_constant(node.left) \
+				or not self.is_constant(node.right):
+			return None
+
+		a = node.left.value
+		b = node.right.value
+
+		# the errors of the VM are shown when the program runs
+		try:
+			a + b
+		except TypeError:
+			return None
+
+		if node.operator == TokenType.OPERATOR_SLASH and b == 0:
+			return None
+
+		if node.operator in (
+				TokenType.OPERATOR_BTW_SHL,
+				TokenType.OPERATOR_BTW_SHR) \
+				and not 0 <= b <= MAX_SHIFT_COUNT:
+			return None
+
+		try:
+			value = self.binary_operations[node.operator](a, b)
+		except TypeError:
+			return None
+
+		return self.make_literal(node.position, value)
+
+	def always_returns(self, node):
+		"""Returns if node returns in all paths."""
+
+		if isinstance(node, ReturnNode):
+			return True
+
+		elif isinstance(node, BlockNode):
+			return any(self.always_returns(statement) for statement in node.body)
+
+		elif isinstance(node, IfNode):
+			return node.else_body is not None \
+				and self.always_returns(node.if_body) \
+				and self.always_returns(node.else_body)
+
+		return False
+
+	def has_loop_jumps(self, node):
+		"""Returns if node has a break or a continue of the loop around
+		it, and not of an inner loop."""
+
+		if isinstance(node, BreakNode) or isinstance(node, ContinueNode):
+			return True
+
+		elif isinstance(node, BlockNode):
+			return any(self.has_loop_jumps(statement) for statement in node.body)
+
+		elif isinstance(node, IfNode):
+			return self.has_loop_jumps(node.if_body) \
+				or node.else_body is not None \
+				and self.has_loop_jumps(node.else_body)
+
+		return False
+
+	def can_remove(self, node):
+		"""Returns if node can be removed from the body of an if or a
+		loop. A let outside of a block declares the variable in the
+		scope of the if or the loop, so it is kept."""
+
+		return not isinstance(node, LetNode)
+
+	def add_change(self, position, description):
+		"""Add a change in the report."""
+
+		self.changes.append((position, description))
+
+	def remove(self, node, description):
+		"""Returns an empty block in place of node, and add it in the
+		report."""
+
+		self.statements_removed += 1
+		self.add_change(node.position, description)
+
+		return BlockNode(node.position, [])
+
+	def optimize_block(self, node):
+		"""Optimize the statements of a block, removing the empty blocks
+		and the statements after a return."""
+
+		body = []
+		unreachable = []
+
+		for index, statement in enumerate(node.body):
+			statement = self.optimize_node(statement)
+
+			if isinstance(statement, BlockNode) and not statement.body:
+				continue
+
+			body.append(statement)
+
+			if self.always_returns(statement):
+				unreachable = node.body[index + 1:]
+				break
+
+		for statement in unreachable:
+			if isinstance(statement, BlockNode) and not statement.body:
+				continue
+
+			self.statements_removed += 1
+			self.add_change(
+				statement.position,
+				'removed unreachable statement after return',
+			)
+
+		node.body = body
+
+		return node
+
+	def optimize_node(self, node):
+		"""Returns the optimized node."""
+
+		if isinstance(node, UnaryOperationNode):
+			node.left = self.optimize_node(node.left)
+			literal = self.fold_unary_operation(node)
+
+			if literal is not None:
+				self.expressions_folded += 1
+				self.add_change(node.position, f'folded {node} into {literal!r}')
+				return literal
+
+		elif isinstance(node, BinaryOperationNode):
+			node.left = self.optimize_node(node.left)
+			node.right = self.optimize_node(node.right)
+			literal = self.fold_binary_operation(node)
+
+			if literal is not None:
+				self.expressions_folded += 1
+				self.add_change(node.position, f'folded {node} into {literal!r}')
+				return literal
+
+		elif isinstance(node, BlockNode):
+			return self.optimize_block(node)
+
+		elif isinstance(node, FnNode):
+			node.body = self.optimize_node(node.body)
+
+		elif isinstance(node, IfNode):
+			node.condition = self.optimize_node(node.condition)
+			node.if_body = self.optimize_node(node.if_body)
+
+			if node.else_body is not None:
+				node.else_body = self.optimize_node(node.else_body)
+
+			if not self.is_constant_condition(node.condition):
+				return node
+
+			if self.get_constant_value(node.condition):
+				if node.else_body is None:
+					return node.if_body
+
+				if not self.can_remove(node.else_body):
+					return node
+
+				self.statements_removed += 1
+				self.add_change(node.else_body.position, 'removed else of if (true)')
+				return node.if_body
+
+			if not self.can_remove(node.if_body):
+				return node
+
+			self.statements_removed += 1
+			self.add_change(node.position, 'removed if (false)')
+
+			if node.else_body is not None:
+				return node.else_body
+
+			return BlockNode(node.position, [])
+
+		elif isinstance(node, WhileNode):
+			node.condition = self.optimize_node(node.condition)
+			node.body = self.optimize_node(node.body)
+
+			if self.is_constant_condition(node.condition) \
+					and not self.get_constant_value(node.condition) \
+					and self.can_remove(node.body):
+				return self.remove(node, 'removed while (false)')
+
+		elif isinstance(node, DoWhileNode):
+			node.body = self.optimize_node(node.body)
+			node.condition = self.optimize_node(node.condition)
+
+			# the body runs once. a break or continue in the body needs
+			# the loop
+			if self.is_constant_condition(node.condition) \
+					and not self.get_constant_value(node.condition) \
+					and not self.has_loop_jumps(node.body):
+				self.add_change(node.position, 'removed loop of do while (false)')
+				return node.body
+
+		elif isinstance(node, ForNode):
+			node.values = [self.optimize_node(value) for value in node.values]
+			node.body = self.optimize_node(node.body)
+
+		elif isinstance(node, LetNode) or isinstance(node, AssignNode):
+			if node.value is not None:
+				node.value = self.optimize_node(node.value)
+
+		elif isinstance(node, ReturnNode):
+			node.value = self.optimize_node(node.value)
+
+		elif isinstance(node, CallNode):
+			node.arguments = [
+				self.optimize_node(argument) for argument in node.arguments
+			]
+
+		elif isinstance(node, ListNode):
+			node.value = [self.optimize_node(value) for value in node.value]
+
+		elif isinstance(node, ListAccessNode):
+			node.list = self.optimize_node(node.list)
+			node.index = self.optimize_node(node.index)
+
+		return node
+
+	def optimize(self):
+		"""Optimize all nodes, and returns the optimized AST."""
+
+		self.ast = [self.optimize_node(node) for node in self.ast]
+
+		return self.ast
+
+	def report(self):
+		"""Returns the report of the optimization, as a list of
+		lines."""
+
+		lines = [
+			f'optimizer: {self.expressions_folded} expression(s) folded,'
+				+ f' {self.statements_removed} statement(s) removed'
+		]
+
+		for position, description in self.changes:
+			lines.append(f'  {format_position(position)}: {description}')
+
+		return lines
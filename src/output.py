@@ -0,0 +1,44 @@
+# Lang VM
+# Author: Jonas
+
+# Buffered output of the VM. The text written to stdout and stderr is
+# kept in a buffer, and written to the file when the buffer is full,
+# or when it is flushed: by the flush built in function, before the
+# VM reads stdin, and when the program ends. In a terminal, each line
+# is written when it ends.
+
+# characters kept before the buffer is written
+DEFAULT_BUFFER_SIZE = 1 << 16
+
+
+class Output:
+	def __init__(self, file, size=DEFAULT_BUFFER_SIZE, line_buffered=None):
+		self.file = file
+		self.size = size
+
+		# if is True, each line is written when it ends, for
+		# interactive use. the default is True in a terminal
+		if line_buffered is None:
+			line_buffered = file.isatty()
+
+		self.line_buffered = line_buffered
+
+		self.buffer = []
+		self.length = 0
+
+	def write(self, text):
+		self.buffer.append(text)
+		self.length += len(text)
+
+		if self.length >= self.size or self.line_buffered and '\n' in text:
+			self.flush()
+
+	def flush(self):
+		"""Write the buffer to the file."""
+
+		if self.buffer:
+			self.file.write(''.join(self.buffer))
+			self.buffer.clear()
+			self.length = 0
+
+		self.file.flush()
@@ -25,6 +25,10 @@ class Parser:
 	
 		self.ast = []
 
+		# paths of all included files, including the ones included by
+		# them
+		self.included_files = []
+
 		self.literal_nodes = {
 			TokenType.TYPE_INT: IntNode,
 			TokenType.TYPE_FLOAT: FloatNode,
@@ -148,6 +152,8 @@ class Parser:
 		ast = parser.parse()
 
 		self.ast += ast
+		self.included_files.append(path)
+		self.included_files += parser.included_files
 
 	def statement(self):
 		"""
@@ -159,6 +165,9 @@ class Parser:
 		             |  <return_statement>
 		             |  <assign_statement>
 		             |  <do_while_statement>
+		             |  <for_statement>
+		             |  <break_statement>
+		             |  <continue_statement>
 		"""
 
 		if self.current_token.type == TokenType.KEYWORD_LET:
@@ -188,6 +197,15 @@ class Parser:
 		elif self.current_token.type == TokenType.KEYWORD_DO:
 			return self.do_while_statement()
 
+		elif self.current_token.type == TokenType.KEYWORD_FOR:
+			return self.for_statement()
+
+		elif self.current_token.type == TokenType.KEYWORD_BREAK:
+			return self.break_statement()
+
+		elif self.current_token.type == TokenType.KEYWORD_CONTINUE:
+			return self.continue_statement()
+
 		else:
 			error = UnexpectedError(
 				self.current_token.position,
@@ -213,6 +231,66 @@ class Parser:
 
 		return DoWhileNode(position, condition, body)
 
+	def for_statement(self):
+		"""
+		;; with one expression, iterates the values of a list, or from
+		;; 0 to an int. with two, from the first int to the second
+
+		<for_statement> ::=
+			'for' '(' <identifier> 'in' <expression> (',' <expression>)? ')'
+				<statement>
+		"""
+
+		position = self.current_token.position
+
+		self.match(TokenType.KEYWORD_FOR)
+		self.match(TokenType.OPERATOR_LPAREN)
+
+		name = self.current_token.value
+		self.match(TokenType.TYPE_IDENTIFIER)
+
+		# in is not a keyword, so it can still be a name
+		if self.current_token.type != TokenType.TYPE_IDENTIFIER \
+				or self.current_token.value != 'in':
+			error = ExpectedError(self.current_token.position, 'in')
+			error.show_error_and_abort()
+
+		self.match(TokenType.TYPE_IDENTIFIER)
+		values = [self.expression()]
+
+		if self.current_token.type == TokenType.OPERATOR_COMMA:
+			self.match(TokenType.OPERATOR_COMMA)
+			values.append(self.expression())
+
+		self.match(TokenType.OPERATOR_RPAREN)
+		body = self.statement()
+
+		return ForNode(position, name, values, body)
+
+	def break_statement(self):
+		"""
+		<break_statement> ::= 'break' ';'
+		"""
+
+		position = self.current_token.position
+
+		self.match(TokenType.KEYWORD_BREAK)
+		self.match(TokenType.OPERATOR_SEMICOLON)
+
+		return BreakNode(position)
+
+	def continue_statement(self):
+		"""
+		<continue_statement> ::= 'continue' ';'
+		"""
+
+		position = self.current_token.position
+
+		self.match(TokenType.KEYWORD_CONTINUE)
+		self.match(TokenType.OPERATOR_SEMICOLON)
+
+		return ContinueNode(position)
+
 	def assign_statement(self):
 		"""
 		<assign_statement> ::=
@@ -322,7 +400,9 @@ class Parser:
 			node = self.statement()
 			body.append(node)
 
-			if isinstance(node, ReturnNode):
+			if isinstance(node, ReturnNode) \
+					or isinstance(node, BreakNode) \
+					or isinstance(node, ContinueNode):
 				# return 0;
 				# another statement
 				if self.current_token.type != TokenType.OPERATOR_RBRACE:
@@ -0,0 +1,307 @@
+# Lang Compiler
+# Author: Jonas
+
+# Peephole optimizer. Rewrites common sequences of instructions of the
+# generated code into superinstructions, so they cost one dispatch.
+
+import struct
+
+from code_generator import VM_SIGNATURE, int32_to_bytes
+from opcodes import OpCodes, OperandTypes, operands, operands_structs
+
+INT32 = struct.Struct('!i')
+
+# address, file name and line
+LINE_TABLE_ENTRY = struct.Struct('!iii')
+
+COMPARISONS = (
+	OpCodes.EQ,
+	OpCodes.NE,
+	OpCodes.LT,
+	OpCodes.LE,
+	OpCodes.GT,
+	OpCodes.GE,
+)
+
+
+class Instruction:
+	def __init__(self, address, opcode, operand):
+		self.address = address
+		self.opcode = opcode
+		self.operand = operand
+
+
+class Peephole:
+	def __init__(self, code):
+		self.code = code
+
+		# bytes of the signature and data section, not changed
+		self.header = b''
+
+		# list of (address, file name, line)
+		self.line_table = []
+
+		self.instructions = []
+		self.code_size = 0
+
+		# addresses that are targets of jumps and calls
+		self.targets = set()
+
+		# superinstruction: number of sequences fused
+		self.fused = {}
+
+		# number of instructions before and after the optimization
+		self.instructions_before = 0
+		self.instructions_after = 0
+
+		# each pattern is a function that receives the instructions
+		# from the current one, and returns the superinstruction and
+		# the number of instructions fused, or None
+		self.patterns = [
+			self.increment_variable,
+			self.add_variable_and_int,
+			self.compare_and_jump_false,
+			self.load_variables,
+			self.load_variable_and_int,
+		]
+
+	def read(self):
+		"""Split the code in header, line table and instructions."""
+
+		# signature and version
+		offset = len(VM_SIGNATURE) + INT32.size
+
+		# data section
+		number_of_strings, = INT32.unpack_from(self.code, offset)
+		offset += INT32.size
+
+		for _ in range(number_of_strings):
+			length, = INT32.unpack_from(self.code, offset)
+			offset += INT32.size + length
+
+		self.header = bytes(self.code[:offset])
+
+		# line table
+		number_of_entries, = INT32.unpack_from(self.code, offset)
+		offset += INT32.size
+
+		for _ in range(number_of_entries):
+			self.line_table.append(
+				LINE_TABLE_ENTRY.unpack_from(self.code, offset)
+			)
+			offset += LINE_TABLE_ENTRY.size
+
+		# code section
+		code_start = offset
+
+		while offset < len(self.code):
+			opcode = self.code[offset]
+			operand = ()
+
+			if opcode in operands_structs:
+				operand = operands_structs[opcode].unpack_from(
+					self.code,
+					offset + 1,
+				)
+
+			self.instructions.append(
+				Instruction(offset - code_start, opcode, operand)
+			)
+
+			offset += 1 + operands_structs[opcode].size \
+				if opcode in operands_structs else 1
+
+		self.code_size = offset - code_start
+
+		for instruction in self.instructions:
+			for operand_type, value in zip(
+					operands.get(instruction.opcode, ()),
+					instruction.operand):
+
+				if operand_type == OperandTypes.ADDRESS:
+					self.targets.add(value)
+
+	def increment_variable(self, instructions):
+		"""LDV a; LDI k; ADD; STO a -> IVI a k"""
+
+		if len(instructions) >= 4 \
+				and instructions[0].opcode == OpCodes.LDV \
+				and instructions[1].opcode == OpCodes.LDI \
+				and instructions[2].opcode == OpCodes.ADD \
+				and instructions[3].opcode == OpCodes.STO \
+				and instructions[0].operand == instructions[3].operand:
+
+			slot, = instructions[0].operand
+			value, = instructions[1].operand
+
+			return (OpCodes.IVI, (slot, value)), 4
+
+	def add_variable_and_int(self, instructions):
+		"""LDV a; LDI k; ADD -> AVI a k"""
+
+		if len(instructions) >= 3 \
+				and instructions[0].opcode == OpCodes.LDV \
+				and instructions[1].opcode == OpCodes.LDI \
+				and instructions[2].opcode == OpCodes.ADD:
+
+			slot, = instructions[0].operand
+			value, = instructions[1].operand
+
+			return (OpCodes.AVI, (slot, value)), 3
+
+	def compare_and_jump_false(self, instructions):
+		"""<comparison>; JPF address -> CJF comparison address"""
+
+		if len(instructions) >= 2 \
+				and instructions[0].opcode in COMPARISONS \
+				and instructions[1].opcode == OpCodes.JPF:
+
+			address, = instructions[1].operand
+
+			return (OpCodes.CJF, (instructions[0].opcode, address)), 2
+
+	def load_variables(self, instructions):
+		"""LDV a; LDV b -> LVV a b"""
+
+		if len(instructions) >= 2 \
+				and instructions[0].opcode == OpCodes.LDV \
+				and instructions[1].opcode == OpCodes.LDV:
+
+			slot_a, = instructions[0].operand
+			slot_b, = instructions[1].operand
+
+			return (OpCodes.LVV, (slot_a, slot_b)), 2
+
+	def load_variable_and_int(self, instructions):
+		"""LDV a; LDI k -> LVI a k"""
+
+		if len(instructions) >= 2 \
+				and instructions[0].opcode == OpCodes.LDV \
+				and instructions[1].opcode == OpCodes.LDI:
+
+			slot, = instructions[0].operand
+			value, = instructions[1].operand
+
+			return (OpCodes.LVI, (slot, value)), 2
+
+	def fuse(self):
+		"""Returns the new instructions, as a list of (position of the
+		first instruction, number of instructions, opcode, operand)."""
+
+		new_instructions = []
+		position = 0
+
+		while position < len(self.instructions):
+			instruction = self.instructions[position]
+
+			# the sequence can not have jump targets after its first
+			# instruction
+			window = [instruction]
+
+			for next_instruction in self.instructions[position+1:position+4]:
+				if next_instruction.address in self.targets:
+					break
+
+				window.append(next_instruction)
+
+			for pattern in self.patterns:
+				result = pattern(window)
+
+				if result is not None:
+					(opcode, operand), length = result
+					self.fused[opcode] = self.fused.get(opcode, 0) + 1
+					break
+
+			else:
+				opcode, operand, length = \
+					instruction.opcode, instruction.operand, 1
+
+			new_instructions.append((position, length, opcode, operand))
+			position += length
+
+		return new_instructions
+
+	def optimize(self):
+		"""Returns the optimized code."""
+
+		self.read()
+		new_instructions = self.fuse()
+
+		self.instructions_before = len(self.instructions)
+		self.instructions_after = len(new_instructions)
+
+		# old address: new address. the instructions in the middle of
+		# a superinstruction are moved to the address after it, so the
+		# line table entries starting there remain valid
+		new_addresses = {}
+		address = 0
+
+		for position, length, opcode, operand in new_instructions:
+			new_addresses[self.instructions[position].address] = address
+			address += 1
+
+			if opcode in operands_structs:
+				address += operands_structs[opcode].size
+
+			for instruction in self.instructions[position+1:position+length]:
+				new_addresses[instruction.address] = address
+
+		new_addresses[self.code_size] = address
+
+		# generate the code section
+		code_section = bytearray()
+
+		for _, _, opcode, operand in new_instructions:
+			code_section.append(opcode)
+
+			if opcode not in operands_structs:
+				continue
+
+			operand = [
+				new_addresses[value] if operand_type == OperandTypes.ADDRESS
+				else value
+				for operand_type, value in zip(operands[opcode], operand)
+			]
+
+			code_section += operands_structs[opcode].pack(*operand)
+
+		# generate the line table. if more than one entry has the same
+		# address, the last is the valid one
+		line_table = {}
+
+		for old_address, file_name, line in self.line_table:
+			line_table[new_addresses[old_address]] = (file_name, line)
+
+		bytes_of_line_table = bytearray(int32_to_bytes(len(line_table)))
+
+		for address, (file_name, line) in sorted(line_table.items()):
+			bytes_of_line_table += LINE_TABLE_ENTRY.pack(
+				address,
+				file_name,
+				line,
+			)
+
+		return self.header + bytes(bytes_of_line_table) + bytes(code_section)
+
+	def report(self):
+		"""Returns the report of the optimization, as a list of
+		lines."""
+
+		lines = [
+			f'peephole: {self.instructions_before} instructions,'
+				+ f' {self.instructions_after} after fusing'
+		]
+
+		for opcode, times in sorted(self.fused.items()):
+			lines.append(f'  {times} x {superinstructions_names[opcode]}')
+
+		return lines
+
+
+superinstructions_names = {
+	OpCodes.IVI: 'ivi (ldv ldi add sto)',
+	OpCodes.AVI: 'avi (ldv ldi add)',
+	OpCodes.CJF: 'cjf (<comparison> jpf)',
+	OpCodes.LVV: 'lvv (ldv ldv)',
+	OpCodes.LVI: 'lvi (ldv ldi)',
+}
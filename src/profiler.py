@@ -0,0 +1,240 @@
+# Lang VM
+# Author: Jonas
+
+# Deterministic profiler. Runs the VM counting each instruction, and
+# following the calls and returns of the call stack to measure the time
+# of each function.
+
+import time
+
+from opcodes import OpCodes
+from vm import Halt, opcodes_as_string
+
+# instructions that call a function, their first operand is its name
+CALL_INSTRUCTIONS = {OpCodes.CAL, OpCodes.MCL, OpCodes.TCL}
+
+RETURN_INSTRUCTIONS = {OpCodes.RET, OpCodes.MRT}
+
+NANOSECONDS_PER_MILLISECOND = 1000000
+NANOSECONDS_PER_MICROSECOND = 1000
+
+
+class Profiler:
+	def __init__(self, vm):
+		self.vm = vm
+
+		# number of times each opcode has run
+		self.opcode_counts = [0] * 256
+
+		# function: [calls, inclusive time, exclusive time]
+		self.functions = {}
+
+		# each call being executed is [function, start time, time of the
+		# calls made by it, node of the stack]
+		self.calls = []
+
+		# function: calls of it being executed, the inclusive time of
+		# the recursive calls is measured only in the outermost one
+		self.active = {}
+
+		# each stack of calls is a node, the stack of its caller (None
+		# for the outermost call) and the function called. the names of
+		# the stacks are made only by collapsed_stacks.
+		# (parent node, function): node
+		self.nodes = {}
+
+		# (parent node, function) of each node
+		self.node_calls = []
+
+		# node: exclusive time
+		self.stacks = {}
+
+		self.start_time = None
+		self.end_time = None
+
+	def enter(self, name, now):
+		"""Start a call of the function name."""
+
+		key = (self.calls[-1][3] if self.calls else None, name)
+		node = self.nodes.get(key)
+
+		if node is None:
+			node = self.nodes[key] = len(self.node_calls)
+			self.node_calls.append(key)
+
+		self.calls.append([name, now, 0, node])
+		self.functions.setdefault(name, [0, 0, 0])[0] += 1
+		self.active[name] = self.active.get(name, 0) + 1
+
+	def leave(self, now):
+		"""End the current call."""
+
+		name, start, children, node = self.calls.pop()
+		elapsed = now - start
+		exclusive = elapsed - children
+
+		function = self.functions[name]
+		function[2] += exclusive
+		self.active[name] -= 1
+
+		if not self.active[name]:
+			function[1] += elapsed
+
+		self.stacks[node] = self.stacks.get(node, 0) + exclusive
+
+		if self.calls:
+			self.calls[-1][2] += elapsed
+
+	def run(self):
+		"""Runs the VM, dispatching each instruction to its handler
+		like the table dispatch."""
+
+		vm = self.vm
+		instructions = vm.instructions
+		handlers = vm.handlers
+		call_stack = vm.call_stack
+		opcode_counts = self.opcode_counts
+		clock = time.perf_counter_ns
+
+		self.start_time = clock()
+
+		try:
+			while True:
+				instr, operand = instructions[vm.pc]
+				vm.pc += 1
+				opcode_counts[instr] += 1
+
+				if instr in CALL_INSTRUCTIONS:
+					depth = len(call_stack)
+					handlers[instr](operand)
+					now = clock()
+
+					# the tail call replaces the current call
+					if instr == OpCodes.TCL:
+						self.leave(now)
+						self.enter(operand[0], now)
+
+					elif len(call_stack) > depth:
+						self.enter(operand[0], now)
+
+					# the result was cached
+					else:
+						self.functions.setdefault(operand[0], [0, 0, 0])[0] += 1
+
+				elif instr in RETURN_INSTRUCTIONS:
+					handlers[instr](operand)
+					self.leave(clock())
+
+				else:
+					handlers[instr](operand)
+
+		except Halt:
+			pass
+
+		finally:
+			self.finish()
+
+	def protected_run(self):
+		"""Runs with exceptions handling."""
+
+		try:
+			self.run()
+
+		except (KeyboardInterrupt, EOFError):
+			exit(0)
+
+		finally:
+			self.vm.flush_outputs()
+
+	def finish(self):
+		"""End the calls that have not returned, like when the program
+		exits or panics."""
+
+		self.end_time = time.perf_counter_ns()
+
+		while self.calls:
+			self.leave(self.end_time)
+
+	def report(self):
+		"""Returns the table of the functions, sorted by exclusive time,
+		and of the opcodes, sorted by count, as a list of lines."""
+
+		total_time = (self.end_time - self.start_time) / NANOSECONDS_PER_MILLISECOND
+		total_instructions = sum(self.opcode_counts)
+
+		lines = [
+			f'profile: {len(self.functions)} function(s),'
+				+ f' {total_instructions} instruction(s), {total_time:.2f} ms',
+			'',
+			f'  {"function":<20} {"calls":>10} {"inclusive ms":>14}'
+				+ f' {"exclusive ms":>14} {"exclusive %":>12}',
+		]
+
+		functions = sorted(
+			self.functions.items(),
+			key=lambda item: (-item[1][2], item[0]),
+		)
+
+		for name, (calls, inclusive, exclusive) in functions:
+			percentage = exclusive / NANOSECONDS_PER_MILLISECOND / total_time * 100 \
+				if total_time else 0
+
+			lines.append(
+				f'  {name:<20} {calls:>10}'
+					+ f' {inclusive / NANOSECONDS_PER_MILLISECOND:>14.2f}'
+					+ f' {exclusive / NANOSECONDS_PER_MILLISECOND:>14.2f}'
+					+ f' {percentage:>12.1f}'
+			)
+
+		lines += ['', f'  {"opcode":<20} {"count":>10} {"%":>6}']
+
+		opcodes = sorted(
+			(
+				(count, opcodes_as_string[instr].strip())
+				for instr, count in enumerate(self.opcode_counts)
+				if count
+			),
+			key=lambda item: (-item[0], item[1]),
+		)
+
+		for count, name in opcodes:
+			lines.append(
+				f'  {name:<20} {count:>10}'
+					+ f' {count / total_instructions * 100:>6.1f}'
+			)
+
+		return lines
+
+	def collapsed_stacks(self):
+		"""Returns the exclusive time of each stack of calls, in
+		microseconds, as lines of the collapsed format read by the flame
+		graph tools: the names of the functions, separated by ';', and
+		the time."""
+
+		# node: nodes of the calls made in its stack
+		children = {}
+
+		for node, (parent, _) in enumerate(self.node_calls):
+			children.setdefault(parent, []).append(node)
+
+		# the names of each stack are made from the names of the stack
+		# of its caller, walking the nodes in depth first order
+		stacks = []
+		names = []
+		pending = [(node, 0) for node in reversed(children.get(None, []))]
+
+		while pending:
+			node, depth = pending.pop()
+			del names[depth:]
+			names.append(self.node_calls[node][1])
+			exclusive = self.stacks.get(node, 0)
+
+			if exclusive >= NANOSECONDS_PER_MICROSECOND:
+				stacks.append((';'.join(names), exclusive))
+
+			pending += ((child, depth + 1) for child in children.get(node, ()))
+
+		return [
+			f'{path} {exclusive // NANOSECONDS_PER_MICROSECOND}'
+			for path, exclusive in sorted(stacks)
+		]
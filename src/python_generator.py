@@ -0,0 +1,491 @@
+# Lang Compiler
+# Author: Jonas
+
+# Code generator of the Python backend. Each lang function becomes a
+# Python function, with its variables as Python locals and its loops as
+# Python loops. The operations on ints and floats are inline, and the
+# other operations call the runtime (python_runtime), that shows the
+# errors of the VM.
+
+import math
+
+from built_in import built_in_functions, built_in_variables
+from node import *
+from token_ import TokenType
+
+# kinds of binary operations
+ARITHMETIC = 'arithmetic'  # inline with ints and floats
+COMPARISON = 'comparison'  # inline with ints and floats, results in int
+BITWISE = 'bitwise'        # inline with ints
+CHECKED = 'checked'        # always in the runtime
+
+INDENTATION = '    '
+
+
+class PythonGenerator:
+	def __init__(self, ast):
+		self.ast = ast
+
+		# lines of Python source, and the (file name, line) of the lang
+		# code of each one
+		self.lines = []
+		self.positions = []
+		self.indentation = 0
+
+		# token: (operator, function of the runtime, kind)
+		self.binary_operations = {
+			TokenType.OPERATOR_PLUS: ('+', 'add', ARITHMETIC),
+			TokenType.OPERATOR_MINUS: ('-', 'sub', ARITHMETIC),
+			TokenType.OPERATOR_ASTERISK: ('*', 'mul', ARITHMETIC),
+			TokenType.OPERATOR_SLASH: ('/', 'div', CHECKED),
+			TokenType.OPERATOR_EQ: ('==', 'eq', COMPARISON),
+			TokenType.OPERATOR_NE: ('!=', 'ne', ARITHMETIC),
+			TokenType.OPERATOR_LT: ('<', 'lt', COMPARISON),
+			TokenType.OPERATOR_LE: ('<=', 'le', COMPARISON),
+			TokenType.OPERATOR_GT: ('>', 'gt', COMPARISON),
+			TokenType.OPERATOR_GE: ('>=', 'ge', COMPARISON),
+			TokenType.OPERATOR_BTW_AND: ('&', 'bnd', BITWISE),
+			TokenType.OPERATOR_BTW_OR: ('|', 'bor', BITWISE),
+			TokenType.OPERATOR_BTW_XOR: ('^', 'xor', BITWISE),
+			TokenType.OPERATOR_BTW_SHL: ('<<', 'shl', CHECKED),
+			TokenType.OPERATOR_BTW_SHR: ('>>', 'shr', CHECKED),
+		}
+
+		self.unary_operators = {
+			TokenType.OPERATOR_MINUS: '-',
+			TokenType.OPERATOR_NOT: 'not ',
+			TokenType.OPERATOR_BTW_NOT: '~',
+		}
+
+		# names of the global variables
+		self.globals = set()
+
+		# names of the variables of the function being generated, or
+		# None in the top level
+		self.locals = None
+
+		# function being generated
+		self.function = None
+
+		# if is True, the body of the function is in a loop, and the
+		# tail calls of the function itself continue the loop
+		self.tail_loop = False
+
+		# number of loops around the code being generated
+		self.loops = 0
+
+		self.temporaries = 0
+
+	def emit(self, line, position):
+		"""Emit a line of Python source, from the lang code in
+		position."""
+
+		self.lines.append(INDENTATION * self.indentation + line)
+		self.positions.append((position.file_name, position.line))
+
+	def emit_suite(self, node, position):
+		"""Emit the statements of node, indented. Python needs at least
+		one statement."""
+
+		self.indentation += 1
+		length = len(self.lines)
+
+		self.generate_statement(node)
+
+		if len(self.lines) == length:
+			self.emit('pass', position)
+
+		self.indentation -= 1
+
+	def new_temporary(self):
+		"""Returns the name of a new temporary variable."""
+
+		self.temporaries += 1
+
+		return f'_{self.temporaries}'
+
+	def variable_name(self, name):
+		"""Returns the Python name of the variable name."""
+
+		if name in built_in_variables:
+			return 'b_' + name
+
+		elif self.locals is not None and name in self.locals:
+			return 'v_' + name
+
+		return 'g_' + name
+
+	def has_calls(self, node):
+		"""Returns if the expression node has calls, that can have side
+		effects."""
+
+		if isinstance(node, CallNode):
+			return True
+
+		elif isinstance(node, ListNode):
+			return any(self.has_calls(value) for value in node.value)
+
+		elif isinstance(node, UnaryOperationNode):
+			return self.has_calls(node.left)
+
+		elif isinstance(node, BinaryOperationNode):
+			return self.has_calls(node.left) or self.has_calls(node.right)
+
+		elif isinstance(node, ListAccessNode):
+			return self.has_calls(node.list) or self.has_calls(node.index)
+
+		return False
+
+	def generate_values(self, nodes):
+		"""Returns the values of nodes, separated by commas. The values
+		are evaluated from the last, like in the VM. The order matters
+		only if a value has a call, that can change the others."""
+
+		values = [self.generate_expression(node) for node in nodes]
+
+		if len(nodes) < 2 or not any(self.has_calls(node) for node in nodes):
+			return ', '.join(values)
+
+		return f'*({", ".join(reversed(values))},)[::-1]'
+
+	def generate_literal(self, value):
+		"""Returns the Python literal of value."""
+
+		if isinstance(value, float) and not math.isfinite(value):
+			return f"float('{value}')"
+
+		return repr(value)
+
+	def generate_binary_operation(self, node, condition=False):
+		"""Returns the Python expression of the binary operation node. If
+		condition is True, the comparisons can result in a bool."""
+
+		operator, function, kind = self.binary_operations[node.operator]
+
+		left = self.generate_expression(node.left)
+		right = self.generate_expression(node.right)
+
+		if kind == CHECKED:
+			return f'{function}({left}, {right})'
+
+		a = self.new_temporary()
+		b = self.new_temporary()
+
+		operation = f'{a} {operator} {b}'
+
+		if kind == COMPARISON and not condition:
+			operation = f'(1 if {operation} else 0)'
+
+		test = f'type({a} := {left}) is type({b} := {right})'
+		test += ' is int' if kind == BITWISE else ' in (int, float)'
+
+		return f'({operation} if {test} else {function}({a}, {b}))'
+
+	def generate_condition(self, node):
+		"""Returns the Python expression of a condition."""
+
+		if isinstance(node, BinaryOperationNode):
+			return self.generate_binary_operation(node, True)
+
+		return self.generate_expression(node)
+
+	def generate_expression(self, node):
+		"""Returns the Python expression of node."""
+
+		if isinstance(node, NilNode):
+			return 'None'
+
+		elif isinstance(node, ListNode):
+			return f'[{self.generate_values(node.value)}]'
+
+		elif isinstance(node, LiteralNode):
+			return self.generate_literal(node.value)
+
+		elif isinstance(node, IdentifierNode):
+			return self.variable_name(node.name)
+
+		elif isinstance(node, UnaryOperationNode):
+			value = self.generate_expression(node.left)
+
+			# +1 == 1, so ignore
+			if node.operator == TokenType.OPERATOR_PLUS:
+				return value
+
+			return f'({self.unary_operators[node.operator]}{value})'
+
+		elif isinstance(node, BinaryOperationNode):
+			return self.generate_binary_operation(node)
+
+		elif isinstance(node, CallNode):
+			arguments = self.generate_values(node.arguments)
+
+			if node.name in built_in_functions:
+				return f'b_{node.name}({arguments})'
+
+			return f'f_{node.name}({arguments})'
+
+		elif isinstance(node, ListAccessNode):
+			list_ = self.generate_expression(node.list)
+			index = self.generate_expression(node.index)
+
+			return f'get({list_}, {index})'
+
+		raise NotImplementedError(node)
+
+	def is_tail_call(self, node):
+		"""Returns if the return node is a call of the function being
+		generated, that can continue the loop of its body."""
+
+		return self.tail_loop \
+			and self.loops == 0 \
+			and isinstance(node.value, CallNode) \
+			and node.value.name == self.function.name
+
+	def generate_statement(self, node):
+		"""Generate the Python source of a statement."""
+
+		if isinstance(node, BlockNode):
+			for statement in node.body:
+				self.generate_statement(statement)
+
+		elif isinstance(node, LetNode) or isinstance(node, AssignNode):
+			if isinstance(node, LetNode) and self.locals is None:
+				self.globals.add(node.name)
+
+			value = 'None' if node.value is None \
+				else self.generate_expression(node.value)
+
+			self.emit(f'{self.variable_name(node.name)} = {value}', node.position)
+
+		elif isinstance(node, CallNode):
+			self.emit(self.generate_expression(node), node.position)
+
+		elif isinstance(node, IfNode):
+			condition = self.generate_condition(node.condition)
+			self.emit(f'if {condition}:', node.condition.position)
+			self.emit_suite(node.if_body, node.position)
+
+			if node.else_body is not None:
+				self.emit('else:', node.position)
+				self.emit_suite(node.else_body, node.position)
+
+		elif isinstance(node, WhileNode):
+			condition = self.generate_condition(node.condition)
+			self.emit(f'while {condition}:', node.condition.position)
+
+			self.loops += 1
+			self.emit_suite(node.body, node.position)
+			self.loops -= 1
+
+		elif isinstance(node, DoWhileNode) and self.has_continue(node.body):
+			# a continue checks the condition, which is skipped only in
+			# the first iteration
+			first = self.new_temporary()
+			condition = self.generate_condition(node.condition)
+
+			self.emit(f'{first} = True', node.position)
+			self.emit(f'while {first} or {condition}:', node.condition.position)
+
+			self.indentation += 1
+			self.emit(f'{first} = False', node.position)
+			self.indentation -= 1
+
+			self.loops += 1
+			self.emit_suite(node.body, node.position)
+			self.loops -= 1
+
+		elif isinstance(node, DoWhileNode):
+			self.emit('while True:', node.position)
+
+			self.loops += 1
+			self.emit_suite(node.body, node.position)
+			self.loops -= 1
+
+			self.indentation += 1
+			condition = self.generate_condition(node.condition)
+			self.emit(f'if not {condition}: break', node.condition.position)
+			self.indentation -= 1
+
+		elif isinstance(node, ForNode):
+			values = ', '.join(map(self.generate_expression, node.values))
+			function = 'iterate' if len(node.values) == 1 else 'range_'
+			self.emit(f'for v_{node.name} in {function}({values}):', node.position)
+
+			self.loops += 1
+			self.emit_suite(node.body, node.position)
+			self.loops -= 1
+
+		elif isinstance(node, BreakNode):
+			self.emit('break', node.position)
+
+		elif isinstance(node, ContinueNode):
+			self.emit('continue', node.position)
+
+		elif isinstance(node, ReturnNode):
+			if not self.is_tail_call(node):
+				value = self.generate_expression(node.value)
+				self.emit(f'return {value}', node.position)
+				return
+
+			# the arguments are the new values of the parameters
+			arguments = self.function.arguments
+
+			if arguments:
+				parameters = ''.join(
+					f'v_{argument.name}, ' for argument in arguments
+				)
+
+				values = self.generate_values(node.value.arguments)
+				self.emit(f'{parameters}= {values},', node.position)
+
+			self.emit('continue', node.position)
+
+		else:
+			raise NotImplementedError(node)
+
+	def collect_variables(self, node):
+		"""Returns the names of the variables declared in node."""
+
+		if isinstance(node, LetNode):
+			return {node.name}
+
+		elif isinstance(node, BlockNode):
+			return set().union(*map(self.collect_variables, node.body))
+
+		elif isinstance(node, IfNode):
+			variables = self.collect_variables(node.if_body)
+
+			if node.else_body is not None:
+				variables |= self.collect_variables(node.else_body)
+
+			return variables
+
+		elif isinstance(node, WhileNode) or isinstance(node, DoWhileNode):
+			return self.collect_variables(node.body)
+
+		elif isinstance(node, ForNode):
+			return {node.name} | self.collect_variables(node.body)
+
+		return set()
+
+	def has_continue(self, node):
+		"""Returns if node has a continue of the loop around it."""
+
+		if isinstance(node, ContinueNode):
+			return True
+
+		elif isinstance(node, BlockNode):
+			return any(self.has_continue(statement) for statement in node.body)
+
+		elif isinstance(node, IfNode):
+			return self.has_continue(node.if_body) \
+				or node.else_body is not None \
+				and self.has_continue(node.else_body)
+
+		return False
+
+	def has_tail_calls(self, node, name):
+		"""Returns if node has a return of a call of the function name,
+		out of loops."""
+
+		if isinstance(node, ReturnNode):
+			return isinstance(node.value, CallNode) and node.value.name == name
+
+		elif isinstance(node, BlockNode):
+			return any(self.has_tail_calls(statement, name) for statement in node.body)
+
+		elif isinstance(node, IfNode):
+			return self.has_tail_calls(node.if_body, name) \
+				or node.else_body is not None \
+				and self.has_tail_calls(node.else_body, name)
+
+		return False
+
+	def ends_with_return(self, node):
+		"""Returns if the last statement of node is a return."""
+
+		if isinstance(node, BlockNode):
+			return len(node.body) > 0 and self.ends_with_return(node.body[-1])
+
+		return isinstance(node, ReturnNode)
+
+	def emit_globals(self, position):
+		"""Emit the declaration of the globals, that are assigned by the
+		functions."""
+
+		if self.globals:
+			names = ', '.join(f'g_{name}' for name in sorted(self.globals))
+			self.emit(f'global {names}', position)
+
+	def generate_function(self, node):
+		"""Generate the Python function of a lang function."""
+
+		self.function = node
+		self.temporaries = 0
+
+		arguments = {argument.name for argument in node.arguments}
+		variables = self.collect_variables(node.body) - arguments
+		self.locals = arguments | variables
+
+		parameters = ', '.join(f'v_{argument.name}' for argument in node.arguments)
+		self.emit(f'def f_{node.name}({parameters}):', node.position)
+
+		self.indentation += 1
+		self.emit_globals(node.position)
+
+		# the tail calls of the function itself are a loop
+		self.tail_loop = self.has_tail_calls(node.body, node.name)
+
+		if self.tail_loop:
+			self.emit('while True:', node.position)
+			self.indentation += 1
+
+		# the variables are nil until assigned
+		if variables:
+			names = ' = '.join(f'v_{name}' for name in sorted(variables))
+			self.emit(f'{names} = None', node.position)
+
+		self.generate_statement(node.body)
+
+		if not self.ends_with_return(node.body):
+			self.emit('return None', node.position)
+
+		if self.tail_loop:
+			self.indentation -= 1
+
+		self.indentation -= 1
+
+		self.locals = None
+		self.function = None
+		self.tail_loop = False
+
+	def generate(self):
+		"""Generate all code. Returns the Python source, and the (file
+		name, line) of each line."""
+
+		declarations = [node for node in self.ast if isinstance(node, LetNode)]
+		functions = [node for node in self.ast if isinstance(node, FnNode)]
+		main = next(node for node in functions if node.name == 'main')
+
+		for node in declarations:
+			self.globals.add(node.name)
+
+		# the top level initializes the globals
+		self.emit('def init():', main.position)
+		self.indentation += 1
+		self.emit_globals(main.position)
+
+		for node in declarations:
+			self.generate_statement(node)
+
+		self.emit('pass', main.position)
+		self.indentation -= 1
+
+		# call the entry point, from the position of its declaration
+		self.emit('def start():', main.position)
+		self.emit(f'{INDENTATION}return f_main()', main.position)
+
+		for node in functions:
+			self.generate_function(node)
+
+		return '\n'.join(self.lines) + '\n', self.positions
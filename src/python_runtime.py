@@ -0,0 +1,479 @@
+# Lang VM
+# Author: Jonas
+
+# Runtime of the Python backend: the operations and built in functions
+# used by the generated code, with the same errors of the VM, and the
+# execution of the generated code.
+
+import array
+import copy
+import operator
+import sys
+import time
+
+from built_in import built_in_variables
+from output import Output
+from vm import ILLEGAL_OPERATION_ERROR
+from vm import DIVISION_BY_ZERO_ERROR
+from vm import NEGATIVE_SHIFT_COUNT_ERROR
+from vm import VALUE_IS_NOT_SUBSCRIPTABLE
+from vm import INVALID_INDEX_ERROR
+from vm import LIST_INDEX_OUT_OF_RANGE_ERROR
+from vm import VALUE_IS_NOT_ITERABLE
+from vm import INVALID_RANGE_ERROR
+from vm import INVALID_KEY_ERROR
+from vm import KEY_NOT_FOUND_ERROR
+from vm import INVALID_FORMAT_ERROR
+from vm import ARRAY_LENGTHS_ERROR
+from vm import INVALID_ARRAY_VALUE_ERROR
+from vm import INTEGER_OVERFLOW_ERROR
+from vm import VALUES_ARE_NOT_ARRAYS_ERROR
+from vm import INT_ARRAY, FLOAT_ARRAY
+from vm import StringBuilder, format_text, get_type_name, index_of, join
+from vm import array_operation, dot, fill_array, make_array, read_lines
+from vm import Panic, range_list, fill_list, slice_list, extend_list
+from vm import sum_list, sort_list, reverse_list, map_keys
+from vm import min_value, max_value
+
+# file name of the generated code, to find its frames in tracebacks
+GENERATED_FILE_NAME = '<lang>'
+
+# the calls of lang functions are calls of Python functions
+RECURSION_LIMIT = 1 << 20
+
+# the stack VM has no limit, Python has RECURSION_LIMIT
+CALL_DEPTH_EXCEEDED_ERROR = 'maximum call depth exceeded'
+
+
+def check_binary_operation(operator, a, b):
+	"""Raise a panic if the binary operation is not valid with a and
+	b, like the VM. Returns a + b."""
+
+	try:
+		return a + b
+	except TypeError:
+		raise Panic(ILLEGAL_OPERATION_ERROR %(
+			get_type_name(a),
+			operator,
+			get_type_name(b),
+		))
+
+
+def make_binary_operation(operator, operation):
+	"""Returns a function that checks and executes a binary
+	operation."""
+
+	def execute_binary_operation(a, b):
+		check_binary_operation(operator, a, b)
+		return operation(a, b)
+
+	return execute_binary_operation
+
+
+def add(a, b):
+	"""The check is the addition."""
+
+	return check_binary_operation('+', a, b)
+
+
+def div(a, b):
+	check_binary_operation('/', a, b)
+
+	if b == 0:
+		raise Panic(DIVISION_BY_ZERO_ERROR)
+
+	return a / b
+
+
+def make_shift_operation(operator, operation):
+	"""Returns a function that checks and executes a shift."""
+
+	def execute_shift_operation(a, b):
+		check_binary_operation(operator, a, b)
+
+		if b < 0:
+			raise Panic(NEGATIVE_SHIFT_COUNT_ERROR)
+
+		return operation(a, b)
+
+	return execute_shift_operation
+
+
+def get(list_, index):
+	if not isinstance(list_, list) and not isinstance(list_, array.array):
+		if isinstance(list_, dict):
+			return get_map_value(list_, index)
+
+		raise Panic(VALUE_IS_NOT_SUBSCRIPTABLE %(get_type_name(list_)))
+
+	if not isinstance(index, int):
+		raise Panic(INVALID_INDEX_ERROR)
+
+	if index > len(list_) - 1:
+		raise Panic(LIST_INDEX_OUT_OF_RANGE_ERROR)
+
+	return list_[index]
+
+
+def get_map_value(map_, key):
+	try:
+		return map_[key]
+
+	except KeyError:
+		raise Panic(KEY_NOT_FOUND_ERROR)
+
+	except TypeError:
+		raise Panic(INVALID_KEY_ERROR)
+
+
+def map_get(map_, key):
+	try:
+		return map_.get(key)
+
+	except TypeError:
+		raise Panic(INVALID_KEY_ERROR)
+
+
+def map_put(map_, key, value):
+	try:
+		map_[key] = value
+
+	except TypeError:
+		raise Panic(INVALID_KEY_ERROR)
+
+
+def map_has(map_, key):
+	try:
+		return 1 if key in map_ else 0
+
+	except TypeError:
+		raise Panic(INVALID_KEY_ERROR)
+
+
+def map_delete(map_, key):
+	try:
+		map_.pop(key, None)
+
+	except TypeError:
+		raise Panic(INVALID_KEY_ERROR)
+
+
+def format_(template, values):
+	try:
+		return format_text(template, values)
+
+	except ValueError:
+		raise Panic(INVALID_FORMAT_ERROR)
+
+
+def new_array(typecode, value):
+	try:
+		return make_array(typecode, value)
+
+	except (TypeError, OverflowError):
+		raise Panic(INVALID_ARRAY_VALUE_ERROR)
+
+
+def fill_array_(array_, value):
+	try:
+		fill_array(array_, value)
+
+	except (TypeError, OverflowError):
+		raise Panic(INVALID_ARRAY_VALUE_ERROR)
+
+
+def make_array_operation(operator_, operation):
+	"""Returns a function that checks and executes an element-wise
+	operation."""
+
+	def execute_array_operation(a, b):
+		try:
+			return array_operation(operation, a, b)
+
+		except IndexError:
+			raise Panic(ARRAY_LENGTHS_ERROR)
+
+		except ValueError:
+			raise Panic(VALUES_ARE_NOT_ARRAYS_ERROR %(
+				get_type_name(a),
+				get_type_name(b),
+			))
+
+		except ZeroDivisionError:
+			raise Panic(DIVISION_BY_ZERO_ERROR)
+
+		except OverflowError:
+			raise Panic(INTEGER_OVERFLOW_ERROR)
+
+		except TypeError:
+			raise Panic(ILLEGAL_OPERATION_ERROR %(
+				get_type_name(a),
+				operator_,
+				get_type_name(b),
+			))
+
+	return execute_array_operation
+
+
+def iterate(value):
+	"""Returns the values of a for loop over value, like the VM."""
+
+	if type(value) is int:
+		return range(value)
+
+	# the keys when the loop starts, the map can be changed by the loop
+	if type(value) is dict:
+		return list(value)
+
+	try:
+		return iter(value)
+
+	except TypeError:
+		raise Panic(VALUE_IS_NOT_ITERABLE %get_type_name(value))
+
+
+def range_(start, end):
+	if type(start) is not int or type(end) is not int:
+		raise Panic(INVALID_RANGE_ERROR)
+
+	return range(start, end)
+
+
+def append(list_, value):
+	try:
+		list_.append(value)
+
+	# a value that is not a number of the type of an array
+	except (TypeError, OverflowError):
+		raise Panic(INVALID_ARRAY_VALUE_ERROR)
+
+
+def pop(list_, index):
+	list_.pop(index)
+
+
+def set_(list_, index, value):
+	if isinstance(list_, dict):
+		map_put(list_, index, value)
+
+	elif isinstance(list_, array.array):
+		try:
+			list_[index] = value
+
+		except (TypeError, OverflowError):
+			raise Panic(INVALID_ARRAY_VALUE_ERROR)
+
+	else:
+		list_[index] = value
+
+
+def fopen(file_name, open_type):
+	try:
+		return open(file_name, open_type)
+
+	except FileNotFoundError:
+		return None
+
+
+def fclose(file):
+	file.close()
+
+
+# name in the generated code: function or value
+namespace = {
+	'add': add,
+	'sub': make_binary_operation('-', lambda a, b: a - b),
+	'mul': make_binary_operation('*', lambda a, b: a * b),
+	'div': div,
+	'eq': make_binary_operation('==', lambda a, b: int(a == b)),
+	'ne': make_binary_operation('!=', lambda a, b: a != b),
+	'lt': make_binary_operation('<', lambda a, b: int(a < b)),
+	'le': make_binary_operation('<=', lambda a, b: int(a <= b)),
+	'gt': make_binary_operation('>', lambda a, b: int(a > b)),
+	'ge': make_binary_operation('>=', lambda a, b: int(a >= b)),
+	'bnd': make_binary_operation('&', lambda a, b: a & b),
+	'bor': make_binary_operation('|', lambda a, b: a | b),
+	'xor': make_binary_operation('^', lambda a, b: a ^ b),
+	'shl': make_shift_operation('<<', lambda a, b: a << b),
+	'shr': make_shift_operation('>>', lambda a, b: a >> b),
+	'get': get,
+	'iterate': iterate,
+	'range_': range_,
+
+	# built in functions
+	'b_append': append,
+	'b_pop': pop,
+	'b_length': len,
+	'b_copy': copy.copy,
+	'b_type': get_type_name,
+	'b_set': set_,
+	'b_fopen': fopen,
+	'b_fclose': fclose,
+	'b_clock': time.perf_counter,
+	'b_fnext': lambda lines: next(lines, ''),
+	'b_range': range_list,
+	'b_fill': fill_list,
+	'b_slice': slice_list,
+	'b_extend': extend_list,
+	'b_index_of': index_of,
+	'b_sum': sum_list,
+	'b_sort': sort_list,
+	'b_reverse': reverse_list,
+	'b_map': dict,
+	'b_get': map_get,
+	'b_put': map_put,
+	'b_has': map_has,
+	'b_delete': map_delete,
+	'b_keys': map_keys,
+	'b_join': join,
+	'b_builder': StringBuilder,
+	'b_bappend': StringBuilder.append,
+	'b_bfinish': StringBuilder.finish,
+	'b_format': format_,
+	'b_iarray': lambda value: new_array(INT_ARRAY, value),
+	'b_farray': lambda value: new_array(FLOAT_ARRAY, value),
+	'b_afill': fill_array_,
+	'b_aadd': make_array_operation('+', operator.add),
+	'b_asub': make_array_operation('-', operator.sub),
+	'b_amul': make_array_operation('*', operator.mul),
+	'b_adiv': make_array_operation('/', operator.truediv),
+	'b_min': min_value,
+	'b_max': max_value,
+	'b_dot': dot,
+
+	# the functions that write and read are made by run, see
+	# make_output_functions
+}
+
+for name, value in built_in_variables.items():
+	namespace['b_' + name] = value
+
+
+def make_output_functions(line_buffered=None, stdout_file=None):
+	"""Returns the built in functions that write and read files, with
+	the text written to stdout and stderr buffered like in the VM, and
+	the function that flushes the outputs. If stdout_file is given,
+	the text written to stdout goes to it."""
+
+	stdout = Output(stdout_file or sys.stdout, line_buffered=line_buffered)
+
+	# id of file: output
+	outputs = {id(sys.stdout): stdout}
+
+	if stdout_file is not None:
+		outputs[id(built_in_variables['stdout'])] = stdout
+
+	for name in ('stdout', 'stderr'):
+		file = built_in_variables[name]
+
+		if id(file) not in outputs:
+			outputs[id(file)] = Output(file, line_buffered=line_buffered)
+
+	def flush_outputs():
+		for output in outputs.values():
+			output.flush()
+
+	def write(value):
+		if value is None:
+			value = 'nil'
+
+		stdout.write(f'{value}\n')
+
+	def fwrite(file, text):
+		outputs.get(id(file), file).write(text)
+
+	def flush(file):
+		outputs.get(id(file), file).flush()
+
+	def read_file(file, read):
+		if file is built_in_variables['stdin']:
+			flush_outputs()
+
+		return read()
+
+	def exit_(code):
+		flush_outputs()
+		exit(code)
+
+	functions = {
+		'b_write': write,
+		'b_exit': exit_,
+		'b_fwrite': fwrite,
+		'b_fread': lambda file: read_file(file, file.read),
+		'b_freadln': lambda file: read_file(file, file.readline),
+		'b_flush': flush,
+		'b_freadn': lambda file, n: read_file(file, lambda: file.read(n)),
+		'b_freadlines':
+			lambda file, n: read_file(file, lambda: read_lines(file, n)),
+		'b_flines':
+			lambda file: iter(lambda: read_file(file, file.readline), ''),
+	}
+
+	return functions, flush_outputs
+
+
+def panic_error(error, traceback, positions):
+	"""Emit a panic error, with the positions of the calls in
+	traceback, and exit."""
+
+	# (function, position) of the frames of the generated code, from
+	# the outermost
+	frames = []
+
+	while traceback:
+		code = traceback.tb_frame.f_code
+
+		if code.co_filename == GENERATED_FILE_NAME:
+			frames.append((code.co_name, positions[traceback.tb_lineno - 1]))
+
+		traceback = traceback.tb_next
+
+	file_name, line = frames[-1][1]
+	print(f'{file_name}:%.2d: panic: {error}' %line, file=sys.stderr)
+
+	# each frame called the function of the next frame
+	for (_, (file_name, line)), (function, _) in zip(
+			reversed(frames[:-1]),
+			reversed(frames[1:])):
+
+		# the generated functions are f_<name>
+		print(f'  {file_name}:%.2d: call function {function[2:]}' %line)
+
+	exit(1)
+
+
+def run(source, positions, line_buffered=None, stdout=None):
+	"""Run the generated source. positions has the (file name, line)
+	of each line of source. If stdout is given, the text written to
+	stdout goes to it."""
+
+	code = compile(source, GENERATED_FILE_NAME, 'exec')
+	functions, flush_outputs = make_output_functions(line_buffered, stdout)
+	globals_ = dict(namespace, **functions)
+	exec(code, globals_)
+
+	recursion_limit = sys.getrecursionlimit()
+	sys.setrecursionlimit(RECURSION_LIMIT)
+
+	# the globals are initialized, and the entry point is called by
+	# start. the result of the entry point is the exit code
+	try:
+		globals_['init']()
+		result = globals_['start']()
+
+	except Panic as panic:
+		flush_outputs()
+		panic_error(panic.args[0], panic.__traceback__, positions)
+
+	except RecursionError as error:
+		flush_outputs()
+		panic_error(CALL_DEPTH_EXCEEDED_ERROR, error.__traceback__, positions)
+
+	except (KeyboardInterrupt, EOFError):
+		exit(0)
+
+	finally:
+		flush_outputs()
+		sys.setrecursionlimit(recursion_limit)
+
+	exit(result)
@@ -0,0 +1,658 @@
+# Lang Compiler
+# Author: Jonas
+
+# Code generator of the register backend. Each instruction names the
+# slots of its operands and result, so the values are not pushed
+# through a stack. The literals have fixed slots too, filled when the
+# frame is created, from the frame template of the function.
+
+from built_in import built_in_functions, built_in_variables
+from node import *
+from opcodes import OpCodes, RegisterOpCodes
+from token_ import TokenType
+
+
+class RegisterGenerator:
+	def __init__(self, ast):
+		self.ast = ast
+
+		# list of (opcode, operand)
+		self.instructions = []
+
+		# list of (index of instruction, file name, line)
+		self.line_table = []
+
+		self.unary_instructions = {
+			TokenType.OPERATOR_MINUS: OpCodes.NEG,
+			TokenType.OPERATOR_NOT: OpCodes.NOT,
+			TokenType.OPERATOR_BTW_NOT: OpCodes.BNT,
+		}
+
+		self.binary_instructions = {
+			TokenType.OPERATOR_PLUS: OpCodes.ADD,
+			TokenType.OPERATOR_MINUS: OpCodes.SUB,
+			TokenType.OPERATOR_ASTERISK: OpCodes.MUL,
+			TokenType.OPERATOR_SLASH: OpCodes.DIV,
+			TokenType.OPERATOR_EQ: OpCodes.EQ,
+			TokenType.OPERATOR_NE: OpCodes.NE,
+			TokenType.OPERATOR_LT: OpCodes.LT,
+			TokenType.OPERATOR_LE: OpCodes.LE,
+			TokenType.OPERATOR_GT: OpCodes.GT,
+			TokenType.OPERATOR_GE: OpCodes.GE,
+			TokenType.OPERATOR_BTW_AND: OpCodes.BND,
+			TokenType.OPERATOR_BTW_OR: OpCodes.BOR,
+			TokenType.OPERATOR_BTW_XOR: OpCodes.XOR,
+			TokenType.OPERATOR_BTW_SHL: OpCodes.SHL,
+			TokenType.OPERATOR_BTW_SHR: OpCodes.SHR,
+		}
+
+		# function: address
+		self.functions_address = {}
+
+		# function: frame template
+		self.functions_template = {}
+
+		# indexes of the calls, linked in the end
+		self.calls_to_link = []
+
+		# position of the entry point
+		self.main_position = None
+
+		# variable: global slot
+		self.globals = {}
+
+		# variable: slot, of the function being generated, or None in
+		# the top level
+		self.locals = None
+
+		# (type, value) of literal: slot, of the frame being generated
+		self.constants = {}
+
+		# the temporaries are after the variables and the constants.
+		# they live only during a statement
+		self.first_temporary = 0
+		self.temporaries = 0
+		self.frame_size = 0
+
+		# each loop around the code being generated has the addresses
+		# of its continue jumps and of its break jumps, patched when
+		# the loop ends
+		self.loops = []
+
+		# number of for loops around the code being generated, each one
+		# keeps its iterator in a hidden variable
+		self.for_loops = 0
+
+	def emit_instruction(self, opcode, operand=None):
+		"""Emit an instruction, and returns its address."""
+
+		self.instructions.append((opcode, operand))
+
+		return len(self.instructions) - 1
+
+	def patch_address(self, address, target=None):
+		"""Set the last operand of the jump in address to target, by
+		default the current address."""
+
+		if target is None:
+			target = len(self.instructions)
+
+		opcode, operand = self.instructions[address]
+
+		if isinstance(operand, tuple):
+			operand = operand[:-1] + (target,)
+
+		else:
+			operand = target
+
+		self.instructions[address] = (opcode, operand)
+
+	def generate_loop_body(self, node):
+		"""Generate the body of a loop. Returns the addresses of its
+		continue jumps and of its break jumps."""
+
+		continue_jumps = []
+		break_jumps = []
+
+		self.loops.append((continue_jumps, break_jumps))
+		self.generate_statement(node)
+		self.loops.pop()
+
+		return continue_jumps, break_jumps
+
+	def patch_loop_jumps(self, jumps, target=None):
+		for address in jumps:
+			self.patch_address(address, target)
+
+	def mark_position(self, position):
+		"""Set the position of the instructions emitted from the
+		current address."""
+
+		entry = (len(self.instructions), position.file_name, position.line)
+
+		if self.line_table and self.line_table[-1][1:] == entry[1:]:
+			return
+
+		# the last position has no instructions
+		if self.line_table and self.line_table[-1][0] == entry[0]:
+			self.line_table.pop()
+
+		self.line_table.append(entry)
+
+	def declare_variable(self, name):
+		"""Returns the slot of a new variable, in the current frame or
+		in globals."""
+
+		if self.locals is None:
+			if name not in self.globals:
+				self.globals[name] = len(self.globals)
+
+			return self.globals[name]
+
+		# variables of different blocks can not be visible at the same
+		# time, so they share the slot
+		if name not in self.locals:
+			self.locals[name] = self.fixed_slots()
+
+		return self.locals[name]
+
+	def fixed_slots(self):
+		"""Returns the number of slots of variables and constants in
+		the current frame."""
+
+		if self.locals is None:
+			return len(self.constants)
+
+		return len(self.locals) + len(self.constants)
+
+	def add_constant(self, value):
+		"""Returns the slot of the literal value, in the current
+		frame."""
+
+		# 1 == 1.0, so the type is part of the key
+		key = (type(value), value)
+
+		if key not in self.constants:
+			self.constants[key] = self.fixed_slots()
+
+		return self.constants[key]
+
+	def get_literal_value(self, node):
+		"""Returns the value of the literal node."""
+
+		# the value of nil is its name
+		if isinstance(node, NilNode):
+			return None
+
+		return node.value
+
+	def collect_slots(self, node):
+		"""Give slots to the variables declared and to the literals used
+		in node."""
+
+		if isinstance(node, LetNode):
+			if node.value is not None:
+				self.collect_slots(node.value)
+
+			else:
+				self.add_constant(None)
+
+			if self.locals is not None:
+				self.declare_variable(node.name)
+
+		elif isinstance(node, ListNode):
+			for value in node.value:
+				self.collect_slots(value)
+
+		elif isinstance(node, LiteralNode):
+			self.add_constant(self.get_literal_value(node))
+
+		elif isinstance(node, UnaryOperationNode):
+			self.collect_slots(node.left)
+
+		elif isinstance(node, BinaryOperationNode):
+			self.collect_slots(node.left)
+			self.collect_slots(node.right)
+
+		elif isinstance(node, BlockNode):
+			for statement in node.body:
+				self.collect_slots(statement)
+
+		elif isinstance(node, IfNode):
+			self.collect_slots(node.condition)
+			self.collect_slots(node.if_body)
+
+			if node.else_body is not None:
+				self.collect_slots(node.else_body)
+
+		elif isinstance(node, WhileNode) or isinstance(node, DoWhileNode):
+			self.collect_slots(node.condition)
+			self.collect_slots(node.body)
+
+		elif isinstance(node, ForNode):
+			for value in node.values:
+				self.collect_slots(value)
+
+			# the iterator is in a hidden variable, a name that is not
+			# an identifier. the for loops that are not nested share it
+			self.declare_variable(f'for {self.for_loops}')
+			self.declare_variable(node.name)
+
+			self.for_loops += 1
+			self.collect_slots(node.body)
+			self.for_loops -= 1
+
+		elif isinstance(node, CallNode):
+			for argument in node.arguments:
+				self.collect_slots(argument)
+
+		elif isinstance(node, ReturnNode) or isinstance(node, AssignNode):
+			self.collect_slots(node.value)
+
+		elif isinstance(node, ListAccessNode):
+			self.collect_slots(node.list)
+			self.collect_slots(node.index)
+
+	def begin_frame(self, node):
+		"""Begin a new frame, of a function or of the top level, for
+		the statements in node."""
+
+		self.constants = {}
+
+		# nil is the return of the functions without return
+		self.add_constant(None)
+
+		self.collect_slots(node)
+
+		self.first_temporary = self.fixed_slots()
+		self.frame_size = self.first_temporary
+		self.temporaries = 0
+
+	def end_frame(self):
+		"""Returns the template of the current frame."""
+
+		template = [None] * self.frame_size
+
+		for (_, value), slot in self.constants.items():
+			template[slot] = value
+
+		return template
+
+	def begin_temporaries(self):
+		"""The temporaries of the previous statement are not used
+		anymore."""
+
+		self.temporaries = 0
+
+	def new_temporary(self):
+		"""Returns the slot of a new temporary."""
+
+		slot = self.first_temporary + self.temporaries
+		self.temporaries += 1
+		self.frame_size = max(self.frame_size, slot + 1)
+
+		return slot
+
+	def generate_expression(self, node, dst=None):
+		"""Generate the code of an expression, and returns the slot of
+		its value. If dst is not None, the value is stored in dst."""
+
+		self.mark_position(node.position)
+
+		if isinstance(node, ListNode):
+			first = self.temporaries
+
+			# the values are evaluated from the last, like in the stack
+			# backend
+			slots = [
+				self.generate_expression(value)
+				for value in reversed(node.value)
+			]
+
+			slots.reverse()
+
+			self.temporaries = first
+			dst = self.new_temporary() if dst is None else dst
+			self.emit_instruction(RegisterOpCodes.LST, (dst, tuple(slots)))
+
+			return dst
+
+		elif isinstance(node, LiteralNode):
+			return self.move(dst, self.add_constant(self.get_literal_value(node)))
+
+		elif isinstance(node, IdentifierNode):
+			if node.name in built_in_variables:
+				dst = self.new_temporary() if dst is None else dst
+				self.emit_instruction(RegisterOpCodes.LDB, (dst, node.name))
+				return dst
+
+			elif self.locals is not None and node.name in self.locals:
+				return self.move(dst, self.locals[node.name])
+
+			dst = self.new_temporary() if dst is None else dst
+			self.emit_instruction(
+				RegisterOpCodes.LDG,
+				(dst, self.globals[node.name]),
+			)
+
+			return dst
+
+		elif isinstance(node, UnaryOperationNode):
+			# +1 == 1, so ignore
+			if node.operator == TokenType.OPERATOR_PLUS:
+				return self.generate_expression(node.left, dst)
+
+			first = self.temporaries
+			a = self.generate_expression(node.left)
+
+			self.temporaries = first
+			dst = self.new_temporary() if dst is None else dst
+			self.emit_instruction(
+				self.unary_instructions[node.operator],
+				(dst, a),
+			)
+
+			return dst
+
+		elif isinstance(node, BinaryOperationNode):
+			first = self.temporaries
+			a = self.generate_expression(node.left)
+			b = self.generate_expression(node.right)
+
+			self.temporaries = first
+			dst = self.new_temporary() if dst is None else dst
+			self.emit_instruction(
+				self.binary_instructions[node.operator],
+				(dst, a, b),
+			)
+
+			return dst
+
+		elif isinstance(node, CallNode):
+			return self.generate_call(node, dst)
+
+		elif isinstance(node, ListAccessNode):
+			first = self.temporaries
+			list_ = self.generate_expression(node.list)
+			index = self.generate_expression(node.index)
+
+			self.temporaries = first
+			dst = self.new_temporary() if dst is None else dst
+			self.emit_instruction(
+				RegisterOpCodes.BLT,
+				(OpCodes.GET, dst, (list_, index)),
+			)
+
+			return dst
+
+		raise NotImplementedError(node)
+
+	def move(self, dst, src):
+		"""Returns src, or moves src to dst if dst is not None."""
+
+		if dst is None or dst == src:
+			return src
+
+		self.emit_instruction(RegisterOpCodes.MOV, (dst, src))
+
+		return dst
+
+	def generate_call(self, node, dst=None, discard=False):
+		"""Generate the code of a call, and returns the slot of its
+		result. If discard is True, the result of a built in function
+		is not stored."""
+
+		first = self.temporaries
+
+		# the arguments are evaluated from the last, like in the stack
+		# backend
+		arguments = [
+			self.generate_expression(argument)
+			for argument in reversed(node.arguments)
+		]
+
+		self.temporaries = first
+
+		if node.name in built_in_functions:
+			if not discard:
+				dst = self.new_temporary() if dst is None else dst
+
+			# the arguments are given in the order of the stack backend
+			self.emit_instruction(RegisterOpCodes.BLT, (
+				built_in_functions[node.name][1],
+				dst,
+				tuple(arguments),
+			))
+
+			return dst
+
+		arguments.reverse()
+
+		dst = self.new_temporary() if dst is None else dst
+		self.calls_to_link.append(self.emit_instruction(
+			RegisterOpCodes.CAL,
+			(dst, node.name, None, None, tuple(arguments)),
+		))
+
+		return dst
+
+	def generate_statement(self, node):
+		"""Generate the code of a statement."""
+
+		self.begin_temporaries()
+		self.mark_position(node.position)
+
+		if isinstance(node, BlockNode):
+			for statement in node.body:
+				self.generate_statement(statement)
+
+		elif isinstance(node, LetNode) or isinstance(node, AssignNode):
+			if isinstance(node, LetNode):
+				self.declare_variable(node.name)
+
+			value = node.value if node.value is not None \
+				else NilNode(node.position, None)
+
+			if self.locals is not None and node.name in self.locals:
+				self.generate_expression(value, self.locals[node.name])
+
+			else:
+				self.emit_instruction(RegisterOpCodes.STG, (
+					self.globals[node.name],
+					self.generate_expression(value),
+				))
+
+		elif isinstance(node, CallNode):
+			self.generate_call(node, discard=True)
+
+		elif isinstance(node, IfNode):
+			condition = self.generate_expression(node.condition)
+			jump_false_address = self.emit_instruction(
+				RegisterOpCodes.JPF,
+				(condition, None),  # temporary address
+			)
+
+			self.generate_statement(node.if_body)
+
+			if node.else_body is not None:
+				jump_to_end_address = self.emit_instruction(
+					RegisterOpCodes.JMP,
+					None,  # temporary address
+				)
+
+				self.patch_address(jump_false_address)
+				self.generate_statement(node.else_body)
+				self.patch_address(jump_to_end_address)
+
+			else:
+				self.patch_address(jump_false_address)
+
+		elif isinstance(node, WhileNode):
+			condition_address = len(self.instructions)
+
+			condition = self.generate_expression(node.condition)
+			jump_to_end_address = self.emit_instruction(
+				RegisterOpCodes.JPF,
+				(condition, None),  # temporary address
+			)
+
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
+			self.emit_instruction(RegisterOpCodes.JMP, condition_address)
+
+			self.patch_address(jump_to_end_address)
+			self.patch_loop_jumps(continue_jumps, condition_address)
+			self.patch_loop_jumps(break_jumps)
+
+		elif isinstance(node, ForNode):
+			iterator = self.locals[f'for {self.for_loops}']
+			values = [self.generate_expression(value) for value in node.values]
+
+			self.mark_position(node.position)
+			self.emit_instruction(
+				RegisterOpCodes.ITR if len(values) == 1 else RegisterOpCodes.RGI,
+				(iterator, *values),
+			)
+
+			# the for instruction is after the body, so each iteration
+			# is only one dispatch
+			jump_to_for_address = self.emit_instruction(
+				RegisterOpCodes.JMP,
+				None,  # temporary address
+			)
+
+			body_address = len(self.instructions)
+
+			self.for_loops += 1
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
+			self.for_loops -= 1
+
+			self.patch_address(jump_to_for_address)
+			self.patch_loop_jumps(continue_jumps)
+
+			self.mark_position(node.position)
+			self.emit_instruction(RegisterOpCodes.FOR, (
+				iterator,
+				self.locals[node.name],
+				body_address,
+			))
+
+			self.patch_loop_jumps(break_jumps)
+
+		elif isinstance(node, BreakNode):
+			self.loops[-1][1].append(
+				self.emit_instruction(RegisterOpCodes.JMP, None)
+			)
+
+		elif isinstance(node, ContinueNode):
+			self.loops[-1][0].append(
+				self.emit_instruction(RegisterOpCodes.JMP, None)
+			)
+
+		elif isinstance(node, DoWhileNode):
+			body_address = len(self.instructions)
+			continue_jumps, break_jumps = self.generate_loop_body(node.body)
+
+			self.patch_loop_jumps(continue_jumps)
+			self.begin_temporaries()
+			condition = self.generate_expression(node.condition)
+			self.emit_instruction(
+				RegisterOpCodes.JPT,
+				(condition, body_address),
+			)
+
+			self.patch_loop_jumps(break_jumps)
+
+		elif isinstance(node, ReturnNode):
+			self.emit_instruction(
+				RegisterOpCodes.RET,
+				self.generate_expression(node.value),
+			)
+
+		else:
+			raise NotImplementedError(node)
+
+	def generate_function(self, node):
+		"""Generate the code of a function."""
+
+		self.functions_address[node.name] = len(self.instructions)
+
+		if node.name == 'main':
+			self.main_position = node.position
+
+		# the arguments are the first slots of the frame
+		self.locals = {}
+
+		for argument in node.arguments:
+			self.locals[argument.name] = len(self.locals)
+
+		self.begin_frame(node.body)
+
+		self.mark_position(node.position)
+		self.generate_statement(node.body)
+
+		# if the function no return, return nil
+		if not self.ends_with_return(node.body):
+			self.emit_instruction(RegisterOpCodes.RET, self.add_constant(None))
+
+		self.functions_template[node.name] = self.end_frame()
+		self.locals = None
+
+	def ends_with_return(self, node):
+		"""Returns if the last statement of node is a return."""
+
+		if isinstance(node, BlockNode):
+			return len(node.body) > 0 and self.ends_with_return(node.body[-1])
+
+		return isinstance(node, ReturnNode)
+
+	def link_calls(self):
+		"""Link the addresses and frame templates of the calls. The call
+		receives only the part of the template after the arguments."""
+
+		for address in self.calls_to_link:
+			opcode, (dst, name, _, _, arguments) = self.instructions[address]
+			template = self.functions_template[name]
+
+			self.instructions[address] = (opcode, (
+				dst,
+				name,
+				self.functions_address[name],
+				template[len(arguments):],
+				arguments,
+			))
+
+	def generate(self):
+		"""Generate all code. Returns the instructions and the line
+		table."""
+
+		declarations = [node for node in self.ast if isinstance(node, LetNode)]
+		functions = [node for node in self.ast if isinstance(node, FnNode)]
+
+		# the top level initializes the globals, calls the entry point
+		# and exits with its result. the functions are after it
+		self.begin_frame(BlockNode(None, declarations))
+
+		globals_address = self.emit_instruction(RegisterOpCodes.GBL)
+
+		for node in declarations:
+			self.generate_statement(node)
+
+		# call the entry point, from the position of its declaration
+		main = next(node for node in functions if node.name == 'main')
+		self.mark_position(main.position)
+		self.begin_temporaries()
+
+		result = self.generate_call(CallNode(main.position, 'main', []))
+		self.emit_instruction(RegisterOpCodes.BLT, (OpCodes.EXT, None, (result,)))
+
+		self.instructions[globals_address] = (
+			RegisterOpCodes.GBL,
+			(len(self.globals), self.end_frame()),
+		)
+
+		for node in functions:
+			self.generate_function(node)
+
+		self.link_calls()
+
+		return self.instructions, self.line_table
@@ -0,0 +1,269 @@
+# Lang VM
+# Author: Jonas
+
+# VM of the register backend. The built in functions are executed by
+# the handlers of the stack VM, with their arguments pushed in its
+# stack.
+
+from built_in import built_in_variables
+from opcodes import OpCodes, RegisterOpCodes
+from vm import VM, DISPATCH_TABLE, DEFAULT_MEMO_SIZE, opcodes_as_string
+
+register_opcodes_as_string = {
+	RegisterOpCodes.MOV: 'move   ',
+	RegisterOpCodes.LDG: 'gload  ',
+	RegisterOpCodes.STG: 'gstore ',
+	RegisterOpCodes.LDB: 'bload  ',
+	RegisterOpCodes.JMP: 'jump   ',
+	RegisterOpCodes.JPT: 'jumpt  ',
+	RegisterOpCodes.JPF: 'jumpf  ',
+	RegisterOpCodes.CAL: 'call   ',
+	RegisterOpCodes.RET: 'ret    ',
+	RegisterOpCodes.LST: 'lload  ',
+	RegisterOpCodes.BLT: 'builtin',
+	RegisterOpCodes.GBL: 'globals',
+	RegisterOpCodes.ITR: 'iter   ',
+	RegisterOpCodes.RGI: 'rangeit',
+	RegisterOpCodes.FOR: 'for    ',
+}
+
+
+class RegisterVM(VM):
+	def __init__(self, instructions, line_table):
+		# list of (opcode, operand), generated by RegisterGenerator
+		self.instructions = instructions
+
+		# list of (index of instruction, file name, line)
+		self.line_table = line_table
+		self.line_table_indexes = [entry[0] for entry in line_table]
+
+		self.pc = 0
+		self.init_state(DISPATCH_TABLE, DEFAULT_MEMO_SIZE)
+
+	def run(self):
+		self.run_table()
+
+	def get_handlers(self):
+		"""Returns a list of handlers indexed by opcode. The handlers of
+		the stack VM are used by the built in functions."""
+
+		self.built_in_handlers = super().get_handlers()
+
+		handlers = {
+			RegisterOpCodes.MOV: self.execute_mov,
+			RegisterOpCodes.LDG: self.execute_register_ldg,
+			RegisterOpCodes.STG: self.execute_register_stg,
+			RegisterOpCodes.LDB: self.execute_register_ldb,
+			RegisterOpCodes.JMP: self.execute_jmp,
+			RegisterOpCodes.JPT: self.execute_register_jpt,
+			RegisterOpCodes.JPF: self.execute_register_jpf,
+			RegisterOpCodes.CAL: self.execute_register_cal,
+			RegisterOpCodes.RET: self.execute_register_ret,
+			RegisterOpCodes.LST: self.execute_lst,
+			RegisterOpCodes.BLT: self.execute_blt,
+			RegisterOpCodes.GBL: self.execute_register_gbl,
+			RegisterOpCodes.ITR: self.execute_register_itr,
+			RegisterOpCodes.RGI: self.execute_register_rgi,
+			RegisterOpCodes.FOR: self.execute_for,
+		}
+
+		for instr in self.binary_operations:
+			handlers[instr] = self.make_register_binary_operation(instr)
+
+		for instr in self.unary_operations:
+			handlers[instr] = self.make_register_unary_operation(instr)
+
+		handlers_list = [None] * (max(handlers) + 1)
+
+		for instr, handler in handlers.items():
+			handlers_list[instr] = handler
+
+		return handlers_list
+
+	def make_register_binary_operation(self, instr):
+		"""Returns a handler for the binary operation instr."""
+
+		operation = self.binary_operations[instr]
+
+		# the errors of these operations are not only of types
+		always_check = instr in (OpCodes.DIV, OpCodes.SHL, OpCodes.SHR)
+
+		# the check already adds the operands
+		is_addition = instr == OpCodes.ADD
+
+		def execute_register_binary_operation(operand):
+			dst, a, b = operand
+			frame = self.frame
+			a = frame[a]
+			b = frame[b]
+
+			if always_check or type(a) is not int or type(b) is not int:
+				value = self.check_binary_operation(instr, a, b)
+
+				if is_addition:
+					frame[dst] = value
+					return
+
+			frame[dst] = operation(a, b)
+
+		return execute_register_binary_operation
+
+	def make_register_unary_operation(self, instr):
+		"""Returns a handler for the unary operation instr."""
+
+		operation = self.unary_operations[instr]
+
+		def execute_register_unary_operation(operand):
+			dst, a = operand
+			frame = self.frame
+			frame[dst] = operation(frame[a])
+
+		return execute_register_unary_operation
+
+	def execute_mov(self, operand):
+		dst, src = operand
+		self.frame[dst] = self.frame[src]
+
+	def execute_register_ldg(self, operand):
+		dst, slot = operand
+		self.frame[dst] = self.globals[slot]
+
+	def execute_register_stg(self, operand):
+		slot, src = operand
+		self.globals[slot] = self.frame[src]
+
+	def execute_register_ldb(self, operand):
+		dst, name = operand
+		self.frame[dst] = built_in_variables[name]
+
+	def execute_register_jpt(self, operand):
+		src, address = operand
+		if self.frame[src]: self.pc = address
+
+	def execute_register_jpf(self, operand):
+		src, address = operand
+		if not self.frame[src]: self.pc = address
+
+	def execute_register_cal(self, operand):
+		dst, name, address, template, arguments = operand
+		frame = self.frame
+
+		self.call_stack.append((name, self.pc, dst, frame))
+
+		# the arguments are the first slots, followed by the variables,
+		# constants and temporaries of the template
+		self.frame = [frame[slot] for slot in arguments]
+		self.frame += template
+
+		self.pc = address
+
+	def execute_register_ret(self, operand):
+		value = self.frame[operand]
+		_, self.pc, dst, self.frame = self.call_stack.pop()
+		self.frame[dst] = value
+
+	def execute_register_itr(self, operand):
+		dst, src = operand
+		self.frame[dst] = self.make_iterator(self.frame[src])
+
+	def execute_register_rgi(self, operand):
+		dst, start, end = operand
+		frame = self.frame
+		frame[dst] = self.make_range_iterator(frame[start], frame[end])
+
+	def execute_lst(self, operand):
+		dst, slots = operand
+		frame = self.frame
+		frame[dst] = [frame[slot] for slot in slots]
+
+	def execute_blt(self, operand):
+		instr, dst, arguments = operand
+		frame = self.frame
+		stack = self.stack
+
+		for slot in arguments:
+			stack.append(frame[slot])
+
+		self.built_in_handlers[instr](None)
+
+		# not all built in functions have a result
+		if stack:
+			value = stack.pop()
+
+			if dst is not None:
+				frame[dst] = value
+
+	def execute_register_gbl(self, operand):
+		number_of_globals, template = operand
+		self.globals = [None] * number_of_globals
+		self.frame = list(template)
+
+	def disassemble(self):
+		line_table = {
+			index: (file_name, line)
+			for index, file_name, line in self.line_table
+		}
+
+		for pc, (instr, operand) in enumerate(self.instructions):
+			# the instruction starts a new position
+			if pc in line_table:
+				file_name, line = line_table[pc]
+				print(f'\033[1;32m{file_name}:%.2d:\033[0;0m' %line)
+
+			if instr in register_opcodes_as_string:
+				name = register_opcodes_as_string[instr]
+
+			else:
+				name = opcodes_as_string[instr]
+
+			print(f'  {pc:3}: {name} ', end='')
+
+			if instr == RegisterOpCodes.CAL:
+				dst, name, address, template, arguments = operand
+				print(
+					f'r{dst} {name}',
+					*(f'r{slot}' for slot in arguments),
+					f'// address {address},'
+						+ f' {len(arguments) + len(template)} slot(s)',
+				)
+
+			elif instr == RegisterOpCodes.BLT:
+				built_in, dst, arguments = operand
+				print(
+					opcodes_as_string[built_in].strip(),
+					'_' if dst is None else f'r{dst}',
+					*(f'r{slot}' for slot in arguments),
+				)
+
+			elif instr == RegisterOpCodes.LST:
+				dst, slots = operand
+				print(f'r{dst}', *(f'r{slot}' for slot in slots))
+
+			elif instr == RegisterOpCodes.GBL:
+				number_of_globals, template = operand
+				print(number_of_globals, template)
+
+			elif instr in (RegisterOpCodes.LDG, RegisterOpCodes.LDB):
+				dst, value = operand
+				print(f'r{dst}', value)
+
+			elif instr == RegisterOpCodes.STG:
+				slot, src = operand
+				print(slot, f'r{src}')
+
+			elif instr == RegisterOpCodes.JMP:
+				print(operand)
+
+			elif instr == RegisterOpCodes.FOR:
+				iterator, variable, address = operand
+				print(f'r{iterator}', f'r{variable}', address)
+
+			elif instr in (RegisterOpCodes.JPT, RegisterOpCodes.JPF):
+				src, address = operand
+				print(f'r{src}', address)
+
+			elif instr == RegisterOpCodes.RET:
+				print(f'r{operand}')
+
+			else:
+				print(*(f'r{slot}' for slot in operand))
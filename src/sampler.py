@@ -0,0 +1,104 @@
+# Lang VM
+# Author: Jonas
+
+# Sampling profiler. A timer signal (or a thread, where there are no
+# timer signals) takes the stack of calls of the VM periodically, and
+# the number of samples of each stack is written when the program
+# exits. The VM runs without changes, so the cost is only the samples.
+
+import signal
+import threading
+
+# milliseconds between samples
+DEFAULT_SAMPLE_INTERVAL = 10
+
+MILLISECONDS_PER_SECOND = 1000
+
+
+class Sampler:
+	def __init__(self, vm, interval=DEFAULT_SAMPLE_INTERVAL):
+		self.vm = vm
+		self.interval = interval / MILLISECONDS_PER_SECOND
+
+		# tuple of (function, pc) from the outermost call: samples
+		self.samples = {}
+
+		self.previous_handler = None
+		self.thread = None
+		self.stopped = threading.Event()
+
+	def sample(self, *_):
+		"""Take the current stack of calls. The pc of each function is
+		the return address of the function it has called, and the pc of
+		the VM for the innermost."""
+
+		vm = self.vm
+		call_stack = list(vm.call_stack)
+
+		if not call_stack:
+			return
+
+		pcs = [entry[1] for entry in call_stack[1:]]
+		pcs.append(vm.pc)
+
+		stack = tuple(
+			(entry[0], pc - 1) for entry, pc in zip(call_stack, pcs)
+		)
+
+		self.samples[stack] = self.samples.get(stack, 0) + 1
+
+	def run_thread(self):
+		while not self.stopped.wait(self.interval):
+			self.sample()
+
+	def start(self):
+		"""Start taking samples, with the profiling timer if it
+		exists."""
+
+		if hasattr(signal, 'setitimer') \
+				and threading.current_thread() is threading.main_thread():
+			self.previous_handler = signal.signal(signal.SIGPROF, self.sample)
+			signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+		else:
+			self.thread = threading.Thread(target=self.run_thread, daemon=True)
+			self.thread.start()
+
+	def stop(self):
+		if self.thread is not None:
+			self.stopped.set()
+			self.thread.join()
+			self.thread = None
+
+		elif self.previous_handler is not None:
+			signal.setitimer(signal.ITIMER_PROF, 0)
+			signal.signal(signal.SIGPROF, self.previous_handler)
+			self.previous_handler = None
+
+	def collapsed_stacks(self):
+		"""Returns the samples of each stack as lines of the collapsed
+		format read by the flame graph tools: each function with its
+		file and line, separated by ';', and the number of samples."""
+
+		positions = {}
+		stacks = {}
+
+		for stack, count in self.samples.items():
+			functions = []
+
+			for function, pc in stack:
+				if pc not in positions:
+					positions[pc] = '%s:%.2d' %self.vm.get_position(pc)
+
+				functions.append(f'{function} ({positions[pc]})')
+
+			path = ';'.join(functions)
+			stacks[path] = stacks.get(path, 0) + count
+
+		return [f'{path} {count}' for path, count in sorted(stacks.items())]
+
+	def write(self, file_name):
+		"""Write the collapsed stacks in the file file_name."""
+
+		with open(file_name, 'w') as f:
+			f.write(''.join(line + '\n' for line in self.collapsed_stacks()))
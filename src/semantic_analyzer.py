@@ -2,11 +2,13 @@
 # Author: Jonas
 
 from built_in import built_in_functions, built_in_variables
+from built_in import impure_built_in_functions
 from error import UndefinedError
 from error import VariableIsNotCallableError
 from error import WrongNumberOfArgumentsError
 from error import NoEntryPointError
 from error import RedeclarationError
+from error import OutsideOfLoopError
 from node import *
 
 
@@ -22,6 +24,12 @@ class Function:
 		self.position = position
 		self.arguments = arguments
 
+		# a function is pure if its result depends only on its
+		# arguments, and it has no side effects
+		self.pure = True
+		self.calls = set()
+		self.globals_read = set()
+
 
 class SemanticAnalyzer:
 	def __init__(self, ast):
@@ -39,6 +47,21 @@ class SemanticAnalyzer:
 		self.functions = {}
 		self.call_nodes = []
 
+		# the function being analyzed, or None in the top level
+		self.current_function = None
+
+		# globals assigned inside functions
+		self.assigned_globals = set()
+
+		# globals declared with an int, float, string or nil, that are
+		# not assigned. their values can not change, the values of the
+		# other globals can, even if not assigned, like a list changed by
+		# append
+		self.immutable_globals = set()
+
+		# number of loops around the node being analyzed
+		self.loops = 0
+
 	def update_current_node(self):
 		"""Update the current node."""
 
@@ -80,6 +103,12 @@ class SemanticAnalyzer:
 
 		self.variables[-1][name].initialized = True
 
+	def is_global_variable(self, name):
+		"""Returns if the variable name, visible in the current scope,
+		is a global."""
+
+		return self.variables[-1][name] is self.variables[0].get(name)
+
 	def function_exists(self, name):
 		"""Returns is a function exists."""
 
@@ -105,6 +134,14 @@ class SemanticAnalyzer:
 
 		return built_in_functions[name][0]
 
+	def is_immutable_value(self, node):
+		"""Returns if node is a value that can not be changed."""
+
+		return isinstance(node, IntNode) \
+			or isinstance(node, FloatNode) \
+			or isinstance(node, StringNode) \
+			or isinstance(node, NilNode)
+
 	def analyze_node(self, node):
 		"""Analyze the semantic of a node."""
 
@@ -129,6 +166,10 @@ class SemanticAnalyzer:
 				True if node.value else False,
 			)
 
+			if not self.current_function and self.is_global_variable(node.name) \
+					and self.is_immutable_value(node.value):
+				self.immutable_globals.add(node.name)
+
 		elif isinstance(node, IdentifierNode):
 			if node.name in built_in_variables:
 				return
@@ -139,6 +180,9 @@ class SemanticAnalyzer:
 
 			self.mark_variable_as_used(node.name)
 
+			if self.current_function and self.is_global_variable(node.name):
+				self.current_function.globals_read.add(node.name)
+
 		elif isinstance(node, BlockNode):
 			self.new_scope()
 
@@ -149,6 +193,7 @@ class SemanticAnalyzer:
 
 		elif isinstance(node, FnNode):
 			self.add_function(node.position, node.name, node.arguments)
+			self.current_function = self.functions[node.name]
 
 			self.new_scope()
 
@@ -162,6 +207,7 @@ class SemanticAnalyzer:
 			self.analyze_node(node.body)
 
 			self.end_scope()
+			self.current_function = None
 
 		elif isinstance(node, IfNode):
 			self.analyze_node(node.condition)
@@ -170,7 +216,32 @@ class SemanticAnalyzer:
 
 		elif isinstance(node, WhileNode):
 			self.analyze_node(node.condition)
-			self.analyze_node(node.body)
+			self.analyze_loop_body(node.body)
+
+		elif isinstance(node, ForNode):
+			for value in node.values:
+				self.analyze_node(value)
+
+			# the variable is visible only in the loop
+			self.new_scope()
+
+			if self.variable_exists_in_the_current_scope(node.name):
+				error = RedeclarationError(node.position, node.name)
+				error.show_error_and_abort()
+
+			self.add_variable(node.position, node.name, True)
+			self.analyze_loop_body(node.body)
+
+			self.end_scope()
+
+		elif isinstance(node, BreakNode) or isinstance(node, ContinueNode):
+			if not self.loops:
+				error = OutsideOfLoopError(
+					node.position,
+					'break' if isinstance(node, BreakNode) else 'continue',
+				)
+
+				error.show_error_and_abort()
 
 		elif isinstance(node, ReturnNode):
 			self.analyze_node(node.value)
@@ -184,11 +255,22 @@ class SemanticAnalyzer:
 
 			self.mark_variable_as_initialized(node.name)
 
+			if self.current_function and self.is_global_variable(node.name):
+				self.assigned_globals.add(node.name)
+				self.current_function.pure = False
+
+			elif self.is_global_variable(node.name):
+				self.immutable_globals.discard(node.name)
+
 		elif isinstance(node, CallNode):
 			for argument in node.arguments:
 				self.analyze_node(argument)
 
 			if self.is_built_in_function(node.name):
+				if self.current_function \
+						and node.name in impure_built_in_functions:
+					self.current_function.pure = False
+
 				arguments_length = self.get_built_in_function_arguments(
 					node.name,
 				)
@@ -217,8 +299,11 @@ class SemanticAnalyzer:
 
 			self.call_nodes.append(node)
 
+			if self.current_function:
+				self.current_function.calls.add(node.name)
+
 		elif isinstance(node, DoWhileNode):
-			self.analyze_node(node.body)
+			self.analyze_loop_body(node.body)
 			self.analyze_node(node.condition)
 
 		elif isinstance(node, IntNode) \
@@ -240,6 +325,14 @@ class SemanticAnalyzer:
 		else:
 			raise NotImplementedError(type(node))
 
+	def analyze_loop_body(self, node):
+		"""Analyze the body of a loop, where break and continue are
+		valid."""
+
+		self.loops += 1
+		self.analyze_node(node)
+		self.loops -= 1
+
 	def analyze(self):
 		"""Analyze all nodes."""
 
@@ -269,3 +362,27 @@ class SemanticAnalyzer:
 			error = NoEntryPointError()
 			error.show_error_and_abort()
 
+	def get_pure_functions(self):
+		"""Returns the names of the pure functions. A function is not
+		pure if it reads a global that is not immutable, or calls a
+		function that is not pure."""
+
+		immutable_globals = self.immutable_globals - self.assigned_globals
+
+		pure = {
+			name
+			for name, function in self.functions.items()
+			if function.pure and function.globals_read <= immutable_globals
+		}
+
+		changed = True
+
+		while changed:
+			changed = False
+
+			for name in list(pure):
+				if not self.functions[name].calls <= pure:
+					pure.remove(name)
+					changed = True
+
+		return pure
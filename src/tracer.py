@@ -0,0 +1,835 @@
+# Lang VM
+# Author: Jonas
+
+# Tracing compiler of hot loops. The VM counts the backward jumps to
+# each loop header, and the next iteration of a hot loop is recorded
+# while it runs. The recorded path is translated to a Python function,
+# specialized for the types seen, with guards that exit to the
+# interpreter when the path or the types change. The exits that become
+# hot are recorded too, and compiled as branches of the same function.
+
+from built_in import built_in_variables
+from opcodes import OpCodes
+from vm import TYPE_NAMES, opcodes_as_string
+
+# backward jumps to a loop header before its loop is recorded
+DEFAULT_TRACE_THRESHOLD = 100
+
+# instructions recorded by a trace, longer paths are not compiled
+MAX_TRACE_LENGTH = 1000
+
+# branches compiled in the trace of a loop
+MAX_BRANCHES = 16
+
+# file name of the generated code
+GENERATED_FILE_NAME = '<trace>'
+
+# types that are operands of the arithmetic operations
+NUMBERS = {int, float, bool}
+
+# value of the stack entries that are not constants
+NOT_CONSTANT = object()
+
+binary_operators = {
+	OpCodes.ADD: '+',
+	OpCodes.SUB: '-',
+	OpCodes.MUL: '*',
+	OpCodes.DIV: '/',
+	OpCodes.EQ: '==',
+	OpCodes.NE: '!=',
+	OpCodes.LT: '<',
+	OpCodes.LE: '<=',
+	OpCodes.GT: '>',
+	OpCodes.GE: '>=',
+	OpCodes.XOR: '^',
+	OpCodes.SHL: '<<',
+	OpCodes.SHR: '>>',
+	OpCodes.BOR: '|',
+	OpCodes.BND: '&',
+}
+
+comparisons = {
+	OpCodes.EQ,
+	OpCodes.NE,
+	OpCodes.LT,
+	OpCodes.LE,
+	OpCodes.GT,
+	OpCodes.GE,
+}
+
+# instructions that can be recorded, besides the operations
+supported_instructions = {
+	OpCodes.LDI,
+	OpCodes.LDF,
+	OpCodes.LDS,
+	OpCodes.LDN,
+	OpCodes.LDB,
+	OpCodes.LDL,
+	OpCodes.LDV,
+	OpCodes.STO,
+	OpCodes.LDG,
+	OpCodes.STG,
+	OpCodes.LVV,
+	OpCodes.LVI,
+	OpCodes.IVI,
+	OpCodes.AVI,
+	OpCodes.JMP,
+	OpCodes.JPT,
+	OpCodes.JPF,
+	OpCodes.CJF,
+	OpCodes.NOP,
+	OpCodes.POP,
+	OpCodes.DUP,
+	OpCodes.INC,
+	OpCodes.DEC,
+	OpCodes.WRT,
+	OpCodes.GET,
+	OpCodes.SET,
+	OpCodes.APD,
+	OpCodes.LPP,
+	OpCodes.LEN,
+	OpCodes.CPY,
+	OpCodes.TYP,
+	OpCodes.NOT,
+	OpCodes.NEG,
+	OpCodes.BNT,
+} | set(binary_operators)
+
+
+class Unsupported(Exception):
+	"""Raised when a loop can not be recorded or compiled, with the
+	reason."""
+
+
+class Trace:
+	def __init__(self, header, back_edge, types, steps):
+		self.header = header
+		self.back_edge = back_edge
+
+		# variable: type when the loop is entered
+		self.types = types
+
+		# each step is [index, instruction, operand, observed, branch].
+		# observed is what the recording has seen: if a jump was taken,
+		# or the type of a value read from a list. branch is the steps
+		# recorded from the exit of a guard, None if not recorded, or
+		# False if it can not be recorded
+		self.steps = steps
+
+		self.function = None
+		self.source = ''
+
+		# (pc, step of the guard or None) of each exit, the exit 0 is
+		# the guard of the entry
+		self.exits = []
+		self.exit_counts = []
+
+		self.entries = 0
+		self.exits_taken = 0
+		self.branches = 0
+
+		# entries in sequence where the types were not the expected
+		self.failures = 0
+
+
+class State:
+	"""Types of the variables and stack of expressions, in a point of
+	the trace."""
+
+	def __init__(self, types, stack):
+		self.types = types
+
+		# list of (expression, type, variables read, constant value)
+		self.stack = stack
+
+	def copy(self):
+		return State(dict(self.types), list(self.stack))
+
+
+class TraceCompiler:
+	def __init__(self, trace, generic_instructions, write):
+		self.trace = trace
+
+		# quickened instruction: generic instruction
+		self.generic_instructions = generic_instructions
+
+		# function that writes in the output of the VM
+		self.write = write
+
+		self.lines = []
+		self.indentation = 0
+		self.temporaries = 0
+
+		# name in the generated code: value
+		self.namespace = {}
+		self.constant_names = {}
+
+		self.exits = [(trace.header, None)]
+
+		# variables read and written in all paths
+		self.read = set()
+		self.written = set()
+		self.collect_variables(trace.steps)
+
+	def emit(self, line):
+		self.lines.append('\t' * self.indentation + line)
+
+	def new_temporary(self):
+		self.temporaries += 1
+
+		return f't{self.temporaries}'
+
+	def constant(self, value):
+		"""Returns the name of value in the generated code."""
+
+		key = (type(value), id(value))
+
+		if key not in self.constant_names:
+			name = f'k{len(self.constant_names)}'
+			self.constant_names[key] = name
+			self.namespace[name] = value
+
+		return self.constant_names[key]
+
+	def literal(self, value):
+		"""Returns the stack entry of the constant value."""
+
+		if type(value) in (int, str) \
+				or type(value) == float and value - value == 0:
+			expression = repr(value)
+
+		else:
+			expression = self.constant(value)
+
+		return (expression, type(value), frozenset(), value)
+
+	def collect_variables(self, steps):
+		"""Collect the variables read and written by steps and their
+		branches."""
+
+		for _, instr, operand, _, branch in steps:
+			if instr in (OpCodes.LDV, OpCodes.LVI, OpCodes.AVI):
+				self.read.add(f'v{operand if instr == OpCodes.LDV else operand[0]}')
+
+			elif instr == OpCodes.LVV:
+				self.read |= {f'v{operand[0]}', f'v{operand[1]}'}
+
+			elif instr == OpCodes.IVI:
+				self.read.add(f'v{operand[0]}')
+				self.written.add(f'v{operand[0]}')
+
+			elif instr == OpCodes.LDG:
+				self.read.add(f'g{operand}')
+
+			elif instr == OpCodes.STO:
+				self.written.add(f'v{operand}')
+
+			elif instr == OpCodes.STG:
+				self.written.add(f'g{operand}')
+
+			if branch:
+				self.collect_variables(branch)
+
+	def push(self, state, expression, type_, variables=frozenset(),
+			constant=NOT_CONSTANT):
+		state.stack.append((expression, type_, variables, constant))
+
+	def push_variable(self, state, variable):
+		self.push(state, variable, state.types[variable], frozenset({variable}))
+
+	def spill(self, state, variable):
+		"""Evaluate the expressions in the stack that read variable,
+		before it is assigned."""
+
+		for position, entry in enumerate(state.stack):
+			expression, type_, variables, constant = entry
+
+			if variable in variables:
+				temporary = self.new_temporary()
+				self.emit(f'{temporary} = {expression}')
+				state.stack[position] = (temporary, type_, frozenset(), constant)
+
+	def simplify(self, state, position):
+		"""Evaluate the expression in the position of the stack in a
+		temporary, if it is not a name or a constant. Returns the
+		entry."""
+
+		expression, type_, variables, constant = state.stack[position]
+
+		if not expression.isidentifier() and constant is NOT_CONSTANT:
+			temporary = self.new_temporary()
+			self.emit(f'{temporary} = {expression}')
+			state.stack[position] = (temporary, type_, frozenset(), constant)
+
+		return state.stack[position]
+
+	def assign(self, state, variable, entry):
+		expression, type_ = entry[:2]
+		self.spill(state, variable)
+		self.emit(f'{variable} = {expression}')
+		state.types[variable] = type_
+
+	def emit_exit(self, state, pc, step=None):
+		"""Emit the exit to the interpreter at pc. The variables and the
+		stack are stored back in the VM."""
+
+		exit_ = len(self.exits)
+		self.exits.append((pc, step))
+
+		for variable in sorted(self.written):
+			if variable[0] == 'v':
+				self.emit(f'frame[{variable[1:]}] = {variable}')
+
+			else:
+				self.emit(f'globals_[{variable[1:]}] = {variable}')
+
+		if state.stack:
+			values = ''.join(f'{entry[0]}, ' for entry in state.stack)
+			self.emit(f'stack += ({values})')
+
+		self.emit(f'return {exit_}')
+
+	def emit_guard(self, condition, state, pc, step=None):
+		"""Emit a guard, that exits at pc if condition is true. If the
+		exit of step has a branch, the branch is compiled in place of
+		the exit."""
+
+		self.emit(f'if {condition}:')
+		self.indentation += 1
+
+		if step is not None and step[4]:
+			self.generate_steps(step[4], state.copy())
+
+		else:
+			self.emit_exit(state, pc, step if step is not None and step[4] is None else None)
+
+		self.indentation -= 1
+
+	def binary_operation(self, instr, a, b, condition=False):
+		"""Returns the expression and the type of the binary operation
+		instr with the stack entries a and b. If condition is True, the
+		comparisons result in a bool."""
+
+		a, type_a = a[0], a[1]
+		b, type_b = b[0], b[1]
+		operator = binary_operators[instr]
+
+		if type_a in NUMBERS and type_b in NUMBERS:
+			floats = float in (type_a, type_b)
+
+			if instr in (OpCodes.ADD, OpCodes.SUB, OpCodes.MUL):
+				return f'({a} {operator} {b})', float if floats else int
+
+			elif instr == OpCodes.DIV:
+				return f'({a} / {b})', float
+
+			elif instr in (OpCodes.XOR, OpCodes.BOR, OpCodes.BND) and not floats:
+				# the operations of bools result in a bool
+				type_ = bool if type_a is type_b is bool else int
+
+				return f'({a} {operator} {b})', type_
+
+			elif instr in (OpCodes.SHL, OpCodes.SHR) and not floats:
+				return f'({a} {operator} {b})', int
+
+		elif type_a is type_b is str:
+			if instr == OpCodes.ADD:
+				return f'({a} + {b})', str
+
+		if instr in comparisons and (
+				type_a in NUMBERS and type_b in NUMBERS
+				or type_a is type_b is str):
+			if condition or instr == OpCodes.NE:
+				return f'({a} {operator} {b})', bool
+
+			return f'(1 if {a} {operator} {b} else 0)', int
+
+		raise Unsupported(
+			f'{type_a.__name__} {operator} {type_b.__name__} is not compiled'
+		)
+
+	def generate_binary_operation(self, state, index, instr):
+		"""Emit the binary operation instr with the values in the top of
+		the stack."""
+
+		a, b = state.stack[-2:]
+		self.binary_operation(instr, a, b)
+
+		# the errors are shown by the interpreter, so the operand is
+		# checked before the operation
+		if instr == OpCodes.DIV and (b[3] is NOT_CONSTANT or b[3] == 0):
+			b = self.simplify(state, -1)
+			self.emit_guard(f'{b[0]} == 0', state, index)
+
+		elif instr in (OpCodes.SHL, OpCodes.SHR) \
+				and (b[3] is NOT_CONSTANT or b[3] < 0):
+			b = self.simplify(state, -1)
+			self.emit_guard(f'{b[0]} < 0', state, index)
+
+		expression, type_ = self.binary_operation(instr, a, b)
+
+		del state.stack[-2:]
+		self.push(state, expression, type_, a[2] | b[2])
+
+	def generate_jump(self, state, index, jumped, taken, address, step):
+		"""Emit a guard of a conditional jump to address, that is taken
+		if the condition taken is true, and was taken in the recording
+		if jumped is True."""
+
+		if jumped:
+			not_taken = taken[4:] if taken.startswith('not ') else f'not {taken}'
+			self.emit_guard(not_taken, state, index + 1, step)
+
+		else:
+			self.emit_guard(taken, state, address, step)
+
+	def end_iteration(self, state):
+		"""Emit the end of an iteration, that continues the loop if the
+		types of the variables are the types of the entry."""
+
+		if state.stack:
+			raise Unsupported('values in the stack at the end of an iteration')
+
+		for variable in sorted(self.read):
+			if state.types[variable] is not self.trace.types[variable]:
+				self.emit_exit(state, self.trace.header)
+				return
+
+		self.emit('continue')
+
+	def generate_steps(self, steps, state):
+		for step in steps:
+			self.generate_step(step, state)
+
+	def generate_step(self, step, state):
+		index, instr, operand, observed, _ = step
+		stack = state.stack
+
+		if instr in (OpCodes.LDI, OpCodes.LDF, OpCodes.LDS):
+			stack.append(self.literal(operand))
+
+		elif instr == OpCodes.LDN:
+			stack.append(self.literal(None))
+
+		elif instr == OpCodes.LDB:
+			stack.append(self.literal(built_in_variables[operand]))
+
+		elif instr == OpCodes.LDV:
+			self.push_variable(state, f'v{operand}')
+
+		elif instr == OpCodes.LDG:
+			self.push_variable(state, f'g{operand}')
+
+		elif instr == OpCodes.STO:
+			self.assign(state, f'v{operand}', stack.pop())
+
+		elif instr == OpCodes.STG:
+			self.assign(state, f'g{operand}', stack.pop())
+
+		elif instr == OpCodes.LVV:
+			self.push_variable(state, f'v{operand[0]}')
+			self.push_variable(state, f'v{operand[1]}')
+
+		elif instr == OpCodes.LVI:
+			self.push_variable(state, f'v{operand[0]}')
+			stack.append(self.literal(operand[1]))
+
+		elif instr in (OpCodes.IVI, OpCodes.AVI):
+			variable = f'v{operand[0]}'
+			a = (variable, state.types[variable], frozenset({variable}))
+			b = self.literal(operand[1])
+			expression, type_ = self.binary_operation(OpCodes.ADD, a, b)
+
+			if instr == OpCodes.IVI:
+				self.assign(state, variable, (expression, type_))
+
+			else:
+				self.push(state, expression, type_, a[2])
+
+		elif instr in binary_operators:
+			self.generate_binary_operation(state, index, instr)
+
+		elif instr == OpCodes.CJF:
+			comparison, address = operand
+			a, b = stack[-2:]
+			condition, _ = self.binary_operation(comparison, a, b, True)
+			del stack[-2:]
+
+			# the jump is taken if the comparison is false
+			self.generate_jump(state, index, observed, f'not {condition}', address, step)
+
+		elif instr in (OpCodes.JPT, OpCodes.JPF):
+			expression = stack.pop()[0]
+
+			# the int result of a comparison is not needed
+			if expression.startswith('(1 if ') and expression.endswith(' else 0)'):
+				expression = f'({expression[6:-8]})'
+			taken = expression if instr == OpCodes.JPT else f'not {expression}'
+			self.generate_jump(state, index, observed, taken, operand, step)
+
+			if observed and operand == self.trace.header:
+				self.end_iteration(state)
+
+		elif instr == OpCodes.JMP:
+			if operand == self.trace.header:
+				self.end_iteration(state)
+
+		elif instr == OpCodes.NOT:
+			expression, _, variables, _ = stack.pop()
+			self.push(state, f'(not {expression})', bool, variables)
+
+		elif instr in (OpCodes.NEG, OpCodes.BNT, OpCodes.INC, OpCodes.DEC):
+			expression, type_, variables, _ = stack.pop()
+
+			if type_ not in NUMBERS or instr == OpCodes.BNT and type_ is float:
+				raise Unsupported(f'{opcodes_as_string[instr].strip()} of {type_.__name__} is not compiled')
+
+			operation = {
+				OpCodes.NEG: '(-%s)',
+				OpCodes.BNT: '(~%s)',
+				OpCodes.INC: '(%s + 1)',
+				OpCodes.DEC: '(%s - 1)',
+			}[instr] %expression
+
+			self.push(state, operation, float if type_ is float else int, variables)
+
+		elif instr == OpCodes.NOP:
+			pass
+
+		elif instr == OpCodes.POP:
+			stack.pop()
+
+		elif instr == OpCodes.DUP:
+			stack.append(self.simplify(state, -1))
+
+		elif instr == OpCodes.WRT:
+			expression, type_, _, _ = stack.pop()
+
+			if type_ is type(None):
+				expression = "'nil'"
+
+			elif type_ is list:
+				raise Unsupported('write of list is not compiled')
+
+			self.emit(f"{self.constant(self.write)}(str({expression}) + '\\n')")
+
+		elif instr == OpCodes.LDL:
+			entries = stack[len(stack) - operand:]
+			del stack[len(stack) - operand:]
+
+			# the first value is the top of the stack
+			values = ''.join(f'{entry[0]}, ' for entry in reversed(entries))
+			variables = frozenset().union(*(entry[2] for entry in entries))
+			self.push(state, f'[{values}]', list, variables)
+
+		elif instr == OpCodes.GET:
+			list_ = self.simplify(state, -2)
+			index_ = self.simplify(state, -1)
+
+			if list_[1] is not list or index_[1] not in (int, bool):
+				raise Unsupported('get of values that are not list and int is not compiled')
+
+			# the error is shown by the interpreter
+			self.emit_guard(f'{index_[0]} > len({list_[0]}) - 1', state, index)
+
+			del stack[-2:]
+			temporary = self.new_temporary()
+			self.emit(f'{temporary} = {list_[0]}[{index_[0]}]')
+			self.push(state, temporary, observed)
+
+			# the values of lists have any type
+			self.emit_guard(
+				f'type({temporary}) is not {self.constant(observed)}',
+				state,
+				index + 1,
+			)
+
+		elif instr in (OpCodes.SET, OpCodes.APD, OpCodes.LPP, OpCodes.LEN, OpCodes.CPY):
+			list_ = stack.pop()
+
+			if list_[1] is not list:
+				raise Unsupported(f'{opcodes_as_string[instr].strip()} of {list_[1].__name__} is not compiled')
+
+			if instr == OpCodes.SET:
+				index_ = stack.pop()
+				value = stack.pop()
+				self.emit(f'{list_[0]}[{index_[0]}] = {value[0]}')
+
+			elif instr == OpCodes.APD:
+				value = stack.pop()
+				self.emit(f'{list_[0]}.append({value[0]})')
+
+			elif instr == OpCodes.LPP:
+				index_ = stack.pop()
+				self.emit(f'{list_[0]}.pop({index_[0]})')
+
+			# the list can change before the result is used
+			else:
+				temporary = self.new_temporary()
+				function = 'len' if instr == OpCodes.LEN else 'list.copy'
+				self.emit(f'{temporary} = {function}({list_[0]})')
+				self.push(state, temporary, int if instr == OpCodes.LEN else list)
+
+		elif instr == OpCodes.TYP:
+			_, type_, _, _ = stack.pop()
+			stack.append(self.literal(TYPE_NAMES.get(type_, type_.__name__)))
+
+		else:
+			raise Unsupported(f'{opcodes_as_string[instr].strip()} is not compiled')
+
+	def generate(self):
+		"""Returns the Python source of the trace, the names used by the
+		source, and the exits."""
+
+		self.indentation = 2
+		self.generate_steps(self.trace.steps, State(dict(self.trace.types), []))
+
+		body = self.lines
+		self.lines = []
+		self.indentation = 0
+
+		self.emit('def trace(frame, globals_, stack):')
+		self.indentation = 1
+
+		for variable in sorted(self.read | self.written):
+			if variable[0] == 'v':
+				self.emit(f'{variable} = frame[{variable[1:]}]')
+
+			else:
+				self.emit(f'{variable} = globals_[{variable[1:]}]')
+
+		guards = ' or '.join(
+			f'type({variable}) is not {self.constant(self.trace.types[variable])}'
+			for variable in sorted(self.read)
+		)
+
+		if guards:
+			self.emit(f'if {guards}:')
+			self.emit('\treturn 0')
+
+		self.emit('while True:')
+		self.lines += body
+
+		return '\n'.join(self.lines) + '\n', self.namespace, self.exits
+
+
+class Tracer:
+	def __init__(self, vm, threshold=DEFAULT_TRACE_THRESHOLD):
+		self.vm = vm
+		self.threshold = threshold
+
+		# loop header: number of backward jumps
+		self.counters = {}
+
+		# loop header: trace
+		self.traces = {}
+
+		# loop header: reason why it was not compiled
+		self.aborted = {}
+
+		# quickened instruction: generic instruction
+		self.generic_instructions = {
+			quickened_instr: instr
+			for instr, quickened in vm.quickened_instructions.items()
+			for quickened_instr in quickened.values()
+		}
+
+		# the backward jumps are counted only with the tracer
+		vm.handlers[OpCodes.JMP] = self.execute_jmp
+		vm.handlers[OpCodes.JPT] = self.execute_jpt
+
+	def execute_jmp(self, operand):
+		vm = self.vm
+
+		if operand < vm.pc:
+			back_edge = vm.pc - 1
+			vm.pc = operand
+			self.loop(operand, back_edge)
+
+		else:
+			vm.pc = operand
+
+	def execute_jpt(self, operand):
+		vm = self.vm
+
+		if vm.stack.pop():
+			if operand < vm.pc:
+				back_edge = vm.pc - 1
+				vm.pc = operand
+				self.loop(operand, back_edge)
+
+			else:
+				vm.pc = operand
+
+	def loop(self, header, back_edge):
+		"""The loop at header is starting a new iteration."""
+
+		trace = self.traces.get(header)
+
+		if trace is not None:
+			self.run(trace)
+			return
+
+		if header in self.aborted:
+			return
+
+		count = self.counters.get(header, 0) + 1
+		self.counters[header] = count
+
+		if count < self.threshold:
+			return
+
+		vm = self.vm
+		types = {f'v{slot}': type(value) for slot, value in enumerate(vm.frame)}
+		types.update(
+			(f'g{slot}', type(value)) for slot, value in enumerate(vm.globals)
+		)
+
+		try:
+			steps = self.record(header, back_edge)
+			trace = Trace(header, back_edge, types, steps)
+			self.compile(trace)
+
+		except Unsupported as unsupported:
+			self.aborted[header] = unsupported.args[0]
+			return
+
+		self.traces[header] = trace
+
+	def run(self, trace):
+		"""Run the trace, and record the branch of its exit if it is
+		hot."""
+
+		vm = self.vm
+		trace.entries += 1
+
+		exit_ = trace.function(vm.frame, vm.globals, vm.stack)
+		vm.pc, step = trace.exits[exit_]
+		trace.exit_counts[exit_] += 1
+		trace.exits_taken += 1
+
+		# the loop is not compiled for the current types
+		if exit_ == 0:
+			trace.failures += 1
+
+			if trace.failures == self.threshold:
+				del self.traces[trace.header]
+				self.aborted[trace.header] = 'the types of the variables change'
+
+			return
+
+		trace.failures = 0
+
+		if step is None or trace.exit_counts[exit_] < self.threshold \
+				or trace.branches == MAX_BRANCHES:
+			return
+
+		try:
+			step[4] = self.record(trace.header, trace.back_edge)
+			self.compile(trace)
+
+		except Unsupported:
+			step[4] = False
+			self.compile(trace)
+			return
+
+		trace.branches += 1
+
+	def record(self, header, back_edge):
+		"""Run the loop at header until its next iteration, and returns
+		the steps executed."""
+
+		vm = self.vm
+		instructions = vm.instructions
+		handlers = vm.handlers
+		steps = []
+
+		while True:
+			index = vm.pc
+
+			if not header <= index <= back_edge:
+				raise Unsupported('the path leaves the loop')
+
+			if len(steps) == MAX_TRACE_LENGTH:
+				raise Unsupported('the path is too long')
+
+			instr, operand = instructions[index]
+			generic_instr = self.generic_instructions.get(instr, instr)
+
+			if generic_instr not in supported_instructions:
+				raise Unsupported(
+					f'{opcodes_as_string[instr].strip()} is not compiled'
+				)
+
+			observed = None
+
+			if instr == OpCodes.JMP:
+				vm.pc = operand
+
+			elif instr in (OpCodes.JPT, OpCodes.JPF):
+				observed = bool(vm.stack.pop()) == (instr == OpCodes.JPT)
+				vm.pc = operand if observed else index + 1
+
+			else:
+				vm.pc = index + 1
+				handlers[instr](operand)
+
+				if generic_instr == OpCodes.CJF:
+					observed = vm.pc != index + 1
+
+				elif instr == OpCodes.GET:
+					observed = type(vm.stack[-1])
+
+			steps.append([index, generic_instr, operand, observed, None])
+
+			if vm.pc <= index:
+				if vm.pc != header:
+					raise Unsupported('inner loops are not compiled')
+
+				return steps
+
+	def compile(self, trace):
+		"""Compile the steps of the trace, with its branches."""
+
+		compiler = TraceCompiler(
+			trace,
+			self.generic_instructions,
+			self.vm.stdout.write,
+		)
+		source, namespace, exits = compiler.generate()
+
+		exec(compile(source, GENERATED_FILE_NAME, 'exec'), namespace)
+
+		trace.function = namespace['trace']
+		trace.source = source
+		trace.exits = exits
+		trace.exit_counts = [0] * len(exits)
+
+	def report(self):
+		"""Returns the report of the traces, as a list of lines."""
+
+		branches = sum(trace.branches for trace in self.traces.values())
+
+		lines = [
+			f'jit: threshold {self.threshold}, {len(self.traces)} trace(s)'
+				+ f' compiled, {branches} branch(es), {len(self.aborted)}'
+				+ ' loop(s) not compiled'
+		]
+
+		for header in sorted(set(self.traces) | set(self.aborted)):
+			file_name, line = self.vm.get_position(header)
+			position = f'{file_name}:%.2d: loop at {header}' %line
+
+			if header in self.traces:
+				trace = self.traces[header]
+				lines.append(
+					f'  {position}: {len(trace.steps)} instruction(s),'
+						+ f' {trace.branches} branch(es),'
+						+ f' entered {trace.entries} time(s),'
+						+ f' {trace.exits_taken} exit(s)'
+				)
+
+			else:
+				lines.append(f'  {position}: {self.aborted[header]}')
+
+		return lines
@@ -3,14 +3,37 @@
 
 # This VM is only temporary.
 
+import array
+import bisect
+import collections
+import copy
+import gc
+import itertools
+import operator
 import struct
 import sys
+import time
 
 from built_in import built_in_variables
-from code_generator import VM_SIGNATURE
-from opcodes import OpCodes
+from code_generator import BYTECODE_VERSION, VM_SIGNATURE
+from opcodes import OpCodes, OperandTypes, operands, operands_structs
+from output import Output
 
-MEMORY_SIZE = 1024
+INT32 = struct.Struct('!i')
+
+# address, file name and line
+LINE_TABLE_ENTRY = struct.Struct('!iii')
+
+# maximum number of results cached by each memoized function
+DEFAULT_MEMO_SIZE = 1024
+
+# types of the results cached by memoized functions. the other types
+# are mutable, and can not be shared by calls
+MEMOIZABLE_TYPES = {int, float, str, bool, type(None)}
+
+# dispatch engines
+DISPATCH_TABLE = 'table'    # each opcode goes to a handler through a table
+DISPATCH_SWITCH = 'switch'  # if/elif chain
 
 # errors
 ILLEGAL_OPERATION_ERROR = 'illegal operation: %s %s %s'
@@ -19,26 +42,649 @@ NEGATIVE_SHIFT_COUNT_ERROR = 'negative shift count'
 VALUE_IS_NOT_SUBSCRIPTABLE = '%s value is not subscriptable'
 INVALID_INDEX_ERROR = 'invalid index'
 LIST_INDEX_OUT_OF_RANGE_ERROR = 'list index out of range error'
+VALUE_IS_NOT_ITERABLE = '%s value is not iterable'
+VALUE_IS_NOT_A_LIST = '%s value is not a list'
+VALUE_IS_NOT_A_MAP = '%s value is not a map'
+INVALID_RANGE_ERROR = 'invalid range'
+INVALID_KEY_ERROR = 'invalid key'
+KEY_NOT_FOUND_ERROR = 'key not found'
+INVALID_FORMAT_ERROR = 'invalid format'
+ARRAY_LENGTHS_ERROR = 'arrays of different lengths'
+INVALID_ARRAY_VALUE_ERROR = 'invalid array value'
+INTEGER_OVERFLOW_ERROR = 'integer overflow'
+EMPTY_LIST_ERROR = 'empty list'
+VALUES_ARE_NOT_ARRAYS_ERROR = '%s and %s values are not arrays'
+
+# names of the types of lang that are not the names of their Python
+# types
+TYPE_NAMES = {dict: 'map', array.array: 'array'}
+
+# typecodes of the arrays of ints and floats
+INT_ARRAY = 'q'
+FLOAT_ARRAY = 'd'
+
+# types of the values of the arrays
+NUMBER_TYPES = (int, float)
+
+# element-wise operations of arrays: operation, and its operator
+ARRAY_OPERATIONS = {
+	OpCodes.AAD: (operator.add, '+'),
+	OpCodes.ASB: (operator.sub, '-'),
+	OpCodes.AML: (operator.mul, '*'),
+	OpCodes.ADV: (operator.truediv, '/'),
+}
+
+
+
+# opcodes with operands that are addresses or strings
+operands_to_resolve = {
+	opcode
+	for opcode, operand_types in operands.items()
+	if OperandTypes.ADDRESS in operand_types
+		or OperandTypes.STRING in operand_types
+}
+
+class Halt(Exception):
+	"""Raised by the halt instruction to stop the table dispatch
+	loop."""
+
+
+opcodes_as_string = {
+	OpCodes.HLT: 'halt   ',
+	OpCodes.LDI: 'iload  ',
+	OpCodes.LDF: 'fload  ',
+	OpCodes.LDS: 'sload  ',
+	OpCodes.STO: 'store  ',
+	OpCodes.LDV: 'vload  ',
+	OpCodes.JMP: 'jump   ',
+	OpCodes.JPT: 'jumpt  ',
+	OpCodes.JPF: 'jumpf  ',
+	OpCodes.CAL: 'call   ',
+	OpCodes.RET: 'ret    ',
+	OpCodes.LDN: 'nload  ',
+	OpCodes.NOP: 'nop    ',
+	OpCodes.WRT: 'write  ',
+	OpCodes.ADD: 'add    ',
+	OpCodes.SUB: 'sub    ',
+	OpCodes.MUL: 'mul    ',
+	OpCodes.DIV: 'div    ',
+	OpCodes.EQ:  'eq     ',
+	OpCodes.NE:  'ne     ',
+	OpCodes.LT:  'lt     ',
+	OpCodes.LE:  'le     ',
+	OpCodes.GT:  'gt     ',
+	OpCodes.GE:  'ge     ',
+	OpCodes.NOT: 'not    ',
+	OpCodes.AND: 'and    ',
+	OpCodes.OR:  'or     ',
+	OpCodes.NEG: 'neg    ',
+	OpCodes.DUP: 'dup    ',
+	OpCodes.INC: 'inc    ',
+	OpCodes.DEC: 'dec    ',
+	OpCodes.LDG: 'gload  ',
+	OpCodes.BNT: 'btw_not',
+	OpCodes.SHL: 'shl    ',
+	OpCodes.SHR: 'shr    ',
+	OpCodes.XOR: 'xor    ',
+	OpCodes.BOR: 'btw_or ',
+	OpCodes.BND: 'btw_and',
+	OpCodes.EXT: 'exit   ',
+	OpCodes.POP: 'pop    ',
+	OpCodes.LDL: 'lload  ',
+	OpCodes.GET: 'get    ',
+	OpCodes.APD: 'append ',
+	OpCodes.LPP: 'lpop   ',
+	OpCodes.LEN: 'length ',
+	OpCodes.CPY: 'copy   ',
+	OpCodes.TYP: 'type   ',
+	OpCodes.SET: 'set    ',
+	OpCodes.FOP: 'fopen  ',
+	OpCodes.FWT: 'fwrite ',
+	OpCodes.FRD: 'fread  ',
+	OpCodes.FCL: 'fclose ',
+	OpCodes.FRL: 'freadln',
+	OpCodes.STG: 'gstore ',
+	OpCodes.LDB: 'bload  ',
+	OpCodes.GBL: 'globals',
+	OpCodes.IVI: 'ivi    ',
+	OpCodes.AVI: 'avi    ',
+	OpCodes.CJF: 'cjf    ',
+	OpCodes.LVV: 'lvv    ',
+	OpCodes.LVI: 'lvi    ',
+	OpCodes.TCL: 'tcall  ',
+	OpCodes.MCL: 'mcall  ',
+	OpCodes.MRT: 'mret   ',
+	OpCodes.CLK: 'clock  ',
+	OpCodes.FLS: 'flush  ',
+	OpCodes.FRN: 'freadn ',
+	OpCodes.FRS: 'freadls',
+	OpCodes.FIT: 'flines ',
+	OpCodes.NXT: 'fnext  ',
+	OpCodes.RNG: 'range  ',
+	OpCodes.FIL: 'fill   ',
+	OpCodes.SLC: 'slice  ',
+	OpCodes.EXD: 'extend ',
+	OpCodes.IDX: 'indexof',
+	OpCodes.SUM: 'sum    ',
+	OpCodes.SRT: 'sort   ',
+	OpCodes.REV: 'reverse',
+	OpCodes.ITR: 'iter   ',
+	OpCodes.RGI: 'rangeit',
+	OpCodes.FOR: 'for    ',
+	OpCodes.MAP: 'map    ',
+	OpCodes.MGT: 'mget   ',
+	OpCodes.MPT: 'mput   ',
+	OpCodes.MHS: 'mhas   ',
+	OpCodes.MDL: 'mdelete',
+	OpCodes.KYS: 'keys   ',
+	OpCodes.JON: 'join   ',
+	OpCodes.BLD: 'builder',
+	OpCodes.BAP: 'bappend',
+	OpCodes.BFN: 'bfinish',
+	OpCodes.FMT: 'format ',
+	OpCodes.IAR: 'iarray ',
+	OpCodes.FAR: 'farray ',
+	OpCodes.AFL: 'afill  ',
+	OpCodes.AAD: 'aadd   ',
+	OpCodes.ASB: 'asub   ',
+	OpCodes.AML: 'amul   ',
+	OpCodes.ADV: 'adiv   ',
+	OpCodes.MIN: 'min    ',
+	OpCodes.MAX: 'max    ',
+	OpCodes.DOT: 'dot    ',
+	OpCodes.ADI: 'add_i  ',
+	OpCodes.SBI: 'sub_i  ',
+	OpCodes.MLI: 'mul_i  ',
+	OpCodes.DVI: 'div_i  ',
+	OpCodes.EQI: 'eq_i   ',
+	OpCodes.NEI: 'ne_i   ',
+	OpCodes.LTI: 'lt_i   ',
+	OpCodes.LEI: 'le_i   ',
+	OpCodes.GTI: 'gt_i   ',
+	OpCodes.GEI: 'ge_i   ',
+	OpCodes.ADF: 'add_f  ',
+	OpCodes.SBF: 'sub_f  ',
+	OpCodes.MLF: 'mul_f  ',
+	OpCodes.DVF: 'div_f  ',
+	OpCodes.EQF: 'eq_f   ',
+	OpCodes.NEF: 'ne_f   ',
+	OpCodes.LTF: 'lt_f   ',
+	OpCodes.LEF: 'le_f   ',
+	OpCodes.GTF: 'gt_f   ',
+	OpCodes.GEF: 'ge_f   ',
+	OpCodes.CJI: 'cjf_i  ',
+	OpCodes.CJD: 'cjf_f  ',
+}
+
+# operations of the quickened instructions. the types are known, so
+# they do not need the checks of the binary operations
+fast_operations = {
+	OpCodes.ADD: operator.add,
+	OpCodes.SUB: operator.sub,
+	OpCodes.MUL: operator.mul,
+	OpCodes.DIV: operator.truediv,
+	OpCodes.EQ: operator.eq,
+	OpCodes.NE: operator.ne,
+	OpCodes.LT: operator.lt,
+	OpCodes.LE: operator.le,
+	OpCodes.GT: operator.gt,
+	OpCodes.GE: operator.ge,
+}
+
+# comparisons that result in an int instead of a bool
+int_comparisons = {
+	OpCodes.EQ,
+	OpCodes.LT,
+	OpCodes.LE,
+	OpCodes.GT,
+	OpCodes.GE,
+}
+
+
+def get_type_name(value):
+	"""Returns the name of the type of value, shown by type and by the
+	errors."""
+
+	return TYPE_NAMES.get(type(value), type(value).__name__)
+
+
+def read_lines(file, n):
+	"""Returns a list of the next n lines of file, less at the end of
+	the file."""
+
+	lines = []
+
+	for _ in range(n):
+		line = file.readline()
+
+		if not line:
+			break
+
+		lines.append(line)
+
+	return lines
+
+
+class Panic(Exception):
+	"""Raised by the built in functions shared by the VM and the
+	Python runtime, with the message of the error."""
+
+
+def check_list(value):
+	"""Raise a panic if value is not a list or an array."""
+
+	if not isinstance(value, list) and not isinstance(value, array.array):
+		raise Panic(VALUE_IS_NOT_A_LIST %get_type_name(value))
+
+
+def range_list(n):
+	"""Returns the list of the ints from 0 to n."""
+
+	if type(n) is not int:
+		raise Panic(INVALID_RANGE_ERROR)
+
+	return list(range(n))
+
+
+def fill_list(n, value):
+	"""Returns a list of n values."""
+
+	if type(n) is not int:
+		raise Panic(INVALID_RANGE_ERROR)
+
+	return [value] * n
+
+
+def slice_list(list_, start, end):
+	"""Returns the values of list_, or the characters of a string,
+	from start to end."""
+
+	if not isinstance(list_, str):
+		check_list(list_)
+
+	if type(start) is not int or type(end) is not int:
+		raise Panic(INVALID_INDEX_ERROR)
+
+	return list_[start:end]
+
+
+def extend_list(list_, other):
+	"""Append the values of other to list_."""
+
+	check_list(list_)
+	check_list(other)
+
+	try:
+		list_.extend(other)
+
+	# values that are not numbers of the type of an array
+	except (TypeError, OverflowError):
+		raise Panic(INVALID_ARRAY_VALUE_ERROR)
+
+
+def index_of(list_, value):
+	"""Returns the index of the first value in list_, or of a text in
+	a string, or -1."""
+
+	if not isinstance(list_, str):
+		check_list(list_)
+
+	try:
+		return list_.index(value)
+
+	# a string has only strings
+	except (ValueError, TypeError):
+		return -1
+
+
+def sum_list(list_):
+	"""Returns the sum of the values of list_."""
+
+	check_list(list_)
+
+	try:
+		return sum(list_)
+
+	# add again to find the values that can not be added
+	except TypeError:
+		total = 0
+
+		for value in list_:
+			try:
+				total = total + value
+
+			except TypeError:
+				raise Panic(ILLEGAL_OPERATION_ERROR %(
+					get_type_name(total),
+					'+',
+					get_type_name(value),
+				))
+
+		return total
+
+
+def sort_list(list_):
+	"""Sort the values of list_."""
+
+	check_list(list_)
+
+	try:
+		if isinstance(list_, array.array):
+			list_[:] = array.array(list_.typecode, sorted(list_))
+
+		else:
+			list_.sort()
+
+	except TypeError:
+		raise Panic(get_comparison_error(list_, '<'))
+
+
+def get_comparison_error(list_, operator_):
+	"""Returns the error of the values of list_ that can not be
+	compared: the first value, and the first of another type."""
+
+	first = list_[0]
+	other = next(
+		(value for value in list_ if type(value) is not type(first)),
+		first,
+	)
+
+	return ILLEGAL_OPERATION_ERROR %(
+		get_type_name(first),
+		operator_,
+		get_type_name(other),
+	)
+
+
+def reverse_list(list_):
+	"""Reverse the values of list_."""
+
+	check_list(list_)
+	list_.reverse()
+
+
+def map_keys(map_):
+	"""Returns the list of the keys of map_."""
+
+	if not isinstance(map_, dict):
+		raise Panic(VALUE_IS_NOT_A_MAP %get_type_name(map_))
+
+	return list(map_)
+
+
+def to_string(value):
+	"""Returns the text of value, like write."""
+
+	return 'nil' if value is None else str(value)
+
+
+def join(list_, separator):
+	"""Returns the texts of the values of list_, separated by
+	separator."""
+
+	return separator.join(map(to_string, list_))
+
+
+def format_text(template, values):
+	"""Returns template with each {} replaced by the text of a value,
+	like write. Raises ValueError if the template has other braces, or
+	its {} are not as many as the values."""
+
+	if type(template) is not str \
+			or not isinstance(values, list) and not isinstance(values, array.array):
+		raise ValueError
+
+	parts = template.split('{}')
+
+	if len(parts) != len(values) + 1 \
+			or any('{' in part or '}' in part for part in parts):
+		raise ValueError
+
+	texts = [parts[0]]
+
+	for value, part in zip(values, parts[1:]):
+		texts.append(to_string(value))
+		texts.append(part)
+
+	return ''.join(texts)
+
+
+class StringBuilder:
+	"""Mutable string. The texts appended to it are joined only once,
+	when it is finished, instead of copying the string on each
+	concatenation."""
+
+	# mutable, like a list it can not be a key of a map, or of the
+	# results of a memoized function
+	__hash__ = None
+
+	def __init__(self):
+		self.parts = []
+
+	def append(self, value):
+		self.parts.append(to_string(value))
+
+	def finish(self):
+		"""Returns the text of the builder. It can still be appended
+		to."""
+
+		text = ''.join(self.parts)
+		self.parts = [text]
+
+		return text
+
+
+TYPE_NAMES[StringBuilder] = 'builder'
+
+
+def make_array(typecode, value):
+	"""Returns an array of typecode: of value zeros if value is an
+	int, or of the values of a list or array."""
+
+	if type(value) is int:
+		return array.array(typecode, [0]) * value
+
+	return array.array(typecode, value)
+
+
+def fill_array(array_, value):
+	"""Set all the values of array_ to value."""
+
+	array_[:] = array.array(array_.typecode, [value]) * len(array_)
+
+
+def get_typecode(value):
+	"""Returns the typecode of an array, or of an array of the number
+	value."""
+
+	if isinstance(value, array.array):
+		return value.typecode
+
+	return FLOAT_ARRAY if type(value) is float else INT_ARRAY
+
+
+def array_operation(operation, a, b):
+	"""Returns the array of operation applied to each value of a and
+	b, arrays of the same length, or an array and a number. The values
+	are computed by map, without running Python code for each one.
+	Raises IndexError if the arrays have different lengths, ValueError
+	if neither is an array, and TypeError if a value is not a
+	number."""
+
+	if isinstance(a, array.array):
+		if isinstance(b, array.array):
+			if len(a) != len(b):
+				raise IndexError
+
+			values = map(operation, a, b)
+
+		else:
+			values = map(operation, a, itertools.repeat(b, len(a)))
+
+	elif isinstance(b, array.array):
+		values = map(operation, itertools.repeat(a, len(b)), b)
+
+	else:
+		raise ValueError
+
+	# the division of ints is a float
+	if operation is operator.truediv \
+		or FLOAT_ARRAY in (get_typecode(a), get_typecode(b)):
+		return array.array(FLOAT_ARRAY, values)
+
+	return array.array(INT_ARRAY, values)
+
+
+def dot(a, b):
+	"""Returns the dot product of a and b, lists or arrays of
+	numbers."""
+
+	check_list(a)
+	check_list(b)
+
+	if len(a) != len(b):
+		raise Panic(ARRAY_LENGTHS_ERROR)
+
+	# the values of arrays are numbers. in Python, a string can be
+	# multiplied by an int
+	if not isinstance(a, array.array) or not isinstance(b, array.array):
+		for x, y in zip(a, b):
+			if type(x) not in NUMBER_TYPES or type(y) not in NUMBER_TYPES:
+				raise Panic(ILLEGAL_OPERATION_ERROR %(
+					get_type_name(x),
+					'*',
+					get_type_name(y),
+				))
+
+	return sum(map(operator.mul, a, b))
+
+
+def min_value(list_):
+	"""Returns the smallest value of list_."""
+
+	check_list(list_)
+
+	if not list_:
+		raise Panic(EMPTY_LIST_ERROR)
+
+	try:
+		return min(list_)
+
+	except TypeError:
+		raise Panic(get_comparison_error(list_, '<'))
+
+
+def max_value(list_):
+	"""Returns the biggest value of list_."""
+
+	check_list(list_)
+
+	if not list_:
+		raise Panic(EMPTY_LIST_ERROR)
+
+	try:
+		return max(list_)
+
+	except TypeError:
+		raise Panic(get_comparison_error(list_, '>'))
+
+
+class Stats:
+	"""Counters of a run, collected by VM.run_stats."""
+
+	def __init__(self):
+		# number of times each opcode has run
+		self.opcode_counts = [0] * 256
+
+		self.peak_stack_depth = 0
+		self.peak_call_depth = 0
+
+		# slots of the globals and of the frames of the calls being
+		# executed
+		self.slots = 0
+		self.peak_slots = 0
+
+		# function: number of calls
+		self.calls = {}
+
+		self.files_opened = 0
+
+	def as_dict(self):
+		"""Returns the counters as a dict, that can be saved as
+		JSON."""
+
+		return {
+			'instructions': sum(self.opcode_counts),
+			'opcodes': {
+				opcodes_as_string[instr].strip(): count
+				for instr, count in enumerate(self.opcode_counts)
+				if count
+			},
+			'peak_stack_depth': self.peak_stack_depth,
+			'peak_call_depth': self.peak_call_depth,
+			'peak_slots': self.peak_slots,
+			'calls': dict(sorted(self.calls.items())),
+			'files_opened': self.files_opened,
+		}
 
 
 class VM:
-	def __init__(self, code):
-		self.code = code
+	def __init__(self, code, dispatch=DISPATCH_TABLE,
+			memo_size=DEFAULT_MEMO_SIZE):
+		# code can be any bytes-like object, it is not copied
+		self.code = memoryview(code)
 		self.data = []
 
-		self.check_and_remove_signature()
-		self.get_data()
 		self.pc = 0
+
+		# list of (index of instruction, file name, line), sorted by
+		# index. the position of an instruction is given by the last
+		# entry before it
+		self.line_table = []
+
+		# list of (opcode, operand)
+		self.instructions = []
+
+		# a truncated or damaged file fails to be read
+		try:
+			self.check_and_remove_signature()
+			self.get_data()
+			self.get_line_table()
+			self.decode()
+
+			# the code ends with the exit of the entry point
+			if not self.instructions or self.instructions[-1][0] != OpCodes.EXT:
+				self.invalid_file_format()
+
+		except (struct.error, UnicodeDecodeError, IndexError, KeyError,
+				NotImplementedError):
+			self.invalid_file_format()
+
+		self.init_state(dispatch, memo_size)
+
+	def init_state(self, dispatch, memo_size):
+		"""Initialize the state of the execution."""
+
+		self.dispatch = dispatch
 		self.stack = []
-		self.call_stack = []
 
-		self.memory = [0] * MEMORY_SIZE
-		self.memory_table = [False] * MEMORY_SIZE
+		# each call pushes (function, return address, stack size, frame
+		# of caller), and the memoized calls also the cache and the key
+		# of the result, or None if it can not be cached
+		self.call_stack = []
 
-		self.variables = [{}]
+		# memoized function: results cached by the arguments, from the
+		# least to the most recently used
+		self.memo = {}
+		self.memo_size = memo_size
+		self.memo_hits = {}
+		self.memo_misses = {}
 
-		self.file_name = None
-		self.line = None
+		# the values of the variables are stored in slots, the globals
+		# in self.globals and the locals in self.frame, a list created
+		# for each call
+		self.globals = []
+		self.frame = []
 
 		self.binary_operations = {
 			OpCodes.ADD: lambda a, b: a + b,
@@ -91,81 +737,205 @@ class VM:
 			'stdin': sys.stdin,
 			'stderr': sys.stderr,
 		}
+
+		# the text written by write, and by fwrite in stdout and
+		# stderr, is buffered. id of file: output
+		self.stdout = Output(sys.stdout)
+		self.outputs = {id(sys.stdout): self.stdout}
+
+		for name in ('stdout', 'stderr'):
+			file = built_in_variables[name]
+
+			if id(file) not in self.outputs:
+				self.outputs[id(file)] = Output(file)
+
+		# instruction: {type of operands: quickened instruction}
+		self.quickened_instructions = {
+			OpCodes.ADD: {int: OpCodes.ADI, float: OpCodes.ADF},
+			OpCodes.SUB: {int: OpCodes.SBI, float: OpCodes.SBF},
+			OpCodes.MUL: {int: OpCodes.MLI, float: OpCodes.MLF},
+			OpCodes.DIV: {int: OpCodes.DVI, float: OpCodes.DVF},
+			OpCodes.EQ: {int: OpCodes.EQI, float: OpCodes.EQF},
+			OpCodes.NE: {int: OpCodes.NEI, float: OpCodes.NEF},
+			OpCodes.LT: {int: OpCodes.LTI, float: OpCodes.LTF},
+			OpCodes.LE: {int: OpCodes.LEI, float: OpCodes.LEF},
+			OpCodes.GT: {int: OpCodes.GTI, float: OpCodes.GTF},
+			OpCodes.GE: {int: OpCodes.GEI, float: OpCodes.GEF},
+			OpCodes.CJF: {int: OpCodes.CJI, float: OpCodes.CJD},
+		}
+
+		# index of the instructions that were quickened and have seen
+		# other types, they are not quickened again
+		self.generic_instructions = set()
+
+		self.handlers = self.get_handlers()
+
+		# counters of the run, only collected if enabled
+		self.stats = None
 	
 	def check_and_remove_signature(self):
-		if self.code[:len(VM_SIGNATURE)]:
-			self.code = self.code[len(VM_SIGNATURE):]
-
-		else:
-			print('invalid file format', file=sys.stderr)
-			exit(1)
+		"""Check the signature and the version of the code, that
+		follows it."""
 
-	def get_free_address(self):
-		address = 0
-		
-		while address < MEMORY_SIZE:
-			if self.memory_table[address] == False:
-				self.memory_table[address] = True
-				return address
+		if bytes(self.code[:len(VM_SIGNATURE)]) != VM_SIGNATURE:
+			self.invalid_file_format()
 
-			address += 1
+		self.pc = len(VM_SIGNATURE)
 
-		self.panic_error('memory overflow')
+		if self.get_int32() != BYTECODE_VERSION:
+			self.invalid_file_format()
 
-	def free(self, address):
-		self.memory_table[address] = False
+	def invalid_file_format(self):
+		print('invalid file format', file=sys.stderr)
+		exit(1)
 
 	def get_data(self):
-		while self.code[0] != 0:
-			current_data = ''
+		"""Read the data section: the number of strings, followed by
+		each string (length and UTF-8 bytes)."""
 
-			while self.code[0] != 0:
-				current_data += chr(self.code[0])
-				self.code.pop(0)
+		number_of_strings = self.get_int32()
 
-			self.code.pop(0)
+		for _ in range(number_of_strings):
+			length = self.get_int32()
+			data = str(self.code[self.pc:self.pc+length], 'utf-8')
+			self.pc += length
 
-			self.data.append(current_data)
-
-		self.code.pop(0)
+			self.data.append(data)
 	
-	def get_instruction(self):
-		self.pc += 1
-		return self.code[self.pc-1]
-
 	def get_int32(self):
-		byte1 = self.get_instruction()
-		byte2 = self.get_instruction()
-		byte3 = self.get_instruction()
-		byte4 = self.get_instruction()
-
-		return (byte1 * 256 * 256 * 256) \
-		     + (byte2 * 256 * 256      ) \
-		     + (byte3 * 256            ) \
-		     + (byte4                  )
-	
-	def get_float(self):
-		bytes_ = []
+		int32, = INT32.unpack_from(self.code, self.pc)
+		self.pc += INT32.size
+
+		return int32
+
+	def get_line_table(self):
+		"""Read the line table, that is before the code section."""
+
+		number_of_entries = self.get_int32()
+
+		for _ in range(number_of_entries):
+			address, file_name, line = LINE_TABLE_ENTRY.unpack_from(
+				self.code,
+				self.pc,
+			)
+
+			self.pc += LINE_TABLE_ENTRY.size
+			self.line_table.append((address, self.data[file_name], line))
+
+	def get_position(self, pc):
+		"""Returns the file name and line of the instruction at
+		pc."""
+
+		entry = bisect.bisect_right(self.line_table_indexes, pc) - 1
+		_, file_name, line = self.line_table[entry]
 
-		for byte in range(8):
-			bytes_.append(self.get_instruction())
+		return file_name, line
 
-		return struct.unpack('!d', bytes(bytes_))[0]
+	def decode(self):
+		"""Decode the code section in a list of (opcode, operand), so
+		the bytes are read only once. Instructions with more than one
+		operand have a tuple as operand, and instructions without
+		operands have None. The jump addresses are resolved to indexes
+		in the list of instructions."""
+
+		code = self.code
+		pc = code_start = self.pc
+		code_end = len(code)
+
+		instructions = self.instructions
+
+		# address of each instruction, used to resolve the addresses to
+		# indexes
+		addresses = []
+
+		# indexes of instructions with operands to resolve
+		to_resolve = []
+
+		# the garbage collector would scan the list of instructions many
+		# times while it grows, and it has no cycles
+		gc_was_enabled = gc.isenabled()
+		gc.disable()
+
+		try:
+			while pc < code_end:
+				addresses.append(pc - code_start)
+				opcode = code[pc]
+				pc += 1
+
+				operands_struct = operands_structs.get(opcode)
+
+				if operands_struct is None:
+					if opcode not in opcodes_as_string:
+						raise NotImplementedError(f'INSTRUCTION: {opcode}')
+
+					operand = None
+
+				else:
+					operand = operands_struct.unpack_from(code, pc)
+					pc += operands_struct.size
+
+					if opcode in operands_to_resolve:
+						to_resolve.append(len(instructions))
+
+					elif len(operand) == 1:
+						operand = operand[0]
+
+				instructions.append((opcode, operand))
+
+		finally:
+			if gc_was_enabled:
+				gc.enable()
+
+		addresses.append(pc - code_start)
+
+		def resolve(operand_type, value):
+			if operand_type == OperandTypes.ADDRESS:
+				return bisect.bisect_left(addresses, value)
+
+			elif operand_type == OperandTypes.STRING:
+				return self.data[value]
+
+			return value
+
+		# resolve addresses and strings, and unpack operands
+		for index in to_resolve:
+			opcode, operand = instructions[index]
+			operand_types = operands[opcode]
+
+			if len(operand) == 1:
+				operand = resolve(operand_types[0], operand[0])
+
+			else:
+				operand = tuple(map(resolve, operand_types, operand))
+
+			instructions[index] = (opcode, operand)
+
+		self.line_table = [
+			(bisect.bisect_left(addresses, address), file_name, line)
+			for address, file_name, line in self.line_table
+		]
+
+		# only for searching
+		self.line_table_indexes = [entry[0] for entry in self.line_table]
+
+		self.pc = 0
 
 	def panic_error(self, error):
 		"""Emit a panic error and exit."""
 
+		self.flush_outputs()
+
+		# the pc points to the next instruction
+		file_name, line = self.get_position(self.pc - 1)
+
 		print(
-			f'{self.file_name}:%.2d: panic: {error}' %self.line,
+			f'{file_name}:%.2d: panic: {error}' %line,
 			file=sys.stderr,
 		)
 
 		while self.call_stack:
-			self.call_stack.pop()  # sp
-			self.call_stack.pop()  # pc
-			line = self.call_stack.pop()
-			file_name = self.call_stack.pop()
-			function = self.call_stack.pop()
+			function, return_address, *_ = self.call_stack.pop()
+			file_name, line = self.get_position(return_address - 1)
 			print(f'  {file_name}:%.2d: call function {function}' %line)
 
 		exit(1)
@@ -179,6 +949,48 @@ class VM:
 		except (KeyboardInterrupt, EOFError):
 			exit(0)
 
+		finally:
+			self.flush_outputs()
+
+	def set_line_buffered(self):
+		"""Write each line of the outputs when it ends, for interactive
+		use."""
+
+		for output in self.outputs.values():
+			output.line_buffered = True
+
+	def redirect_stdout(self, file):
+		"""Write the text written to stdout, by write and fwrite, in
+		file."""
+
+		self.stdout = Output(file)
+		self.outputs[id(sys.stdout)] = self.stdout
+		self.outputs[id(built_in_variables['stdout'])] = self.stdout
+
+	def flush_outputs(self):
+		for output in self.outputs.values():
+			output.flush()
+
+	def write_file(self, file, text):
+		"""Write text in file, through its output if it is buffered."""
+
+		output = self.outputs.get(id(file))
+
+		if output is None:
+			file.write(text)
+
+		else:
+			output.write(text)
+
+	def read_file(self, file, read):
+		"""Returns the result of read, a method of file. The outputs
+		are flushed before reading stdin, so a prompt is shown."""
+
+		if file is built_in_variables['stdin']:
+			self.flush_outputs()
+
+		return read()
+
 	def get_list(self, number_of_values):
 		list_ = []
 
@@ -187,39 +999,138 @@ class VM:
 
 		return list_
 
+	def enable_stats(self):
+		"""Collect the counters of the run in self.stats. The run uses
+		its own dispatch loop, so the counters cost nothing when they
+		are not enabled."""
+
+		self.stats = Stats()
+
 	def run(self):
+		"""Runs with the selected dispatch engine."""
+
+		if self.stats is not None:
+			self.run_stats()
+
+		elif self.dispatch == DISPATCH_SWITCH:
+			self.run_switch()
+
+		else:
+			self.run_table()
+
+	def run_table(self):
+		"""Runs dispatching each instruction to its handler through a
+		table indexed by the opcode."""
+
+		instructions = self.instructions
+		handlers = self.handlers
+
+		try:
+			while True:
+				instr, operand = instructions[self.pc]
+				self.pc += 1
+				handlers[instr](operand)
+
+		except Halt:
+			pass
+
+	def run_stats(self):
+		"""Runs like run_table, collecting the counters of self.stats."""
+
+		instructions = self.instructions
+		handlers = self.handlers
+		stack = self.stack
+		call_stack = self.call_stack
+		stats = self.stats
+		opcode_counts = stats.opcode_counts
+		calls = stats.calls
+
+		try:
+			while True:
+				instr, operand = instructions[self.pc]
+				self.pc += 1
+				opcode_counts[instr] += 1
+
+				if instr in (OpCodes.CAL, OpCodes.MCL, OpCodes.TCL):
+					calls[operand[0]] = calls.get(operand[0], 0) + 1
+					depth = len(call_stack)
+					frame_size = len(self.frame)
+					handlers[instr](operand)
+
+					# the tail call replaces the frame of the caller
+					if instr == OpCodes.TCL:
+						stats.slots += len(self.frame) - frame_size
+
+					# the memoized calls with cached results do not
+					# create frames
+					elif len(call_stack) > depth:
+						stats.slots += len(self.frame)
+
+						if len(call_stack) > stats.peak_call_depth:
+							stats.peak_call_depth = len(call_stack)
+
+					if stats.slots > stats.peak_slots:
+						stats.peak_slots = stats.slots
+
+				elif instr in (OpCodes.RET, OpCodes.MRT):
+					stats.slots -= len(self.frame)
+					handlers[instr](operand)
+
+				elif instr == OpCodes.GBL:
+					handlers[instr](operand)
+					stats.slots += len(self.globals)
+
+				elif instr == OpCodes.FOP:
+					handlers[instr](operand)
+
+					if stack[-1] is not None:
+						stats.files_opened += 1
+
+				else:
+					handlers[instr](operand)
+
+				if len(stack) > stats.peak_stack_depth:
+					stats.peak_stack_depth = len(stack)
+
+		except Halt:
+			pass
+
+	def run_switch(self):
+		"""Runs dispatching each instruction through an if/elif
+		chain."""
+
 		while True:
-			instr = self.get_instruction()
+			instr, operand = self.instructions[self.pc]
+			self.pc += 1
 			
 			if instr == OpCodes.HLT:
+				self.flush_outputs()
 				break
 
-			elif instr == OpCodes.POS:
-				self.file_name = self.data[self.get_int32()]
-				self.line = self.get_int32()
-
-			elif instr == OpCodes.LDI:
-				self.stack.append(self.get_int32())
-
-			elif instr == OpCodes.LDF:
-				self.stack.append(self.get_float())
-
-			elif instr == OpCodes.LDS:
-				self.stack.append(self.data[self.get_int32()])
+			elif instr in (OpCodes.LDI, OpCodes.LDF, OpCodes.LDS):
+				self.stack.append(operand)
 
 			elif instr == OpCodes.LDL:
-				self.stack.append(self.get_list(self.get_int32()))
+				self.stack.append(self.get_list(operand))
 
 			elif instr == OpCodes.JMP:
-				self.pc = self.get_int32()
+				self.pc = operand
 
 			elif instr == OpCodes.JPT:
-				address = self.get_int32()
-				if self.stack.pop(): self.pc = address
+				if self.stack.pop(): self.pc = operand
 
 			elif instr == OpCodes.JPF:
-				address = self.get_int32()
-				if not self.stack.pop(): self.pc = address
+				if not self.stack.pop(): self.pc = operand
+
+			elif instr == OpCodes.FOR:
+				iterator, variable, address = operand
+
+				try:
+					self.frame[variable] = next(self.frame[iterator])
+					self.pc = address
+
+				except StopIteration:
+					pass
 
 			elif instr == OpCodes.LDN:
 				self.stack.append(None)
@@ -228,37 +1139,27 @@ class VM:
 				continue
 
 			elif instr == OpCodes.CAL:
-				self.variables.append(self.variables[-1].copy())
-				name = self.data[self.get_int32()]
-				address = self.get_int32()
-				self.call_stack.append(name)
-				self.call_stack.append(self.file_name)
-				self.call_stack.append(self.line)
-				self.call_stack.append(self.pc)
-				self.call_stack.append(len(self.stack))
+				name, address, frame_size, number_of_arguments = operand
+				sp = len(self.stack) - number_of_arguments
+				self.call_stack.append((
+					name,
+					self.pc,
+					sp,
+					self.frame,
+				))
+
+				# the arguments are in reverse order in the stack
+				self.frame = self.stack[sp:]
+				self.frame.reverse()
+				self.frame += [None] * (frame_size - number_of_arguments)
+				del self.stack[sp:]
+
 				self.pc = address
 
 			elif instr == OpCodes.RET:
-				for variable in self.variables[-1]:
-					self.free(self.variables[-1][variable])
-
-				self.variables.pop()
-		
-				# if the function no return
-				if not self.stack:
-					return_value = None
-
-				else:
-					return_value = self.stack.pop()
-
-				sp = self.call_stack.pop()
-				self.pc = self.call_stack.pop()
-				line = self.call_stack.pop()
-				file_name = self.call_stack.pop()
-				name = self.call_stack.pop()
-
-				while len(self.stack) > sp:
-					self.stack.pop()
+				_, self.pc, sp, self.frame = self.call_stack.pop()
+				return_value = self.stack.pop()
+				del self.stack[sp:]
 
 				self.stack.append(return_value)
 
@@ -268,37 +1169,39 @@ class VM:
 				if value is None:
 					value = 'nil'
 
-				print(value)
-
-			elif instr == OpCodes.LET:
-				name = self.get_int32()
-				self.variables[-1][name] = self.get_free_address()
+				self.stdout.write(f'{value}\n')
 
 			elif instr == OpCodes.STO:
-				name = self.get_int32()
-				value = self.stack.pop()
-				self.memory[self.variables[-1][name]] = value
+				self.frame[operand] = self.stack.pop()
 
 			elif instr == OpCodes.LDV:
-				name = self.get_int32()
+				self.stack.append(self.frame[operand])
 
-				if self.data[name] in built_in_variables:
-					self.stack.append(built_in_variables[self.data[name]])
-				else:
-					self.stack.append(self.memory[self.variables[-1][name]])
+			elif instr == OpCodes.STG:
+				self.globals[operand] = self.stack.pop()
+
+			elif instr == OpCodes.LDG:
+				self.stack.append(self.globals[operand])
+
+			elif instr == OpCodes.LDB:
+				self.stack.append(built_in_variables[operand])
+
+			elif instr == OpCodes.GBL:
+				self.globals = [None] * operand
 
 			elif instr in self.binary_operations:
 				b = self.stack.pop()
 				a = self.stack.pop()
 
-				# check if operation is valid
+				# check if operation is valid. the check is an addition,
+				# its result is the result of ADD
 				try:
-					a + b
+					value = a + b
 				except TypeError:
 					self.panic_error(ILLEGAL_OPERATION_ERROR %(
-						type(a).__name__,
+						get_type_name(a),
 						self.binary_operations_as_str[instr],
-						type(b).__name__,
+						get_type_name(b),
 					))
 
 				if instr == OpCodes.DIV and b == 0:
@@ -307,9 +1210,16 @@ class VM:
 				elif instr in (OpCodes.SHL, OpCodes.SHR) and b < 0:
 					self.panic_error(NEGATIVE_SHIFT_COUNT_ERROR)
 
-				self.stack.append(self.binary_operations[instr](a, b))
+				if instr != OpCodes.ADD:
+					value = self.binary_operations[instr](a, b)
 
-			elif instr in self.unary_operations:
+				self.stack.append(value)
+
+				if type(a) is type(b) \
+						and type(a) in self.quickened_instructions.get(instr, ()):
+					self.quicken(instr, operand, type(a))
+
+			elif instr in self.unary_operations:
 				a = self.stack.pop()
 				self.stack.append(self.unary_operations[instr](a))
 
@@ -323,6 +1233,7 @@ class VM:
 				self.stack[-1] -= 1
 
 			elif instr == OpCodes.EXT:
+				self.flush_outputs()
 				exit(self.stack.pop())
 
 			elif instr == OpCodes.POP:
@@ -332,9 +1243,13 @@ class VM:
 				index = self.stack.pop()
 				list_ = self.stack.pop()
 
-				if not isinstance(list_, list):
+				if not isinstance(list_, list) and not isinstance(list_, array.array):
+					if isinstance(list_, dict):
+						self.stack.append(self.get_map_value(list_, index))
+						continue
+
 					self.panic_error(VALUE_IS_NOT_SUBSCRIPTABLE %(
-						type(list_).__name__
+						get_type_name(list_)
 					))
 
 				if not isinstance(index, int):
@@ -348,7 +1263,12 @@ class VM:
 			elif instr == OpCodes.APD:
 				list_ = self.stack.pop()
 				value = self.stack.pop()
-				list_.append(value)
+
+				if isinstance(list_, array.array):
+					self.append_array_value(list_, value)
+
+				else:
+					list_.append(value)
 
 			elif instr == OpCodes.LPP:
 				list_ = self.stack.pop()
@@ -359,18 +1279,26 @@ class VM:
 				self.stack.append(len(self.stack.pop()))
 
 			elif instr == OpCodes.CPY:
-				self.stack.append(self.stack.pop().copy())
+				self.stack.append(copy.copy(self.stack.pop()))
 
 			elif instr == OpCodes.TYP:
 				value = self.stack.pop()
-				typ = type(value).__name__
+				typ = get_type_name(value)
 				self.stack.append(typ)
 
 			elif instr == OpCodes.SET:
 				list_ = self.stack.pop()
 				index = self.stack.pop()
 				value = self.stack.pop()
-				list_[index] = value
+
+				if isinstance(list_, dict):
+					self.set_map_value(list_, index, value)
+
+				elif isinstance(list_, array.array):
+					self.set_array_value(list_, index, value)
+
+				else:
+					list_[index] = value
 
 			elif instr == OpCodes.FOP:
 				file_name = self.stack.pop()
@@ -385,11 +1313,11 @@ class VM:
 			elif instr == OpCodes.FWT:
 				file = self.stack.pop()
 				text = self.stack.pop()
-				file.write(text)
+				self.write_file(file, text)
 
 			elif instr == OpCodes.FRD:
 				file = self.stack.pop()
-				self.stack.append(file.read())
+				self.stack.append(self.read_file(file, file.read))
 
 			elif instr == OpCodes.FCL:
 				file = self.stack.pop()
@@ -397,74 +1325,885 @@ class VM:
 
 			elif instr == OpCodes.FRL:
 				file = self.stack.pop()
-				self.stack.append(file.readline())
+				self.stack.append(self.read_file(file, file.readline))
 
 			else:
-				raise NotImplementedError(f'INSTRUCTION: {instr}')		
+				self.handlers[instr](operand)		
+
+	def get_handlers(self):
+		"""Returns a list of handlers indexed by opcode. Each handler
+		receives the operand of the instruction."""
+
+		handlers = {
+			OpCodes.HLT: self.execute_hlt,
+			OpCodes.LDI: self.execute_load_constant,
+			OpCodes.LDF: self.execute_load_constant,
+			OpCodes.LDS: self.execute_load_constant,
+			OpCodes.LDL: self.execute_ldl,
+			OpCodes.JMP: self.execute_jmp,
+			OpCodes.JPT: self.execute_jpt,
+			OpCodes.JPF: self.execute_jpf,
+			OpCodes.LDN: self.execute_ldn,
+			OpCodes.NOP: self.execute_nop,
+			OpCodes.CAL: self.execute_cal,
+			OpCodes.RET: self.execute_ret,
+			OpCodes.WRT: self.execute_wrt,
+			OpCodes.STO: self.execute_sto,
+			OpCodes.LDV: self.execute_ldv,
+			OpCodes.STG: self.execute_stg,
+			OpCodes.LDG: self.execute_ldg,
+			OpCodes.LDB: self.execute_ldb,
+			OpCodes.GBL: self.execute_gbl,
+			OpCodes.DUP: self.execute_dup,
+			OpCodes.INC: self.execute_inc,
+			OpCodes.DEC: self.execute_dec,
+			OpCodes.EXT: self.execute_ext,
+			OpCodes.POP: self.execute_pop,
+			OpCodes.GET: self.execute_get,
+			OpCodes.APD: self.execute_apd,
+			OpCodes.LPP: self.execute_lpp,
+			OpCodes.LEN: self.execute_len,
+			OpCodes.CPY: self.execute_cpy,
+			OpCodes.TYP: self.execute_typ,
+			OpCodes.SET: self.execute_set,
+			OpCodes.FOP: self.execute_fop,
+			OpCodes.FWT: self.execute_fwt,
+			OpCodes.FRD: self.execute_frd,
+			OpCodes.FCL: self.execute_fcl,
+			OpCodes.FRL: self.execute_frl,
+			OpCodes.IVI: self.execute_ivi,
+			OpCodes.AVI: self.execute_avi,
+			OpCodes.CJF: self.execute_cjf,
+			OpCodes.LVV: self.execute_lvv,
+			OpCodes.LVI: self.execute_lvi,
+			OpCodes.TCL: self.execute_tcl,
+			OpCodes.MCL: self.execute_mcl,
+			OpCodes.MRT: self.execute_mrt,
+			OpCodes.CLK: self.execute_clk,
+			OpCodes.FLS: self.execute_fls,
+			OpCodes.FRN: self.execute_frn,
+			OpCodes.FRS: self.execute_frs,
+			OpCodes.FIT: self.execute_fit,
+			OpCodes.NXT: self.execute_nxt,
+			OpCodes.RNG: self.execute_rng,
+			OpCodes.FIL: self.execute_fil,
+			OpCodes.SLC: self.execute_slc,
+			OpCodes.EXD: self.execute_exd,
+			OpCodes.IDX: self.execute_idx,
+			OpCodes.SUM: self.execute_sum,
+			OpCodes.SRT: self.execute_srt,
+			OpCodes.REV: self.execute_rev,
+			OpCodes.ITR: self.execute_itr,
+			OpCodes.RGI: self.execute_rgi,
+			OpCodes.FOR: self.execute_for,
+			OpCodes.MAP: self.execute_map,
+			OpCodes.MGT: self.execute_mgt,
+			OpCodes.MPT: self.execute_mpt,
+			OpCodes.MHS: self.execute_mhs,
+			OpCodes.MDL: self.execute_mdl,
+			OpCodes.KYS: self.execute_kys,
+			OpCodes.JON: self.execute_jon,
+			OpCodes.BLD: self.execute_bld,
+			OpCodes.BAP: self.execute_bap,
+			OpCodes.BFN: self.execute_bfn,
+			OpCodes.FMT: self.execute_fmt,
+			OpCodes.IAR: self.execute_iar,
+			OpCodes.FAR: self.execute_far,
+			OpCodes.AFL: self.execute_afl,
+			OpCodes.MIN: self.execute_min,
+			OpCodes.MAX: self.execute_max,
+			OpCodes.DOT: self.execute_dot,
+		}
+
+		for instr in self.binary_operations:
+			handlers[instr] = self.make_binary_operation(instr)
+
+		for instr in self.unary_operations:
+			handlers[instr] = self.make_unary_operation(instr)
+
+		for instr in ARRAY_OPERATIONS:
+			handlers[instr] = self.make_array_operation(instr)
+
+		for instr, quickened in self.quickened_instructions.items():
+			for type_, quickened_instr in quickened.items():
+				if instr == OpCodes.CJF:
+					handlers[quickened_instr] = \
+						self.make_quickened_compare_and_jump(type_)
+
+				else:
+					handlers[quickened_instr] = \
+						self.make_quickened_operation(instr, type_)
+
+		handlers_list = [None] * (max(handlers) + 1)
+
+		for instr, handler in handlers.items():
+			handlers_list[instr] = handler
+
+		return handlers_list
+
+	def make_binary_operation(self, instr):
+		"""Returns a handler for the binary operation instr."""
+
+		operation = self.binary_operations[instr]
+		quickened = self.quickened_instructions.get(instr, {})
+		stack = self.stack
+
+		# the check already adds the operands
+		is_addition = instr == OpCodes.ADD
+
+		def execute_binary_operation(operand):
+			b = stack.pop()
+			a = stack.pop()
+			value = self.check_binary_operation(instr, a, b)
+			stack.append(value if is_addition else operation(a, b))
+
+			if type(a) is type(b) and type(a) in quickened:
+				self.quicken(instr, operand, type(a))
+
+		return execute_binary_operation
+
+	def quicken(self, instr, operand, type_):
+		"""Rewrite the current instruction into its quickened version
+		for operands of type_."""
+
+		# the pc points to the next instruction
+		index = self.pc - 1
+
+		if index in self.generic_instructions:
+			return
+
+		self.instructions[index] = (
+			self.quickened_instructions[instr][type_],
+			operand,
+		)
+
+	def deoptimize(self, instr, operand):
+		"""Rewrite the current quickened instruction back into instr,
+		because the types of its operands have changed, and execute
+		it."""
+
+		index = self.pc - 1
+		self.instructions[index] = (instr, operand)
+		self.generic_instructions.add(index)
+
+		self.handlers[instr](operand)
+
+	def make_quickened_operation(self, instr, type_):
+		"""Returns a handler for the binary operation instr, for
+		operands of type_."""
+
+		operation = fast_operations[instr]
+		stack = self.stack
+
+		if instr in int_comparisons:
+			def execute_quickened_operation(operand):
+				b = stack[-1]
+				a = stack[-2]
+
+				if type(a) is not type_ or type(b) is not type_:
+					self.deoptimize(instr, operand)
+					return
+
+				del stack[-1]
+				stack[-1] = 1 if operation(a, b) else 0
+
+		else:
+			def execute_quickened_operation(operand):
+				b = stack[-1]
+				a = stack[-2]
+
+				if type(a) is not type_ or type(b) is not type_:
+					self.deoptimize(instr, operand)
+					return
+
+				del stack[-1]
+
+				try:
+					stack[-1] = operation(a, b)
+
+				except ZeroDivisionError:
+					self.panic_error(DIVISION_BY_ZERO_ERROR)
+
+		return execute_quickened_operation
+
+	def make_quickened_compare_and_jump(self, type_):
+		"""Returns a handler for the compare and jump false
+		instruction, for operands of type_."""
+
+		stack = self.stack
+
+		def execute_quickened_compare_and_jump(operand):
+			comparison, address = operand
+			b = stack[-1]
+			a = stack[-2]
+
+			if type(a) is not type_ or type(b) is not type_:
+				self.deoptimize(OpCodes.CJF, operand)
+				return
+
+			del stack[-2:]
+
+			if not fast_operations[comparison](a, b):
+				self.pc = address
+
+		return execute_quickened_compare_and_jump
+
+	def check_binary_operation(self, instr, a, b):
+		"""Emit a panic error if the binary operation instr is not
+		valid with a and b. Returns a + b, the operation is valid if the
+		addition is, so the result of ADD is not computed twice."""
+
+		try:
+			value = a + b
+		except TypeError:
+			self.panic_error(ILLEGAL_OPERATION_ERROR %(
+				get_type_name(a),
+				self.binary_operations_as_str[instr],
+				get_type_name(b),
+			))
+
+		if instr == OpCodes.DIV and b == 0:
+			self.panic_error(DIVISION_BY_ZERO_ERROR)
+
+		elif instr in (OpCodes.SHL, OpCodes.SHR) and b < 0:
+			self.panic_error(NEGATIVE_SHIFT_COUNT_ERROR)
+
+		return value
+
+	def make_unary_operation(self, instr):
+		"""Returns a handler for the unary operation instr."""
+
+		operation = self.unary_operations[instr]
+		stack = self.stack
+
+		def execute_unary_operation(operand):
+			stack.append(operation(stack.pop()))
+
+		return execute_unary_operation
+
+	def execute_hlt(self, operand):
+		self.flush_outputs()
+		raise Halt
+
+	def execute_load_constant(self, operand):
+		self.stack.append(operand)
+
+	def execute_ldl(self, operand):
+		self.stack.append(self.get_list(operand))
+
+	def execute_jmp(self, operand):
+		self.pc = operand
+
+	def execute_jpt(self, operand):
+		if self.stack.pop(): self.pc = operand
+
+	def execute_jpf(self, operand):
+		if not self.stack.pop(): self.pc = operand
+
+	def execute_ldn(self, operand):
+		self.stack.append(None)
+
+	def execute_nop(self, operand):
+		pass
+
+	def execute_cal(self, operand):
+		name, address, frame_size, number_of_arguments = operand
+		sp = len(self.stack) - number_of_arguments
+		self.call_stack.append((
+			name,
+			self.pc,
+			sp,
+			self.frame,
+		))
+
+		# the arguments are in reverse order in the stack
+		self.frame = self.stack[sp:]
+		self.frame.reverse()
+		self.frame += [None] * (frame_size - number_of_arguments)
+		del self.stack[sp:]
+
+		self.pc = address
+
+	def execute_tcl(self, operand):
+		name, address, frame_size, number_of_arguments = operand
+
+		# the called function returns to the caller of the current
+		# function, so its call is replaced
+		_, return_address, sp, caller_frame = self.call_stack[-1]
+		self.call_stack[-1] = (name, return_address, sp, caller_frame)
+
+		# the arguments are in reverse order in the stack
+		self.frame = self.stack[len(self.stack) - number_of_arguments:]
+		self.frame.reverse()
+		self.frame += [None] * (frame_size - number_of_arguments)
+		del self.stack[sp:]
+
+		self.pc = address
+
+	def execute_mcl(self, operand):
+		name, address, frame_size, number_of_arguments = operand
+		sp = len(self.stack) - number_of_arguments
+		arguments = self.stack[sp:]
+
+		if name not in self.memo:
+			self.memo[name] = collections.OrderedDict()
+			self.memo_hits[name] = 0
+			self.memo_misses[name] = 0
+
+		cache = self.memo[name]
+
+		# 1 == 1.0 == True, so the types are part of the key
+		key = (tuple(arguments), tuple(map(type, arguments)))
+
+		try:
+			value = cache[key]
+
+		except KeyError:
+			memo = (cache, key)
+
+		# lists can not be keys
+		except TypeError:
+			memo = None
+
+		else:
+			cache.move_to_end(key)
+			self.memo_hits[name] += 1
+
+			del self.stack[sp:]
+			self.stack.append(value)
+			return
+
+		self.memo_misses[name] += 1
+		self.call_stack.append((
+			name,
+			self.pc,
+			sp,
+			self.frame,
+			memo,
+		))
+
+		# the arguments are in reverse order in the stack
+		self.frame = arguments
+		self.frame.reverse()
+		self.frame += [None] * (frame_size - number_of_arguments)
+		del self.stack[sp:]
+
+		self.pc = address
+
+	def execute_mrt(self, operand):
+		_, self.pc, sp, self.frame, memo = self.call_stack.pop()
+		value = self.stack.pop()
+		del self.stack[sp:]
+
+		self.stack.append(value)
+
+		if memo is not None and type(value) in MEMOIZABLE_TYPES:
+			cache, key = memo
+			cache[key] = value
+
+			# remove the least recently used result
+			if len(cache) > self.memo_size:
+				cache.popitem(last=False)
+
+	def memo_report(self):
+		"""Returns the hits and misses of the memoized functions, as a
+		list of lines."""
+
+		return [
+			f'memo: {name}: {self.memo_hits[name]} hit(s),'
+				+ f' {self.memo_misses[name]} miss(es),'
+				+ f' {len(self.memo[name])} cached'
+			for name in sorted(self.memo)
+		]
+
+	def execute_ret(self, operand):
+		_, self.pc, sp, self.frame = self.call_stack.pop()
+		return_value = self.stack.pop()
+		del self.stack[sp:]
+
+		self.stack.append(return_value)
+
+	def execute_wrt(self, operand):
+		value = self.stack.pop()
+
+		if value is None:
+			value = 'nil'
+
+		self.stdout.write(f'{value}\n')
+
+	def execute_sto(self, operand):
+		self.frame[operand] = self.stack.pop()
+
+	def execute_ldv(self, operand):
+		self.stack.append(self.frame[operand])
+
+	def execute_stg(self, operand):
+		self.globals[operand] = self.stack.pop()
+
+	def execute_ldg(self, operand):
+		self.stack.append(self.globals[operand])
+
+	def execute_ldb(self, operand):
+		self.stack.append(built_in_variables[operand])
+
+	def execute_gbl(self, operand):
+		self.globals = [None] * operand
+
+	def execute_dup(self, operand):
+		self.stack.append(self.stack[-1])
+
+	def execute_inc(self, operand):
+		self.stack[-1] += 1
+
+	def execute_dec(self, operand):
+		self.stack[-1] -= 1
+
+	def execute_ext(self, operand):
+		self.flush_outputs()
+		exit(self.stack.pop())
+
+	def execute_pop(self, operand):
+		self.stack.pop()
+
+	def execute_get(self, operand):
+		index = self.stack.pop()
+		list_ = self.stack.pop()
+
+		if not isinstance(list_, list) and not isinstance(list_, array.array):
+			if isinstance(list_, dict):
+				self.stack.append(self.get_map_value(list_, index))
+				return
+
+			self.panic_error(VALUE_IS_NOT_SUBSCRIPTABLE %(
+				get_type_name(list_)
+			))
+
+		if not isinstance(index, int):
+			self.panic_error(INVALID_INDEX_ERROR)
+
+		if index > len(list_) - 1:
+			self.panic_error(LIST_INDEX_OUT_OF_RANGE_ERROR)
+
+		self.stack.append(list_[index])
+
+	def get_map_value(self, map_, key):
+		"""Returns the value of key in map_, for the index of a map."""
+
+		try:
+			return map_[key]
+
+		except KeyError:
+			self.panic_error(KEY_NOT_FOUND_ERROR)
+
+		# lists and maps can not be keys
+		except TypeError:
+			self.panic_error(INVALID_KEY_ERROR)
+
+	def set_map_value(self, map_, key, value):
+		"""Set the value of key in map_, by put or set."""
+
+		try:
+			map_[key] = value
+
+		except TypeError:
+			self.panic_error(INVALID_KEY_ERROR)
+
+	def execute_apd(self, operand):
+		list_ = self.stack.pop()
+		value = self.stack.pop()
+
+		if isinstance(list_, array.array):
+			self.append_array_value(list_, value)
+
+		else:
+			list_.append(value)
+
+	def execute_lpp(self, operand):
+		list_ = self.stack.pop()
+		index = self.stack.pop()
+		list_.pop(index)
+
+	def execute_len(self, operand):
+		self.stack.append(len(self.stack.pop()))
+
+	def execute_cpy(self, operand):
+		self.stack.append(copy.copy(self.stack.pop()))
+
+	def execute_typ(self, operand):
+		value = self.stack.pop()
+		self.stack.append(get_type_name(value))
+
+	def execute_set(self, operand):
+		list_ = self.stack.pop()
+		index = self.stack.pop()
+		value = self.stack.pop()
+
+		if isinstance(list_, dict):
+			self.set_map_value(list_, index, value)
+
+		elif isinstance(list_, array.array):
+			self.set_array_value(list_, index, value)
+
+		else:
+			list_[index] = value
+
+	def execute_fop(self, operand):
+		file_name = self.stack.pop()
+		open_type = self.stack.pop()
+
+		try:
+			self.stack.append(open(file_name, open_type))
+
+		except FileNotFoundError:
+			self.stack.append(None)
+
+	def execute_fwt(self, operand):
+		file = self.stack.pop()
+		text = self.stack.pop()
+		self.write_file(file, text)
+
+	def execute_frd(self, operand):
+		file = self.stack.pop()
+		self.stack.append(self.read_file(file, file.read))
+
+	def execute_fcl(self, operand):
+		file = self.stack.pop()
+		file.close()
+
+	def execute_frl(self, operand):
+		file = self.stack.pop()
+		self.stack.append(self.read_file(file, file.readline))
+
+	def execute_clk(self, operand):
+		self.stack.append(time.perf_counter())
+
+	def execute_fls(self, operand):
+		file = self.stack.pop()
+		self.outputs.get(id(file), file).flush()
+
+	def execute_frn(self, operand):
+		file = self.stack.pop()
+		n = self.stack.pop()
+		self.stack.append(self.read_file(file, lambda: file.read(n)))
+
+	def execute_frs(self, operand):
+		file = self.stack.pop()
+		n = self.stack.pop()
+		self.stack.append(
+			self.read_file(file, lambda: read_lines(file, n))
+		)
+
+	def execute_fit(self, operand):
+		file = self.stack.pop()
+
+		# the lines are read when next is called, until the end of the
+		# file, where readline returns ''
+		self.stack.append(
+			iter(lambda: self.read_file(file, file.readline), '')
+		)
+
+	def execute_nxt(self, operand):
+		# '' at the end, like freadln
+		self.stack.append(next(self.stack.pop(), ''))
+
+	def call_built_in(self, function, *arguments):
+		"""Returns function(*arguments), a built in function shared
+		with the Python runtime, showing its panic as an error."""
+
+		try:
+			return function(*arguments)
+
+		except Panic as panic:
+			self.panic_error(panic.args[0])
+
+	def execute_rng(self, operand):
+		self.stack.append(self.call_built_in(range_list, self.stack.pop()))
+
+	def execute_fil(self, operand):
+		n = self.stack.pop()
+		value = self.stack.pop()
+		self.stack.append(self.call_built_in(fill_list, n, value))
+
+	def execute_slc(self, operand):
+		list_ = self.stack.pop()
+		start = self.stack.pop()
+		end = self.stack.pop()
+		self.stack.append(self.call_built_in(slice_list, list_, start, end))
+
+	def execute_exd(self, operand):
+		list_ = self.stack.pop()
+		other = self.stack.pop()
+		self.call_built_in(extend_list, list_, other)
+
+	def execute_idx(self, operand):
+		list_ = self.stack.pop()
+		value = self.stack.pop()
+		self.stack.append(self.call_built_in(index_of, list_, value))
+
+	def execute_sum(self, operand):
+		self.stack.append(self.call_built_in(sum_list, self.stack.pop()))
+
+	def execute_srt(self, operand):
+		self.call_built_in(sort_list, self.stack.pop())
+
+	def execute_rev(self, operand):
+		self.call_built_in(reverse_list, self.stack.pop())
+
+	def make_iterator(self, value):
+		"""Returns the iterator of a for loop over value: from 0 to an
+		int, the values of a list, or the keys of a map."""
+
+		if type(value) is int:
+			return iter(range(value))
+
+		# the keys when the loop starts, the map can be changed by the
+		# loop
+		if type(value) is dict:
+			return iter(list(value))
+
+		try:
+			return iter(value)
+
+		except TypeError:
+			self.panic_error(VALUE_IS_NOT_ITERABLE %get_type_name(value))
+
+	def make_range_iterator(self, start, end):
+		"""Returns the iterator of a for loop from start to end."""
+
+		if type(start) is not int or type(end) is not int:
+			self.panic_error(INVALID_RANGE_ERROR)
+
+		return iter(range(start, end))
+
+	def execute_itr(self, operand):
+		self.frame[operand] = self.make_iterator(self.stack.pop())
+
+	def execute_rgi(self, operand):
+		end = self.stack.pop()
+		start = self.stack.pop()
+		self.frame[operand] = self.make_range_iterator(start, end)
+
+	def execute_for(self, operand):
+		iterator, variable, address = operand
+		frame = self.frame
+
+		# the next value, or the end of the loop
+		try:
+			frame[variable] = next(frame[iterator])
+			self.pc = address
+
+		except StopIteration:
+			pass
+
+	def execute_map(self, operand):
+		self.stack.append({})
+
+	def execute_mgt(self, operand):
+		map_ = self.stack.pop()
+		key = self.stack.pop()
+
+		# nil if the key is not in the map
+		try:
+			self.stack.append(map_.get(key))
+
+		except TypeError:
+			self.panic_error(INVALID_KEY_ERROR)
+
+	def execute_mpt(self, operand):
+		map_ = self.stack.pop()
+		key = self.stack.pop()
+		value = self.stack.pop()
+		self.set_map_value(map_, key, value)
+
+	def execute_mhs(self, operand):
+		map_ = self.stack.pop()
+		key = self.stack.pop()
+
+		try:
+			self.stack.append(1 if key in map_ else 0)
+
+		except TypeError:
+			self.panic_error(INVALID_KEY_ERROR)
+
+	def execute_mdl(self, operand):
+		map_ = self.stack.pop()
+		key = self.stack.pop()
+
+		try:
+			map_.pop(key, None)
+
+		except TypeError:
+			self.panic_error(INVALID_KEY_ERROR)
+
+	def execute_kys(self, operand):
+		self.stack.append(self.call_built_in(map_keys, self.stack.pop()))
+
+	def execute_jon(self, operand):
+		list_ = self.stack.pop()
+		separator = self.stack.pop()
+		self.stack.append(join(list_, separator))
+
+	def execute_bld(self, operand):
+		self.stack.append(StringBuilder())
+
+	def execute_bap(self, operand):
+		builder = self.stack.pop()
+		builder.append(self.stack.pop())
+
+	def execute_bfn(self, operand):
+		self.stack.append(self.stack.pop().finish())
+
+	def execute_fmt(self, operand):
+		template = self.stack.pop()
+		values = self.stack.pop()
+
+		try:
+			self.stack.append(format_text(template, values))
+
+		except ValueError:
+			self.panic_error(INVALID_FORMAT_ERROR)
+
+	def execute_iar(self, operand):
+		self.stack.append(self.make_array(INT_ARRAY, self.stack.pop()))
+
+	def execute_far(self, operand):
+		self.stack.append(self.make_array(FLOAT_ARRAY, self.stack.pop()))
+
+	def make_array(self, typecode, value):
+		"""Returns a new array of typecode, see make_array."""
+
+		try:
+			return make_array(typecode, value)
+
+		except (TypeError, OverflowError):
+			self.panic_error(INVALID_ARRAY_VALUE_ERROR)
+
+	def set_array_value(self, array_, index, value):
+		"""Set the value at index of array_, by set."""
+
+		try:
+			array_[index] = value
+
+		# a value that is not a number of the type of the array
+		except (TypeError, OverflowError):
+			self.panic_error(INVALID_ARRAY_VALUE_ERROR)
+
+	def append_array_value(self, array_, value):
+		"""Append value to array_, by append."""
+
+		try:
+			array_.append(value)
+
+		except (TypeError, OverflowError):
+			self.panic_error(INVALID_ARRAY_VALUE_ERROR)
+
+	def execute_afl(self, operand):
+		array_ = self.stack.pop()
+		value = self.stack.pop()
+
+		try:
+			fill_array(array_, value)
+
+		except (TypeError, OverflowError):
+			self.panic_error(INVALID_ARRAY_VALUE_ERROR)
+
+	def make_array_operation(self, instr):
+		"""Returns a handler for the element-wise operation instr."""
+
+		operation, operator_ = ARRAY_OPERATIONS[instr]
+		stack = self.stack
+
+		def execute_array_operation(operand):
+			a = stack.pop()
+			b = stack.pop()
+
+			try:
+				stack.append(array_operation(operation, a, b))
+
+			except IndexError:
+				self.panic_error(ARRAY_LENGTHS_ERROR)
+
+			except ValueError:
+				self.panic_error(VALUES_ARE_NOT_ARRAYS_ERROR %(
+					get_type_name(a),
+					get_type_name(b),
+				))
+
+			except ZeroDivisionError:
+				self.panic_error(DIVISION_BY_ZERO_ERROR)
+
+			except OverflowError:
+				self.panic_error(INTEGER_OVERFLOW_ERROR)
+
+			except TypeError:
+				self.panic_error(ILLEGAL_OPERATION_ERROR %(
+					get_type_name(a),
+					operator_,
+					get_type_name(b),
+				))
+
+		return execute_array_operation
+
+	def execute_min(self, operand):
+		self.stack.append(self.call_built_in(min_value, self.stack.pop()))
+
+	def execute_max(self, operand):
+		self.stack.append(self.call_built_in(max_value, self.stack.pop()))
+
+	def execute_dot(self, operand):
+		a = self.stack.pop()
+		b = self.stack.pop()
+		self.stack.append(self.call_built_in(dot, a, b))
+
+	def execute_ivi(self, operand):
+		slot, value = operand
+		a = self.frame[slot]
+
+		if type(a) is int:
+			self.frame[slot] = a + value
+
+		else:
+			self.frame[slot] = self.check_binary_operation(OpCodes.ADD, a, value)
+
+	def execute_avi(self, operand):
+		slot, value = operand
+		a = self.frame[slot]
+
+		if type(a) is int:
+			self.stack.append(a + value)
+
+		else:
+			self.stack.append(self.check_binary_operation(OpCodes.ADD, a, value))
+
+	def execute_cjf(self, operand):
+		comparison, address = operand
+		b = self.stack.pop()
+		a = self.stack.pop()
+		self.check_binary_operation(comparison, a, b)
+
+		if type(a) is type(b) and type(a) in (int, float):
+			self.quicken(OpCodes.CJF, operand, type(a))
+
+		if not self.binary_operations[comparison](a, b):
+			self.pc = address
+
+	def execute_lvv(self, operand):
+		slot_a, slot_b = operand
+		self.stack.append(self.frame[slot_a])
+		self.stack.append(self.frame[slot_b])
+
+	def execute_lvi(self, operand):
+		slot, value = operand
+		self.stack.append(self.frame[slot])
+		self.stack.append(value)
 
 	def disassemble(self):
-		opcodes_as_string = {
-			OpCodes.HLT: 'halt   ',
-			OpCodes.LDI: 'iload  ',
-			OpCodes.LDF: 'fload  ',
-			OpCodes.LDS: 'sload  ',
-			OpCodes.STO: 'store  ',
-			OpCodes.LDV: 'vload  ',
-			OpCodes.JMP: 'jump   ',
-			OpCodes.JPT: 'jumpt  ',
-			OpCodes.JPF: 'jumpf  ',
-			OpCodes.CAL: 'call   ',
-			OpCodes.RET: 'ret    ',
-			OpCodes.LDN: 'nload  ',
-			OpCodes.NOP: 'nop    ',
-			OpCodes.WRT: 'write  ',
-			OpCodes.ADD: 'add    ',
-			OpCodes.SUB: 'sub    ',
-			OpCodes.MUL: 'mul    ',
-			OpCodes.DIV: 'div    ',
-			OpCodes.EQ:  'eq     ',
-			OpCodes.NE:  'ne     ',
-			OpCodes.LT:  'lt     ',
-			OpCodes.LE:  'le     ',
-			OpCodes.GT:  'gt     ',
-			OpCodes.GE:  'ge     ',
-			OpCodes.NOT: 'not    ',
-			OpCodes.AND: 'and    ',
-			OpCodes.OR:  'or     ',
-			OpCodes.NEG: 'neg    ',
-			OpCodes.DUP: 'dup    ',
-			OpCodes.INC: 'inc    ',
-			OpCodes.DEC: 'dec    ',
-			OpCodes.LET: 'let    ',
-			OpCodes.BNT: 'btw_not',
-			OpCodes.SHL: 'shl    ',
-			OpCodes.SHR: 'shr    ',
-			OpCodes.XOR: 'xor    ',
-			OpCodes.BOR: 'btw_or ',
-			OpCodes.BND: 'btw_and',
-			OpCodes.EXT: 'exit   ',
-			OpCodes.POP: 'pop    ',
-			OpCodes.LDL: 'lload  ',
-			OpCodes.GET: 'get    ',
-			OpCodes.APD: 'append ',
-			OpCodes.LPP: 'lpop   ',
-			OpCodes.LEN: 'length ',
-			OpCodes.CPY: 'copy   ',
-			OpCodes.TYP: 'type   ',
-			OpCodes.SET: 'set    ',
-			OpCodes.FOP: 'fopen  ',
-			OpCodes.FWT: 'fwrite ',
-			OpCodes.FRD: 'fread  ',
-			OpCodes.FCL: 'fclose ',
-			OpCodes.FRL: 'freadln',
-			OpCodes.POS: 'pos    ',
+		line_table = {
+			index: (file_name, line)
+			for index, file_name, line in self.line_table
 		}
-	
-		while self.pc < len(self.code):
-			instr = self.get_instruction()
-
-			pc = self.pc - 1  # pc points to next instr
 
+		for pc, (instr, operand) in enumerate(self.instructions):
 			if pc < 10:
 				pc_as_str = f'  {pc}'
 
@@ -474,44 +2213,55 @@ class VM:
 			else:
 				pc_as_str = f'{pc}'
 
-			if instr == OpCodes.POS:
-				self.file_name = self.data[self.get_int32()]
-				self.line = self.get_int32()
-				print(f'\033[1;32m{self.file_name}:%.2d:\033[0;0m' %self.line)
-				continue
+			# the instruction starts a new position
+			if pc in line_table:
+				file_name, line = line_table[pc]
+				print(f'\033[1;32m{file_name}:%.2d:\033[0;0m' %line)
 
-			else:
-				print(f'  {pc_as_str}: {opcodes_as_string[instr]} ', end='')
+			print(f'  {pc_as_str}: {opcodes_as_string[instr]} ', end='')
 
 			if instr in (
 					OpCodes.LDI,
 					OpCodes.JMP,
 					OpCodes.JPT,
 					OpCodes.JPF,
+					OpCodes.LDF,
+					OpCodes.LDL,
+					OpCodes.STO,
+					OpCodes.LDV,
+					OpCodes.STG,
+					OpCodes.LDG,
+					OpCodes.LDB,
+					OpCodes.GBL,
+					OpCodes.ITR,
+					OpCodes.RGI,
 				):
 
-				print(self.get_int32())
+				print(operand)
 
 			elif instr == OpCodes.LDS:
-				string = self.data[self.get_int32()]
+				string = operand
 				string = string.replace('\n', '\\n')
 				string = string.replace('\r', '\\r')
 				print('"' + string + '"')
 
-			elif instr == OpCodes.CAL:
-				name = self.data[self.get_int32()]
-				address = self.get_int32()
-				print(f'{name} // address {address}')
+			elif instr in (
+					OpCodes.IVI,
+					OpCodes.AVI,
+					OpCodes.LVV,
+					OpCodes.LVI,
+					OpCodes.FOR,
+				):
 
-			elif instr == OpCodes.LDF:
-				print(self.get_float())
+				print(*operand)
 
-			elif instr == OpCodes.LDL:
-				print(self.get_int32())
+			elif instr == OpCodes.CJF:
+				comparison, address = operand
+				print(self.binary_operations_as_str[comparison], address)
 
-			elif instr in (OpCodes.STO, OpCodes.LDV, OpCodes.LET):
-				print(self.data[self.get_int32()])
+			elif instr in (OpCodes.CAL, OpCodes.TCL, OpCodes.MCL):
+				name, address, frame_size, _ = operand
+				print(f'{name} // address {address}, {frame_size} slot(s)')
 
 			else:
 				print()
-
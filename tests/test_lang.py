@@ -0,0 +1,172 @@
+# Lang Compiler
+# Author: Jonas
+
+# Tests of lang programs, run by lang.py with each backend. The
+# backends must have the same output.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+LANG = os.path.join(
+	os.path.dirname(os.path.abspath(__file__)),
+	'..',
+	'src',
+	'lang.py',
+)
+
+# flags of run of each backend
+BACKENDS = [
+	[],
+	['--dispatch=switch'],
+	['--backend=reg'],
+	['--backend=py'],
+	['--no-optimize'],
+]
+
+
+def run(tmp_path, source, flags):
+	"""Returns the output and the errors of the program source."""
+
+	file_name = tmp_path / 'test.lang'
+	file_name.write_text(source + '\n')
+
+	process = subprocess.run(
+		[sys.executable, LANG, 'run', '--no-cache', *flags, str(file_name)],
+		capture_output=True,
+		text=True,
+		cwd=tmp_path,
+	)
+
+	return process.stdout, process.stderr
+
+
+@pytest.fixture(params=BACKENDS, ids=lambda flags: ' '.join(flags) or 'stack')
+def flags(request):
+	return request.param
+
+
+def test_if_nil_is_false(tmp_path, flags):
+	source = 'fn main() { if (nil) write(1); else write(2); }'
+	assert run(tmp_path, source, flags) == ('2\n', '')
+
+
+def test_while_nil_is_false(tmp_path, flags):
+	source = 'fn main() { while (nil) { write(1); } write(2); }'
+	assert run(tmp_path, source, flags) == ('2\n', '')
+
+
+def test_operation_with_nil_is_not_folded(tmp_path, flags):
+	_, errors = run(tmp_path, 'fn main() { write(nil == "nil"); }', flags)
+	assert 'panic: illegal operation' in errors
+
+	_, errors = run(tmp_path, 'fn main() { write("a" + nil); }', flags)
+	assert 'panic: illegal operation' in errors
+
+
+def test_values_are_evaluated_from_the_last(tmp_path, flags):
+	source = '''
+let g = 0;
+
+fn inc() {
+	g = g + 1;
+	return 0;
+}
+
+fn main() {
+	write([g, inc()]);
+}
+'''
+
+	assert run(tmp_path, source, flags) == ('[1, 0]\n', '')
+
+
+def test_format(tmp_path, flags):
+	source = 'fn main() { write(format("{} + {} = {}", [1, 2.5, nil])); }'
+	assert run(tmp_path, source, flags) == ('1 + 2.5 = nil\n', '')
+
+
+@pytest.mark.parametrize('template, values', [
+	('{0}', '[1]'),
+	('{0.__class__}', '[1]'),
+	('{x}', '[1]'),
+	('{!r}', '[1]'),
+	('{:>4}', '[1]'),
+	('{}', '[]'),
+	('{}', '[1, 2]'),
+	('{', '[]'),
+])
+def test_invalid_format(tmp_path, flags, template, values):
+	source = f'fn main() {{ write(format("{template}", {values})); }}'
+	_, errors = run(tmp_path, source, flags)
+	assert 'panic: invalid format' in errors
+
+
+@pytest.mark.parametrize('call, error', [
+	('sum(["a"])', 'illegal operation: int + str'),
+	('sum(5)', 'int value is not a list'),
+	('sort([1, "a"])', 'illegal operation: int < str'),
+	('sort(5)', 'int value is not a list'),
+	('reverse(5)', 'int value is not a list'),
+	('range("x")', 'invalid range'),
+	('fill("x", 1)', 'invalid range'),
+	('slice([1], "a", 2)', 'invalid index'),
+	('slice(5, 0, 1)', 'int value is not a list'),
+	('extend([1], 5)', 'int value is not a list'),
+	('index_of(5, 1)', 'int value is not a list'),
+	('keys(5)', 'int value is not a map'),
+])
+def test_list_function_errors(tmp_path, flags, call, error):
+	_, errors = run(tmp_path, f'fn main() {{ write({call}); }}', flags)
+	assert f'panic: {error}' in errors
+
+
+def test_list_functions(tmp_path, flags):
+	source = '''
+fn main() {
+	let values = [3, 1, 2];
+	sort(values);
+	write(values);
+	reverse(values);
+	write(values);
+	extend(values, range(2));
+	write(sum(values));
+	write(index_of(values, 1));
+	write(index_of("abc", "c"));
+	write(slice("abc", 1, 3));
+	write(fill(2, nil));
+}
+'''
+
+	assert run(tmp_path, source, flags) == (
+		'[1, 2, 3]\n[3, 2, 1]\n7\n2\n2\nbc\n[None, None]\n',
+		'',
+	)
+
+
+@pytest.mark.parametrize('call, error', [
+	('min([1, "a"])', 'illegal operation: int < str'),
+	('max([1, "a"])', 'illegal operation: int > str'),
+	('min([])', 'empty list'),
+	('max(5)', 'int value is not a list'),
+	('dot([1], ["a"])', 'illegal operation: int * str'),
+	('dot([2], ["a"])', 'illegal operation: int * str'),
+	('dot([1], [1, 2])', 'arrays of different lengths'),
+])
+def test_min_max_dot_errors(tmp_path, flags, call, error):
+	_, errors = run(tmp_path, f'fn main() {{ write({call}); }}', flags)
+	assert f'panic: {error}' in errors
+
+
+def test_min_max_dot(tmp_path, flags):
+	source = '''
+fn main() {
+	write(min([3, 1.5, 2]));
+	write(max(iarray([3, 1, 2])));
+	write(dot([1, 2], farray([3, 4])));
+}
+'''
+
+	assert run(tmp_path, source, flags) == ('1.5\n3\n11.0\n', '')